@@ -0,0 +1,102 @@
+# Python standard libraries
+import os
+import sys
+import csv
+import heapq
+import itertools
+import argparse
+
+# Internal imports
+from resources import corpus
+
+working_directory = os.path.abspath(os.path.dirname(__file__))
+output_directory = os.path.join(working_directory, '_output')
+aligned_path = os.path.join(working_directory, '_aligned.csv')
+
+
+# Align paragraphs from several languages by compareId (one row per paragraph, with a column for each language)
+# Each language's paragraph table is read one chapter at a time, and tables are merged in canonical chapter order, so memory use depends on the size of a chapter (not the size of the output).
+def main(args=None):
+  args = args or parse_arguments([])
+
+  try:
+    structure_index = corpus.load_structure_index(args.output_directory)
+  except FileNotFoundError:
+    sys.exit('Error: No metadata-structure-index.min.json in {0} (run scrape.py first)'.format(args.output_directory))
+  chapter_ordinals = structure_index['chapterOrdinals']
+
+  # Open a chapter stream for each language
+  language_chapters = []
+  for lang_index, bcp47_lang in enumerate(args.languages):
+    file_path, delimiter = corpus.find_paragraph_table(args.output_directory, bcp47_lang)
+    if not file_path:
+      sys.exit('Error: No CSV or TSV output for {0} in {1} (run scrape.py with --formats csv)'.format(bcp47_lang, args.output_directory))
+    language_chapters.append(get_language_chapters(lang_index, corpus.read_chapter_paragraphs(file_path, chapter_ordinals, delimiter)))
+
+  sys.stdout.write('Aligning {0} languages\n'.format(len(args.languages)))
+  chapter_count = 0
+  row_count = 0
+  delimiter = '\t' if args.aligned.endswith('.tsv') else ','
+  with open(args.aligned, 'w', newline='', encoding='utf-8') as f:
+    writer = csv.writer(f, delimiter=delimiter)
+    writer.writerow(['chSlug', 'parCompareId'] + args.languages)
+    try:
+      for ordinal, chapters in itertools.groupby(heapq.merge(*language_chapters), key=lambda chapter: chapter[0]):
+        rows_by_language = [[] for bcp47_lang in args.languages]
+        for ordinal, lang_index, chapter_slug, rows in chapters:
+          rows_by_language[lang_index] = rows
+        for compare_id, values in align_chapter(rows_by_language, args.field):
+          writer.writerow([chapter_slug, compare_id] + values)
+          row_count += 1
+        chapter_count += 1
+    except ValueError as e:
+      sys.exit('Error: {0}'.format(e))
+
+  sys.stdout.write('Aligned {0} paragraphs in {1} chapters\n'.format(row_count, chapter_count))
+  sys.stdout.write('Created {0}\n'.format(args.aligned))
+
+
+# Parse command-line arguments
+def parse_arguments(argv=None):
+  parser = argparse.ArgumentParser(description='Align paragraphs from several languages in scraped output by compareId.')
+  parser.add_argument('languages', nargs='+', metavar='LANG', help='BCP 47 languages to align (each needs CSV or TSV output)')
+  parser.add_argument('--field', default='parContent', choices=('parContent', 'parContentHtml',), help='paragraph column to align (default: parContent)')
+  parser.add_argument('-i', '--output-directory', default=output_directory, metavar='PATH', help='scraped output directory (default: _output)')
+  parser.add_argument('-o', '--aligned', default=aligned_path, metavar='PATH', help='aligned table to create; use a .tsv extension for TSV (default: _aligned.csv)')
+  return parser.parse_args(argv)
+
+
+# Tag each chapter from a language with the language's index (chapters are sorted by ordinal, then language)
+def get_language_chapters(lang_index, chapters):
+  for ordinal, chapter_slug, rows in chapters:
+    yield ordinal, lang_index, chapter_slug, rows
+
+
+# Align a chapter's paragraphs by compareId (returns a list of compareIds and values, with a value for each language)
+# Paragraphs are kept in the order of the first language. A paragraph that the first language doesn't have is placed after the paragraph that comes before it in the language that has it.
+def align_chapter(rows_by_language, field):
+  # Paragraphs are kept in a linked list ({ compareId: next compareId }, starting from None), so a paragraph can be inserted after another one without searching or shifting a list
+  next_compare_ids = { None: None }
+  values_by_compare_id = {}
+  for lang_index, rows in enumerate(rows_by_language):
+    previous_compare_id = None
+    for row in rows:
+      compare_id = row['parCompareId']
+      if not compare_id:
+        continue
+      if compare_id not in values_by_compare_id:
+        values_by_compare_id[compare_id] = [''] * len(rows_by_language)
+        next_compare_ids[compare_id] = next_compare_ids[previous_compare_id]
+        next_compare_ids[previous_compare_id] = compare_id
+      previous_compare_id = compare_id
+      if not values_by_compare_id[compare_id][lang_index]:
+        values_by_compare_id[compare_id][lang_index] = row[field]
+  aligned_rows = []
+  compare_id = next_compare_ids[None]
+  while compare_id is not None:
+    aligned_rows.append((compare_id, values_by_compare_id[compare_id]))
+    compare_id = next_compare_ids[compare_id]
+  return aligned_rows
+
+if __name__ == '__main__':
+  main(parse_arguments())
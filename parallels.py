@@ -0,0 +1,99 @@
+# Python standard libraries
+import os
+import sys
+import json
+import argparse
+import concurrent.futures
+from datetime import date
+
+# Internal imports
+from resources import corpus, minhash
+
+working_directory = os.path.abspath(os.path.dirname(__file__))
+output_directory = os.path.join(working_directory, '_output')
+
+# Number of paragraphs in each batch of signatures sent to a worker process
+signature_batch_size = 2000
+
+
+# Find parallel passages (pairs of paragraphs with nearly the same words) in a language, and create a similarity index by compareId
+def main(args=None):
+  args = args or parse_arguments([])
+  if args.permutations % args.bands:
+    sys.exit('Error: The number of permutations ({0}) must be a multiple of the number of bands ({1})'.format(args.permutations, args.bands))
+
+  file_path, delimiter = corpus.find_paragraph_table(args.output_directory, args.language)
+  if not file_path:
+    sys.exit('Error: No CSV or TSV output for {0} in {1} (run scrape.py with --formats csv)'.format(args.language, args.output_directory))
+
+  # Read paragraphs
+  compare_ids = []
+  texts = []
+  for row in corpus.read_table_rows(file_path, delimiter):
+    if row['parType'] in args.types and row['parCompareId']:
+      compare_ids.append(row['parCompareId'])
+      texts.append(row['parContent'])
+  sys.stdout.write('Read {0} paragraphs\n'.format(len(texts)))
+
+  # Create signatures in parallel
+  sys.stdout.write('Creating signatures\n')
+  shingle_hashes = []
+  signatures = []
+  with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+    batches = [texts[start:start + signature_batch_size] for start in range(0, len(texts), signature_batch_size)]
+    for results in executor.map(minhash.get_signatures, [args.language] * len(batches), batches, [args.shingle_size] * len(batches), [args.permutations] * len(batches)):
+      for paragraph_shingle_hashes, signature in results:
+        shingle_hashes.append(paragraph_shingle_hashes)
+        signatures.append(signature)
+
+  # Find candidate pairs, and keep pairs that are similar enough
+  candidate_pairs, skipped_bucket_count = minhash.get_candidate_pairs(signatures, args.bands, args.max_bucket_size)
+  sys.stdout.write('Checking {0} candidate pairs\n'.format(len(candidate_pairs)))
+  if skipped_bucket_count:
+    sys.stderr.write('\x1b[1;33mWarning: {0} bucket{1} with more than {2} paragraphs {3} skipped (use --max-bucket-size to include them).\n\x1b[0m'.format(skipped_bucket_count, 's'[:skipped_bucket_count^1], args.max_bucket_size, 'was' if skipped_bucket_count == 1 else 'were'))
+  similar_paragraphs = {}
+  pair_count = 0
+  for index_1, index_2 in candidate_pairs:
+    similarity = minhash.get_jaccard_similarity(shingle_hashes[index_1], shingle_hashes[index_2])
+    if similarity >= args.threshold:
+      similarity = round(similarity, 3)
+      similar_paragraphs.setdefault(index_1, []).append((index_2, similarity))
+      similar_paragraphs.setdefault(index_2, []).append((index_1, similarity))
+      pair_count += 1
+
+  # Create the similarity index (paragraphs in reading order, with the most similar paragraphs first)
+  similarity_index = {
+    '_about': 'Generated {0} by Python Scripture Scraper (https://github.com/samuelbradshaw/python-scripture-scraper)'.format(date.today()),
+    'language': args.language,
+    'shingleSize': args.shingle_size,
+    'threshold': args.threshold,
+    'paragraphs': {},
+  }
+  for index in sorted(similar_paragraphs.keys()):
+    similarity_index['paragraphs'][compare_ids[index]] = [[compare_ids[other_index], similarity] for other_index, similarity in sorted(similar_paragraphs[index], key=lambda item: (-item[1], item[0]))]
+  similarity_index_path = args.similarity_index or os.path.join(working_directory, '_parallels-{0}.json'.format(args.language))
+  with open(similarity_index_path, 'w', encoding='utf-8') as f:
+    json.dump(similarity_index, f, indent=None, separators=(',', ':'), ensure_ascii=False)
+
+  sys.stdout.write('Found {0} similar pair{1} ({2} paragraphs)\n'.format(pair_count, 's'[:pair_count^1], len(similar_paragraphs)))
+  sys.stdout.write('Created {0}\n'.format(similarity_index_path))
+
+
+# Parse command-line arguments
+def parse_arguments(argv=None):
+  parser = argparse.ArgumentParser(description='Find parallel passages (paragraphs with nearly the same words) in scraped output.')
+  parser.add_argument('language', metavar='LANG', help='BCP 47 language to search (needs CSV or TSV output)')
+  parser.add_argument('--types', nargs='+', default=['verse'], metavar='TYPE', help='paragraph types to compare (default: verse)')
+  parser.add_argument('--threshold', type=float, default=0.5, help='minimum Jaccard similarity of word shingles (default: 0.5)')
+  parser.add_argument('--shingle-size', type=int, default=3, metavar='N', help='number of words in each shingle (default: 3)')
+  parser.add_argument('--permutations', type=int, default=128, metavar='N', help='number of MinHash permutations (default: 128)')
+  parser.add_argument('--bands', type=int, default=32, metavar='N', help='number of LSH bands; more bands find less similar pairs (default: 32)')
+  parser.add_argument('--max-bucket-size', type=int, default=500, metavar='N', help='skip LSH buckets with more paragraphs than this, like very common short verses (default: 500)')
+  parser.add_argument('--workers', type=int, default=os.cpu_count(), metavar='N', help='number of worker processes (default: number of CPUs)')
+  parser.add_argument('-i', '--output-directory', default=output_directory, metavar='PATH', help='scraped output directory (default: _output)')
+  parser.add_argument('-o', '--similarity-index', metavar='PATH', help='similarity index to create (default: _parallels-LANG.json)')
+  return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+  main(parse_arguments())
@@ -0,0 +1,70 @@
+import json
+import mmap
+import struct
+
+
+# Sectioned metadata files
+# metadata-scriptures.bin has the same content as metadata-scriptures.json, split into sections that can be read separately: 'structure', 'mapToSlug', 'summary', and one section for each language (like 'languages/en'). The file starts with an 8-byte signature and the length of the header (a little-endian 32-bit integer). The header is a JSON object with the offset and length of each section (from the end of the header), and each section is minified UTF-8 JSON. Readers memory-map the file, and only parse the header and the sections they use.
+
+file_signature = b'PSSMETA1'
+header_length_format = '<I'
+header_start = len(file_signature) + struct.calcsize(header_length_format)
+
+
+# Create a sectioned file from metadata_scriptures (returns bytes)
+def get_sectioned_metadata(metadata_scriptures, about):
+  sections = {}
+  for key in ('structure', 'mapToSlug', 'summary',):
+    sections[key] = metadata_scriptures[key]
+  for bcp47_lang, language_data in metadata_scriptures['languages'].items():
+    sections[f'languages/{bcp47_lang}'] = language_data
+  encoded_sections = [(name, json.dumps(content, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False, default=lambda x: sorted(x) if isinstance(x, set) else x).encode('utf-8')) for name, content in sections.items()]
+
+  section_index = {}
+  offset = 0
+  for name, data in encoded_sections:
+    section_index[name] = [offset, len(data)]
+    offset += len(data)
+  header = json.dumps({ '_about': about, 'sections': section_index }, indent=None, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+  return file_signature + struct.pack(header_length_format, len(header)) + header + b''.join(data for name, data in encoded_sections)
+
+
+# Read sections from a sectioned metadata file (sections are parsed when they're first used)
+class MetadataReader:
+  def __init__(self, file_path):
+    with open(file_path, 'rb') as f:
+      self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if self.data[:len(file_signature)] != file_signature:
+      raise ValueError(f'Not a sectioned metadata file: {file_path}')
+    header_length = struct.unpack_from(header_length_format, self.data, len(file_signature))[0]
+    header = json.loads(self.data[header_start:header_start + header_length])
+    self.about = header['_about']
+    self.section_index = header['sections']
+    self.sections_start = header_start + header_length
+    self.sections = {}
+    self.languages = [name[len('languages/'):] for name in self.section_index if name.startswith('languages/')]
+
+  # Get a section's content (raises KeyError if the file doesn't have the section)
+  def get_section(self, name):
+    if name not in self.sections:
+      offset, length = self.section_index[name]
+      start = self.sections_start + offset
+      self.sections[name] = json.loads(self.data[start:start + length])
+    return self.sections[name]
+
+  # Get metadata for a language (punctuation, numerals, translatedNames, and churchAvailability)
+  def get_language(self, bcp47_lang):
+    return self.get_section(f'languages/{bcp47_lang}')
+
+  # Get the slug for a name, abbreviation, or URI (returns None if it isn't found)
+  def get_slug(self, name):
+    return self.get_section('mapToSlug').get(name)
+
+  def close(self):
+    self.data.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
@@ -12,9 +12,38 @@ SCRAPE_METADATA_FOR_ALL_LANGUAGES = False  # Default: False
 # The script will pause between requests to avoid hitting the Church server too frequently
 SECONDS_TO_PAUSE_BETWEEN_REQUESTS = 1  # Default: 1
 
+# Maximum number of requests that can be in progress at the same time (when scraping full content for multiple languages, languages are scraped in parallel, and requests are spaced SECONDS_TO_PAUSE_BETWEEN_REQUESTS / current concurrency apart; concurrency starts at 1, and is raised up to this value while the server responds quickly and without errors; with --work, this applies to each worker process separately)
+MAX_CONCURRENT_REQUESTS = 1  # Default: 1
+
+# Requests that time out, are throttled (429), or fail with a server error (5xx) are retried after an exponential backoff with jitter (or after the server's Retry-After time)
+REQUEST_TIMEOUT_SECONDS = 60  # Default: 60
+MAX_RETRIES = 5  # Default: 5
+MAX_BACKOFF_SECONDS = 120  # Default: 120
+
+# After this many failed requests in a row, requests are paused for CIRCUIT_BREAKER_SECONDS to give the server time to recover
+CIRCUIT_BREAKER_THRESHOLD = 8  # Default: 8
+CIRCUIT_BREAKER_SECONDS = 300  # Default: 300
+
+# Pages that are used more than once in a run (like tables of contents and title pages) are kept, so they aren't downloaded twice (recently-used pages are kept in memory, and older pages are moved to a temporary folder on disk; sizes are approximate)
+PAGE_MEMO_MEMORY_MB = 64  # Default: 64
+PAGE_MEMO_DISK_MB = 1024  # Default: 1024
+
+# Number of processes used to parse and render chapters while other chapters are being fetched (if 0, chapters are rendered on the threads that fetch them)
+RENDER_PROCESSES = 2  # Default: 2
+
+# Maximum number of chapters per language that can be fetched or rendered ahead of the chapter being written
+PIPELINE_DEPTH = 8  # Default: 8
+
+# When scraping with a work queue, how long a worker can hold a chapter before another worker can take it over, and how many times a chapter is tried before it's marked as failed
+QUEUE_LEASE_SECONDS = 300  # Default: 300
+QUEUE_MAX_ATTEMPTS = 3  # Default: 3
+
 # Number of spaces to indent in JSON output
 JSON_INDENT = 2  # Default: 2
 
+# Whether metadata-scriptures.bin should be created (the same content as metadata-scriptures.json, in sections that can be loaded separately, like one language or mapToSlug; see resources/binary_metadata.py)
+OUTPUT_SECTIONED_METADATA = False  # Default: False
+
 # Whether test data should be used (only includes a subset of chapters)
 USE_TEST_DATA = False  # Default: False
 
@@ -32,12 +61,27 @@ if SCRAPE_FULL_CONTENT:
   OUTPUT_AS_SQL_MYSQL = True  # Default: True
   OUTPUT_AS_SQL_SQLITE = True  # Default: True
   
+  # Whether paragraph text should also be written to a deduplicated store, where each distinct text is saved once and chapters refer to it by hash (see "Deduplicated paragraph store" in the README)
+  OUTPUT_AS_STORE = False  # Default: False
+  
+  # Whether a concordance (where each word is used, by compareId and position) and word frequency tables should be created for each language (only created when all of the scriptures are scraped)
+  OUTPUT_CONCORDANCE = False  # Default: False
+  
+  # Whether verse, word, and character counts, page spans, and verse length distributions should be created for each language, chapter, book, and publication (saved in metadata-statistics.json; only created when all of the scriptures are scraped)
+  OUTPUT_STATISTICS = False  # Default: False
+  
+  # Whether footnote cross-references (from each verse and footnote marker to the verses it refers to) should be saved as an index for each language (only created when INCLUDE_COPYRIGHTED_CONTENT is True and all of the scriptures are scraped)
+  OUTPUT_CROSS_REFERENCES = False  # Default: False
+  
   # Whether full content output should be split by chapter and put into a nested directory structure (only applicable for JSON output)
   SPLIT_JSON_BY_CHAPTER = True  # Default: True
   
   # Whether full content output should be minified (only applicable for JSON output)
   MINIFY_JSON = False  # Default: False
   
+  # Whether CSV, TSV, and SQL rows should be written to files as each chapter is scraped, instead of being kept in memory until the end (uses less memory when scraping many languages; not used when merging into existing output)
+  STREAM_TABULAR_OUTPUT = False  # Default: False
+  
   # Whether spans with CSS classes should be converted to simple HTML tags (only applicable for HTML output)
   BASIC_HTML = False  # Default: False
   
@@ -0,0 +1,70 @@
+import csv
+import itertools
+import json
+import os
+
+
+# Reading output from a previous run
+# Tables are read as streams (one row or one chapter at a time), so tools that read output don't need to load whole files into memory.
+
+
+# Find the paragraph table for a language in an output directory (returns the file path and delimiter, or (None, None) if the language doesn't have CSV or TSV output)
+def find_paragraph_table(output_directory, bcp47_lang):
+  for file_type, delimiter in (('csv', ','), ('tsv', '\t'),):
+    file_path = os.path.join(output_directory, f'{bcp47_lang}-{file_type}', f'Paragraphs.{file_type}')
+    if os.path.isfile(file_path):
+      return file_path, delimiter
+  return None, None
+
+
+# Load the structure index (metadata-structure-index.min.json) from an output directory
+def load_structure_index(output_directory):
+  return read_json_file(os.path.join(output_directory, 'metadata-structure-index.min.json'))
+
+
+# Load scriptures metadata (metadata-scriptures.min.json) from an output directory
+def load_scriptures_metadata(output_directory):
+  return read_json_file(os.path.join(output_directory, 'metadata-scriptures.min.json'))
+
+
+# Read a JSON file
+def read_json_file(file_path):
+  with open(file_path, 'r', encoding='utf-8') as f:
+    return json.load(f)
+
+
+# Find the JSON file with a chapter's content (returns the file path, and the keys of the chapter in the file: an empty tuple for a chapter-level file, or (book_slug, chapter_slug) for a publication-level file; returns (None, None) if the chapter doesn't have JSON output)
+def find_chapter_json(output_directory, bcp47_lang, structure_index, chapter_slug):
+  chapter_ordinal = structure_index['chapterOrdinals'].get(chapter_slug)
+  if chapter_ordinal is None:
+    return None, None
+  book_ordinal = structure_index['chapterBooks'][chapter_ordinal]
+  book_slug = structure_index['books'][book_ordinal]
+  publication_slug = structure_index['publications'][structure_index['bookPublications'][book_ordinal]]
+  file_path = os.path.join(output_directory, f'{bcp47_lang}-json', publication_slug, book_slug, f'{chapter_slug}.json')
+  if os.path.isfile(file_path):
+    return file_path, ()
+  file_path = os.path.join(output_directory, f'{bcp47_lang}-json', f'{publication_slug}.json')
+  if os.path.isfile(file_path):
+    return file_path, (book_slug, chapter_slug)
+  return None, None
+
+
+# Read rows from a CSV or TSV table one at a time (values are strings, like in the file)
+def read_table_rows(file_path, delimiter=','):
+  with open(file_path, 'r', newline='', encoding='utf-8') as f:
+    yield from csv.DictReader(f, delimiter=delimiter)
+
+
+# Read a paragraph table one chapter at a time (yields the chapter's ordinal, its slug, and its rows)
+# Output files list chapters in canonical order, so chapters from several tables can be merged without sorting. Raises ValueError if a chapter isn't in chapter_ordinals, or if chapters are out of order.
+def read_chapter_paragraphs(file_path, chapter_ordinals, delimiter=','):
+  previous_ordinal = -1
+  for chapter_slug, rows in itertools.groupby(read_table_rows(file_path, delimiter), key=lambda row: row['chSlug']):
+    if chapter_slug not in chapter_ordinals:
+      raise ValueError(f'Unknown chapter in {file_path}: {chapter_slug}')
+    ordinal = chapter_ordinals[chapter_slug]
+    if ordinal <= previous_ordinal:
+      raise ValueError(f'Chapters in {file_path} aren’t in canonical order: {chapter_slug}')
+    previous_ordinal = ordinal
+    yield ordinal, chapter_slug, list(rows)
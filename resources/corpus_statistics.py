@@ -0,0 +1,81 @@
+import array
+import collections
+import itertools
+import re
+import sys
+
+
+# Corpus statistics for a language
+# Values for each paragraph are collected in arrays. Paragraphs from the same chapter, book, and publication are next to each other, so totals for any of them are differences between two prefix sums, and page spans and length distributions come from slices of the arrays.
+
+page_number_re = re.compile(r'\d+')
+
+
+class StatisticsBuilder:
+  def __init__(self, tokenize):
+    self.tokenize = tokenize
+    self.verse_flags = array.array('B')  # 1 if the paragraph is a verse
+    self.word_counts = array.array('I')
+    self.character_counts = array.array('I')
+    self.first_pages = array.array('q')  # First page number for each paragraph (sys.maxsize if it doesn't have one)
+    self.last_pages = array.array('q')  # Last page number for each paragraph (-1 if it doesn't have one)
+    self.paragraph_ranges = { 'publications': {}, 'books': {}, 'chapters': {} }  # { level: { slug: [first_paragraph_index, end_paragraph_index] } }
+
+  # Add a chapter's paragraphs (paragraph dicts from JSON output)
+  def add_chapter(self, publication_slug, book_slug, chapter_slug, paragraph_dicts):
+    start = len(self.word_counts)
+    for paragraph_dict in paragraph_dicts:
+      if paragraph_dict['type'] == 'image':
+        continue
+      text = paragraph_dict['content'] or ''
+      page_numbers = [int(page_number) for page_number in page_number_re.findall(paragraph_dict['pageNumber'] or '')]
+      self.verse_flags.append(paragraph_dict['type'] == 'verse')
+      self.word_counts.append(len(self.tokenize(text)))
+      self.character_counts.append(len(text))
+      self.first_pages.append(min(page_numbers) if page_numbers else sys.maxsize)
+      self.last_pages.append(max(page_numbers) if page_numbers else -1)
+    end = len(self.word_counts)
+    for level, slug in (('publications', publication_slug), ('books', book_slug), ('chapters', chapter_slug),):
+      self.paragraph_ranges[level].setdefault(slug, [start, start])[1] = end
+
+  # Get statistics for the language, and for each publication, book, and chapter
+  def get_statistics(self):
+    verse_totals = array.array('q', itertools.accumulate(self.verse_flags, initial=0))
+    word_totals = array.array('q', itertools.accumulate(self.word_counts, initial=0))
+    character_totals = array.array('q', itertools.accumulate(self.character_counts, initial=0))
+
+    # Get statistics for a range of paragraphs
+    def get_range_statistics(start, end, include_verse_lengths=True):
+      first_page = min(self.first_pages[start:end], default=sys.maxsize)
+      last_page = max(self.last_pages[start:end], default=-1)
+      range_statistics = {
+        'paragraphs': end - start,
+        'verses': verse_totals[end] - verse_totals[start],
+        'words': word_totals[end] - word_totals[start],
+        'characters': character_totals[end] - character_totals[start],
+        'firstPage': first_page if first_page != sys.maxsize else None,
+        'lastPage': last_page if last_page != -1 else None,
+      }
+      if include_verse_lengths:
+        range_statistics['verseWordCounts'] = get_distribution(itertools.compress(self.word_counts[start:end], self.verse_flags[start:end]))
+      return range_statistics
+
+    statistics = get_range_statistics(0, len(self.word_counts))
+    for level, ranges in self.paragraph_ranges.items():
+      statistics[level] = { slug: get_range_statistics(start, end, include_verse_lengths=(level != 'chapters')) for slug, (start, end) in ranges.items() }
+    return statistics
+
+
+# Get the distribution of a list of values (minimum, maximum, mean, median, 90th percentile, and the number of times each value occurs)
+def get_distribution(values):
+  values = sorted(values)
+  if not values:
+    return None
+  return {
+    'min': values[0],
+    'max': values[-1],
+    'mean': round(sum(values) / len(values), 2),
+    'median': values[(len(values) - 1) // 2] if len(values) % 2 else (values[len(values) // 2 - 1] + values[len(values) // 2]) / 2,
+    'p90': values[min(len(values) - 1, int(len(values) * 0.9))],
+    'histogram': { str(value): count for value, count in sorted(collections.Counter(values).items()) },
+  }
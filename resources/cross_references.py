@@ -0,0 +1,133 @@
+import array
+import json
+import re
+import urllib.parse
+
+from resources import resources
+
+
+# Cross-references from footnotes (only available when copyrighted content is included)
+# Each reference goes from a paragraph (by compareId) and footnote marker to a verse (like 'mosiah-1_v2'), or to a whole chapter (like 'mosiah-1'). References are saved as a compressed sparse row (CSR) index: nodes are listed once in canonical order, and each node's references are the slice offsets[node]:offsets[node + 1] of a flat list, so references in either direction can be found without parsing HTML.
+
+# Church paragraph ids for verses (p12 is verse 12)
+verse_paragraph_id_re = re.compile(r'p(\d+)')
+verse_compare_id_re = re.compile(r'_v(\d+)$')
+
+
+# Get a chapter's cross-references from its footnote links and footnotes
+# note_sources: { note_id: (source_compare_id, marker) }, from study-note-ref links in paragraphs
+# note_hrefs: { note_id: [href] }, from scripture-ref links in footnotes
+# Returns a list of [source_compare_id, marker, target_chapter_slug, first_verse, last_verse] (verses are None for references to a whole chapter). Links that aren't to a scripture chapter (like Topical Guide entries) are left out.
+def get_chapter_cross_references(note_sources, note_hrefs, structure_index):
+  cross_references = []
+  for note_id, (source_compare_id, marker) in note_sources.items():
+    for href in note_hrefs.get(note_id, []):
+      target = resolve_scripture_reference(href, structure_index)
+      if target:
+        target_chapter_slug, verse_ranges = target
+        for first_verse, last_verse in (verse_ranges or [(None, None)]):
+          cross_references.append([source_compare_id, marker, target_chapter_slug, first_verse, last_verse])
+  return cross_references
+
+
+# Resolve a scripture link (like 'https://www.churchofjesuschrist.org/study/scriptures/bofm/mosiah/1?lang=eng&id=p2-p4#p2') to its chapter slug and verse ranges (returns None if the link isn't to a known chapter)
+# The book is found by its URI (from uriToSlug in mapToSlug). Verses come from the id parameter (like 'p2-p4,p7'), or from the fragment if there isn't an id parameter.
+def resolve_scripture_reference(href, structure_index):
+  url = urllib.parse.urlsplit(href)
+  path = url.path[len('/study'):] if url.path.startswith('/study/') else url.path
+  book_uri, _, chapter = path.rstrip('/').rpartition('/')
+  book_slug = structure_index['uriToSlug'].get(book_uri)
+  if not book_slug:
+    return None
+  chapter_slug = resources.get_chapter_slug(book_slug, chapter)
+  if chapter_slug not in structure_index['chapterOrdinals']:
+    return None
+  paragraph_ids = urllib.parse.parse_qs(url.query).get('id', [url.fragment])[0]
+  verse_ranges = []
+  for paragraph_id_range in filter(None, paragraph_ids.split(',')):
+    first_id, _, last_id = paragraph_id_range.partition('-')
+    first_match = verse_paragraph_id_re.fullmatch(first_id)
+    last_match = verse_paragraph_id_re.fullmatch(last_id or first_id)
+    if first_match and last_match:
+      verse_ranges.append((int(first_match.group(1)), int(last_match.group(1))))
+  return chapter_slug, verse_ranges
+
+
+# Get the number of verses in a chapter (the highest verse number in its paragraphs' compareIds)
+def get_verse_count(paragraphs):
+  return max((int(verse_match.group(1)) for verse_match in (verse_compare_id_re.search(paragraph_dict['compareId']) for paragraph_dict in paragraphs) if verse_match), default=0)
+
+
+# Build a CSR index from a list of cross-references (from get_chapter_cross_references)
+# verse_counts: { chapter_slug: number of verses }. Verse ranges are limited to the verses in the target chapter, and a reference with no verses left in its range (like a link to a paragraph that isn't a verse) is added as a reference to the whole chapter.
+def build_index(cross_references, chapter_ordinals, verse_counts):
+  edges = set()  # { (source_node, target_node, marker) }
+  for source_compare_id, marker, target_chapter_slug, first_verse, last_verse in cross_references:
+    verse_numbers = range(max(first_verse, 1), min(last_verse, verse_counts.get(target_chapter_slug, 0)) + 1) if first_verse is not None else range(0)
+    if not verse_numbers:
+      edges.add((source_compare_id, target_chapter_slug, marker))
+    for verse in verse_numbers:
+      edges.add((source_compare_id, f'{target_chapter_slug}_v{verse}', marker))
+
+  # Sort nodes in canonical order (by chapter, with a chapter before its paragraphs, and verses in numerical order)
+  def get_node_sort_key(node):
+    chapter_slug = node.rpartition('_')[0]
+    if not chapter_slug:
+      return (chapter_ordinals.get(node, -1), 0, 0, node)
+    verse_match = verse_compare_id_re.search(node)
+    return (chapter_ordinals.get(chapter_slug, -1), 1, int(verse_match.group(1)) if verse_match else 0, node)
+  nodes = sorted(set(node for edge in edges for node in edge[:2]), key=get_node_sort_key)
+  node_ordinals = { node: ordinal for ordinal, node in enumerate(nodes) }
+  ordinal_edges = [(node_ordinals[source], node_ordinals[target], marker) for source, target, marker in edges]
+
+  # Create offsets and lists of (node, marker) for each direction
+  def get_csr(edges_by_node):
+    offsets = array.array('I', [0] * (len(nodes) + 1))
+    for node, other_node, marker in edges_by_node:
+      offsets[node + 1] += 1
+    for ordinal in range(len(nodes)):
+      offsets[ordinal + 1] += offsets[ordinal]
+    return {
+      'offsets': offsets.tolist(),
+      'nodes': [other_node for node, other_node, marker in edges_by_node],
+      'markers': [marker for node, other_node, marker in edges_by_node],
+    }
+
+  return {
+    'nodes': nodes,
+    'references': get_csr(sorted(ordinal_edges)),
+    'referencedBy': get_csr(sorted((target, source, marker) for source, target, marker in ordinal_edges)),
+  }
+
+
+# Read a cross-reference index, and find references to and from paragraphs
+class CrossReferenceIndex:
+  def __init__(self, file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+      index = json.load(f)
+    self.nodes = index['nodes']
+    self.node_ordinals = { node: ordinal for ordinal, node in enumerate(self.nodes) }
+    self.csr = {}
+    for direction in ('references', 'referencedBy',):
+      self.csr[direction] = (array.array('I', index[direction]['offsets']), array.array('I', index[direction]['nodes']), index[direction]['markers'])
+
+  # Get (compareId, marker) tuples for a node in one direction
+  def get_edges(self, direction, node):
+    ordinal = self.node_ordinals.get(node)
+    if ordinal is None:
+      return []
+    offsets, other_nodes, markers = self.csr[direction]
+    start, end = offsets[ordinal], offsets[ordinal + 1]
+    return [(self.nodes[other_node], marker) for other_node, marker in zip(other_nodes[start:end], markers[start:end])]
+
+  # Get what a paragraph refers to, as (target, marker) tuples (targets are verse compareIds or chapter slugs)
+  def get_references(self, compare_id):
+    return self.get_edges('references', compare_id)
+
+  # Get what refers to a verse (or a whole chapter, by chapter slug), as (source_compare_id, marker) tuples
+  # If include_chapter is True, references to the verse's whole chapter are included too.
+  def get_referenced_by(self, compare_id, include_chapter=False):
+    edges = self.get_edges('referencedBy', compare_id)
+    if include_chapter and '_' in compare_id:
+      edges += self.get_edges('referencedBy', compare_id.rpartition('_')[0])
+    return edges
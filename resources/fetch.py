@@ -0,0 +1,248 @@
+import collections
+import concurrent.futures
+from datetime import datetime, timezone
+import email.utils
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from resources import config
+
+
+# Requests share a single session, so connections to the server are pooled and reused (including across threads)
+session = requests.Session()
+session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(config.MAX_CONCURRENT_REQUESTS, 10)))
+
+
+# Rate controller shared by all threads
+# Concurrency starts at 1, goes up by 1 for each round of fast, successful requests (up to MAX_CONCURRENT_REQUESTS), goes down when responses slow down, and is halved when a request is throttled or fails. Request start times are spaced SECONDS_TO_PAUSE_BETWEEN_REQUESTS / concurrency apart.
+# A failed request pauses all requests for an exponential backoff with jitter (or the server's Retry-After time, if it's longer). After CIRCUIT_BREAKER_THRESHOLD failures in a row, the circuit breaker opens, and requests are paused for CIRCUIT_BREAKER_SECONDS. The next request after that is a probe: if it fails, the circuit breaker opens again.
+class RateController:
+  def __init__(self):
+    self.condition = threading.Condition()
+    self.concurrency = 1.0
+    self.in_progress = 0
+    self.next_request_time = 0
+    self.consecutive_failures = 0
+    self.average_latency = None
+
+  # Wait until a request can be started
+  def acquire(self):
+    with self.condition:
+      while self.in_progress >= int(self.concurrency):
+        self.condition.wait()
+      self.in_progress += 1
+      now = time.monotonic()
+      request_time = max(now, self.next_request_time)
+      self.next_request_time = request_time + config.SECONDS_TO_PAUSE_BETWEEN_REQUESTS / int(self.concurrency)
+    time.sleep(request_time - now)
+
+  # Mark a request as finished (latency is the request's duration in seconds; retry_after is the number of seconds the server asked to wait, if any)
+  def release(self, success=True, latency=None, retry_after=None):
+    with self.condition:
+      self.in_progress -= 1
+      if success:
+        self.consecutive_failures = 0
+        if latency is not None:
+          is_slow = self.average_latency is not None and latency > 2 * self.average_latency
+          self.average_latency = latency if self.average_latency is None else 0.9 * self.average_latency + 0.1 * latency
+          if is_slow:
+            self.concurrency = max(1.0, self.concurrency * 0.75)
+          else:
+            self.concurrency = min(float(config.MAX_CONCURRENT_REQUESTS), self.concurrency + 1 / int(self.concurrency))
+      else:
+        self.consecutive_failures += 1
+        self.concurrency = max(1.0, self.concurrency / 2)
+        if self.consecutive_failures >= config.CIRCUIT_BREAKER_THRESHOLD:
+          delay = config.CIRCUIT_BREAKER_SECONDS
+          self.consecutive_failures = config.CIRCUIT_BREAKER_THRESHOLD - 1
+          sys.stderr.write('\x1b[1;33mWarning: The server isn’t responding normally. Pausing requests for {0} seconds.\n\x1b[0m'.format(delay))
+        else:
+          delay = min(config.MAX_BACKOFF_SECONDS, 2 ** (self.consecutive_failures - 1))
+          delay = random.uniform(delay / 2, delay)
+        delay = max(delay, retry_after or 0)
+        self.next_request_time = max(self.next_request_time, time.monotonic() + delay)
+      self.condition.notify_all()
+
+rate_controller = RateController()
+
+
+# Pages fetched in this run that are used more than once, by URL (the URL includes the page URI and language)
+# Recently-used pages are kept in memory. When memory is full, the least recently used pages are moved to a temporary directory on disk, and when the disk budget is full, the oldest pages on disk are dropped. Files are read and written outside the lock, so other threads aren't blocked by disk I/O.
+class PageMemo:
+  def __init__(self, max_memory_size, max_disk_size):
+    self.lock = threading.Lock()
+    self.max_memory_size = max_memory_size
+    self.max_disk_size = max_disk_size
+    self.memory_pages = collections.OrderedDict()  # { url: text }
+    self.memory_size = 0
+    self.disk_pages = collections.OrderedDict()  # { url: (path, size) }
+    self.disk_size = 0
+    self.disk_directory = None
+    self.file_numbers = itertools.count()
+    self.hit_count = 0
+
+  # Get a page's text (returns None if the page hasn't been fetched in this run)
+  def get(self, url):
+    with self.lock:
+      if url in self.memory_pages:
+        self.memory_pages.move_to_end(url)
+        self.hit_count += 1
+        return self.memory_pages[url]
+      if url not in self.disk_pages:
+        return None
+      path, size = self.disk_pages.pop(url)
+      self.disk_size -= size
+      self.hit_count += 1
+    with open(path, 'r', encoding='utf-8') as f:
+      text = f.read()
+    os.remove(path)
+    self.add(url, text)
+    return text
+
+  # Add a page
+  def add(self, url, text):
+    with self.lock:
+      if url in self.memory_pages or url in self.disk_pages:
+        return
+      evicted_pages = self.add_to_memory(url, text)
+    for evicted_url, evicted_text in evicted_pages:
+      self.add_to_disk(evicted_url, evicted_text)
+
+  # Add a page to memory (returns (url, text) tuples for the least recently used pages that were removed to make room; self.lock must be held)
+  def add_to_memory(self, url, text):
+    evicted_pages = []
+    self.memory_pages[url] = text
+    self.memory_size += len(text)
+    while self.memory_size > self.max_memory_size and len(self.memory_pages) > 1:
+      evicted_url, evicted_text = self.memory_pages.popitem(last=False)
+      self.memory_size -= len(evicted_text)
+      evicted_pages.append((evicted_url, evicted_text))
+    return evicted_pages
+
+  # Add a page to disk, and drop the oldest pages if the disk budget is full
+  def add_to_disk(self, url, text):
+    if self.max_disk_size <= 0:
+      return
+    with self.lock:
+      if not self.disk_directory:
+        self.disk_directory = tempfile.TemporaryDirectory(prefix='scripture-scraper-pages-')
+      path = os.path.join(self.disk_directory.name, str(next(self.file_numbers)))
+    data = text.encode('utf-8')
+    with open(path, 'wb') as f:
+      f.write(data)
+    with self.lock:
+      if url in self.memory_pages or url in self.disk_pages:
+        # The page was added again while it was being written
+        evicted_paths = [path]
+      else:
+        evicted_paths = []
+        self.disk_pages[url] = (path, len(data))
+        self.disk_size += len(data)
+        while self.disk_size > self.max_disk_size and self.disk_pages:
+          evicted_path, evicted_size = self.disk_pages.popitem(last=False)[1]
+          self.disk_size -= evicted_size
+          evicted_paths.append(evicted_path)
+    for evicted_path in evicted_paths:
+      os.remove(evicted_path)
+
+page_memo = PageMemo(config.PAGE_MEMO_MEMORY_MB * 1024 * 1024, config.PAGE_MEMO_DISK_MB * 1024 * 1024)
+
+# Requests that are in progress, by URL, so a page that's requested by several threads at once is only downloaded once
+in_flight_requests = {}  # { url: concurrent.futures.Future }
+in_flight_lock = threading.Lock()
+
+
+# A fetched page (has the parts of a requests response that the scraper uses)
+class Page:
+  def __init__(self, url, status_code, text):
+    self.url = url
+    self.status_code = status_code
+    self.text = text
+
+  def json(self):
+    return json.loads(self.text)
+
+
+# Get the number of seconds to wait from a response's Retry-After header (returns None if there isn't one)
+def get_retry_after(r):
+  value = r.headers.get('Retry-After')
+  if not value:
+    return None
+  if value.strip().isdigit():
+    return int(value)
+  try:
+    return max(0, (email.utils.parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+  except (TypeError, ValueError):
+    return None
+
+
+# Fetch a URL (rate-limited, using the shared session; if another thread is already fetching the URL, its result is used)
+# Pages that are used more than once in a run (like tables of contents) should be fetched with memoize=True, so they're kept in the page memo and reused. Returns None if the server couldn't be reached.
+def get(url, memoize=False):
+  text = page_memo.get(url)
+  if text is not None:
+    return Page(url, 200, text)
+  
+  with in_flight_lock:
+    future = in_flight_requests.get(url)
+    is_owner = future is None
+    if is_owner:
+      future = in_flight_requests[url] = concurrent.futures.Future()
+  if not is_owner:
+    return future.result()
+  
+  try:
+    # The page might have been added to the memo by a request that finished after the memo was checked
+    text = page_memo.get(url)
+    page = Page(url, 200, text) if text is not None else request_page(url)
+    if memoize and page and page.status_code == 200:
+      page_memo.add(url, page.text)
+    future.set_result(page)
+    return page
+  except BaseException as e:
+    future.set_exception(e)
+    raise
+  finally:
+    with in_flight_lock:
+      del in_flight_requests[url]
+
+
+# Request a URL from the server
+# Requests that time out, are throttled, or fail with a server error are retried up to MAX_RETRIES times. Returns None if the server couldn't be reached.
+def request_page(url):
+  def request_function():
+    r = session.get(url, timeout=config.REQUEST_TIMEOUT_SECONDS)
+    r.encoding = 'utf-8'
+    is_success = not (r.status_code == 429 or r.status_code >= 500)
+    return Page(url, r.status_code, r.text), is_success, get_retry_after(r)
+  return request_with_retries(request_function, (requests.RequestException,))
+
+
+# Make a request with the rate controller, retrying failed attempts up to MAX_RETRIES times (failures are paused with backoff and the circuit breaker)
+# request_function makes one attempt, and returns (result, is_success, retry_after). Attempts that raise one of retryable_exceptions are failures; other exceptions are raised. Returns the result of the last attempt (None if every attempt raised an exception).
+def request_with_retries(request_function, retryable_exceptions=()):
+  result = None
+  for attempt in range(config.MAX_RETRIES + 1):
+    rate_controller.acquire()
+    start_time = time.monotonic()
+    is_success, retry_after = False, None
+    try:
+      result, is_success, retry_after = request_function()
+    except retryable_exceptions:
+      continue
+    finally:
+      if is_success:
+        rate_controller.release(success=True, latency=time.monotonic() - start_time)
+      else:
+        rate_controller.release(success=False, retry_after=retry_after)
+    if is_success:
+      break
+  return result
@@ -0,0 +1,90 @@
+import re
+
+from bs4 import Comment, Doctype, NavigableString
+from markdownify import MarkdownConverter
+
+
+# Markdown renderer for paragraph markup
+# After cleanup, paragraphs only have a few kinds of inline markup (like <b>, <i>, <small>, <br>, <a>, <sup>, and <img>), so this renderer handles those tags directly instead of going through markdownify's generic conversion. Output is the same as MarkdownConverter(escape_underscores=False).convert_soup(element). Paragraphs with other markup (like lists, tables, or nested block elements) are converted with markdownify.
+
+whitespace_re = re.compile(r'[\t ]+')
+
+# Tags that markdownify converts differently from plain inline markup (paragraphs with these tags are converted with markdownify)
+markdownify_tags = frozenset((
+  'blockquote', 'code', 'del', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'kbd', 'li', 'ol', 'p', 'pre', 's', 'samp', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+))
+
+# Tags that change how markdownify converts an element's own text and whitespace (elements with these tags are converted with markdownify)
+markdownify_parent_tags = frozenset((
+  'code', 'li', 'ol', 'pre', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+))
+
+markdown_converter = MarkdownConverter(escape_underscores=False)
+
+
+class UnsupportedMarkup(Exception):
+  pass
+
+
+# Render an element's contents as Markdown
+def render_markdown(element):
+  if element.name in markdownify_parent_tags:
+    return markdown_converter.convert_soup(element)
+  try:
+    return render_children(element)
+  except UnsupportedMarkup:
+    return markdown_converter.convert_soup(element)
+
+
+# Render the children of an element
+def render_children(element):
+  parts = []
+  for child in element.children:
+    if isinstance(child, (Comment, Doctype)):
+      continue
+    elif isinstance(child, NavigableString):
+      parts.append(whitespace_re.sub(' ', str(child)).replace('*', r'\*'))
+    else:
+      parts.append(render_tag(child))
+  return ''.join(parts)
+
+
+# Strip spaces from the ends of an inline element's text (returns prefix, suffix, and text, like markdownify's chomp)
+def chomp(text):
+  prefix = ' ' if text and text[0] == ' ' else ''
+  suffix = ' ' if text and text[-1] == ' ' else ''
+  return prefix, suffix, text.strip()
+
+
+# Render a tag as Markdown
+def render_tag(element):
+  name = element.name
+  if name in markdownify_tags:
+    raise UnsupportedMarkup(name)
+  if name == 'br':
+    return '  \n'
+  if name == 'img':
+    alt = element.attrs.get('alt', None) or ''
+    src = element.attrs.get('src', None) or ''
+    title = element.attrs.get('title', None) or ''
+    title_part = ' "%s"' % title.replace('"', r'\"') if title else ''
+    return '![%s](%s%s)' % (alt, src, title_part)
+
+  text = render_children(element)
+  if name in ('b', 'strong', 'i', 'em', 'sup', 'sub'):
+    prefix, suffix, text = chomp(text)
+    if not text:
+      return ''
+    markup = '**' if name in ('b', 'strong') else '*' if name in ('i', 'em') else ''
+    return prefix + markup + text + markup + suffix
+  if name == 'a':
+    prefix, suffix, text = chomp(text)
+    if not text:
+      return ''
+    href = element.get('href')
+    title = element.get('title')
+    if text.replace(r'\_', '_') == href and not title:
+      return '<%s>' % href
+    title_part = ' "%s"' % title.replace('"', r'\"') if title else ''
+    return '%s[%s](%s%s)%s' % (prefix, text, href, title_part, suffix) if href else text
+  return text
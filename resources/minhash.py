@@ -0,0 +1,66 @@
+import array
+import collections
+import hashlib
+import itertools
+import random
+
+from resources import concordance
+
+
+# Near-duplicate detection with MinHash and locality-sensitive hashing (LSH)
+# Each paragraph is turned into a set of shingles (runs of consecutive words), and each shingle is hashed. A paragraph's signature has the minimum of its shingle hashes under each of several random permutations, so two signatures match in about the same share of positions as the Jaccard similarity of their shingle sets. Signatures are split into bands, and paragraphs that match exactly in any band become candidate pairs, so most of the corpus is never compared. Candidate pairs are then checked with their exact Jaccard similarity.
+
+# Seed for permutation masks (signatures are only comparable when they're created with the same masks)
+permutation_seed = 1830
+
+
+# Get masks for the permutations used in signatures (XOR with a random 64-bit mask permutes 64-bit hashes)
+def get_permutation_masks(permutation_count):
+  generator = random.Random(permutation_seed)
+  return [generator.getrandbits(64) for permutation in range(permutation_count)]
+
+
+# Get the hashed shingles for a text (texts with fewer words than shingle_size have a single shingle)
+def get_shingle_hashes(words, shingle_size):
+  if len(words) < shingle_size:
+    shingles = [' '.join(words)] if words else []
+  else:
+    shingles = [' '.join(words[index:index + shingle_size]) for index in range(len(words) - shingle_size + 1)]
+  return frozenset(int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little') for shingle in shingles)
+
+
+# Get shingle hashes and MinHash signatures for a batch of texts (used by worker processes; returns a list of (shingle_hashes, signature) tuples, with an empty signature for texts without words)
+def get_signatures(bcp47_lang, texts, shingle_size, permutation_count):
+  tokenize = concordance.get_tokenizer(bcp47_lang)
+  masks = get_permutation_masks(permutation_count)
+  results = []
+  for text in texts:
+    shingle_hashes = get_shingle_hashes(tokenize(text), shingle_size)
+    signature = array.array('Q', (min(map(mask.__xor__, shingle_hashes)) for mask in masks) if shingle_hashes else ())
+    results.append((shingle_hashes, signature))
+  return results
+
+
+# Find candidate pairs: paragraphs whose signatures match exactly in at least one band (returns a set of (index, index) tuples, and the number of buckets that were skipped for being larger than max_bucket_size)
+def get_candidate_pairs(signatures, band_count, max_bucket_size):
+  rows_per_band = len(signatures[0]) // band_count if signatures else 0
+  candidate_pairs = set()
+  skipped_bucket_count = 0
+  for band in range(band_count):
+    start = band * rows_per_band
+    buckets = collections.defaultdict(list)
+    for index, signature in enumerate(signatures):
+      if signature:
+        buckets[signature[start:start + rows_per_band].tobytes()].append(index)
+    for indexes in buckets.values():
+      if len(indexes) > max_bucket_size:
+        skipped_bucket_count += 1
+      elif len(indexes) > 1:
+        candidate_pairs.update(itertools.combinations(indexes, 2))
+  return candidate_pairs, skipped_bucket_count
+
+
+# Get the Jaccard similarity of two sets of shingle hashes
+def get_jaccard_similarity(shingle_hashes_1, shingle_hashes_2):
+  union_size = len(shingle_hashes_1 | shingle_hashes_2)
+  return len(shingle_hashes_1 & shingle_hashes_2) / union_size if union_size else 0
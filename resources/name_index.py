@@ -0,0 +1,115 @@
+import bisect
+import functools
+import json
+import re
+import unicodedata
+
+from resources import resources
+
+
+# Normalized name lookup for book and publication names
+# Names and abbreviations are matched by a key that ignores case, punctuation, spaces, and width (like '1 Ne.', '1 ne', '1NE', and '１ Ｎｅ'). Keys are in sorted order, so names that start with a prefix are next to each other and can be found with a binary search (for autocomplete).
+
+# Characters that are left out of keys: code point ranges in Unicode categories P (punctuation) and Z (separators), from Unicode 14.0. The translation table is created from these ranges when the module is loaded, so the first lookup doesn't have to scan every code point.
+ignored_character_ranges = ((0x0020, 0x0023), (0x0025, 0x002A), (0x002C, 0x002F), (0x003A, 0x003B), (0x003F, 0x0040), (0x005B, 0x005D), (0x005F, 0x005F), (0x007B, 0x007B), (0x007D, 0x007D), (0x00A0, 0x00A1), (0x00A7, 0x00A7), (0x00AB, 0x00AB), (0x00B6, 0x00B7), (0x00BB, 0x00BB), (0x00BF, 0x00BF), (0x037E, 0x037E), (0x0387, 0x0387), (0x055A, 0x055F), (0x0589, 0x058A), (0x05BE, 0x05BE), (0x05C0, 0x05C0), (0x05C3, 0x05C3), (0x05C6, 0x05C6), (0x05F3, 0x05F4), (0x0609, 0x060A), (0x060C, 0x060D), (0x061B, 0x061B), (0x061D, 0x061F), (0x066A, 0x066D), (0x06D4, 0x06D4), (0x0700, 0x070D), (0x07F7, 0x07F9), (0x0830, 0x083E), (0x085E, 0x085E), (0x0964, 0x0965), (0x0970, 0x0970), (0x09FD, 0x09FD), (0x0A76, 0x0A76), (0x0AF0, 0x0AF0), (0x0C77, 0x0C77), (0x0C84, 0x0C84), (0x0DF4, 0x0DF4), (0x0E4F, 0x0E4F), (0x0E5A, 0x0E5B), (0x0F04, 0x0F12), (0x0F14, 0x0F14), (0x0F3A, 0x0F3D), (0x0F85, 0x0F85), (0x0FD0, 0x0FD4), (0x0FD9, 0x0FDA), (0x104A, 0x104F), (0x10FB, 0x10FB), (0x1360, 0x1368), (0x1400, 0x1400), (0x166E, 0x166E), (0x1680, 0x1680), (0x169B, 0x169C), (0x16EB, 0x16ED), (0x1735, 0x1736), (0x17D4, 0x17D6), (0x17D8, 0x17DA), (0x1800, 0x180A), (0x1944, 0x1945), (0x1A1E, 0x1A1F), (0x1AA0, 0x1AA6), (0x1AA8, 0x1AAD), (0x1B5A, 0x1B60), (0x1B7D, 0x1B7E), (0x1BFC, 0x1BFF), (0x1C3B, 0x1C3F), (0x1C7E, 0x1C7F), (0x1CC0, 0x1CC7), (0x1CD3, 0x1CD3), (0x2000, 0x200A), (0x2010, 0x2029), (0x202F, 0x2043), (0x2045, 0x2051), (0x2053, 0x205F), (0x207D, 0x207E), (0x208D, 0x208E), (0x2308, 0x230B), (0x2329, 0x232A), (0x2768, 0x2775), (0x27C5, 0x27C6), (0x27E6, 0x27EF), (0x2983, 0x2998), (0x29D8, 0x29DB), (0x29FC, 0x29FD), (0x2CF9, 0x2CFC), (0x2CFE, 0x2CFF), (0x2D70, 0x2D70), (0x2E00, 0x2E2E), (0x2E30, 0x2E4F), (0x2E52, 0x2E5D), (0x3000, 0x3003), (0x3008, 0x3011), (0x3014, 0x301F), (0x3030, 0x3030), (0x303D, 0x303D), (0x30A0, 0x30A0), (0x30FB, 0x30FB), (0xA4FE, 0xA4FF), (0xA60D, 0xA60F), (0xA673, 0xA673), (0xA67E, 0xA67E), (0xA6F2, 0xA6F7), (0xA874, 0xA877), (0xA8CE, 0xA8CF), (0xA8F8, 0xA8FA), (0xA8FC, 0xA8FC), (0xA92E, 0xA92F), (0xA95F, 0xA95F), (0xA9C1, 0xA9CD), (0xA9DE, 0xA9DF), (0xAA5C, 0xAA5F), (0xAADE, 0xAADF), (0xAAF0, 0xAAF1), (0xABEB, 0xABEB), (0xFD3E, 0xFD3F), (0xFE10, 0xFE19), (0xFE30, 0xFE52), (0xFE54, 0xFE61), (0xFE63, 0xFE63), (0xFE68, 0xFE68), (0xFE6A, 0xFE6B), (0xFF01, 0xFF03), (0xFF05, 0xFF0A), (0xFF0C, 0xFF0F), (0xFF1A, 0xFF1B), (0xFF1F, 0xFF20), (0xFF3B, 0xFF3D), (0xFF3F, 0xFF3F), (0xFF5B, 0xFF5B), (0xFF5D, 0xFF5D), (0xFF5F, 0xFF65), (0x10100, 0x10102), (0x1039F, 0x1039F), (0x103D0, 0x103D0), (0x1056F, 0x1056F), (0x10857, 0x10857), (0x1091F, 0x1091F), (0x1093F, 0x1093F), (0x10A50, 0x10A58), (0x10A7F, 0x10A7F), (0x10AF0, 0x10AF6), (0x10B39, 0x10B3F), (0x10B99, 0x10B9C), (0x10EAD, 0x10EAD), (0x10F55, 0x10F59), (0x10F86, 0x10F89), (0x11047, 0x1104D), (0x110BB, 0x110BC), (0x110BE, 0x110C1), (0x11140, 0x11143), (0x11174, 0x11175), (0x111C5, 0x111C8), (0x111CD, 0x111CD), (0x111DB, 0x111DB), (0x111DD, 0x111DF), (0x11238, 0x1123D), (0x112A9, 0x112A9), (0x1144B, 0x1144F), (0x1145A, 0x1145B), (0x1145D, 0x1145D), (0x114C6, 0x114C6), (0x115C1, 0x115D7), (0x11641, 0x11643), (0x11660, 0x1166C), (0x116B9, 0x116B9), (0x1173C, 0x1173E), (0x1183B, 0x1183B), (0x11944, 0x11946), (0x119E2, 0x119E2), (0x11A3F, 0x11A46), (0x11A9A, 0x11A9C), (0x11A9E, 0x11AA2), (0x11C41, 0x11C45), (0x11C70, 0x11C71), (0x11EF7, 0x11EF8), (0x11FFF, 0x11FFF), (0x12470, 0x12474), (0x12FF1, 0x12FF2), (0x16A6E, 0x16A6F), (0x16AF5, 0x16AF5), (0x16B37, 0x16B3B), (0x16B44, 0x16B44), (0x16E97, 0x16E9A), (0x16FE2, 0x16FE2), (0x1BC9F, 0x1BC9F), (0x1DA87, 0x1DA8B), (0x1E95E, 0x1E95F),)
+ignored_characters_table = dict.fromkeys(code_point for (first_code_point, last_code_point) in ignored_character_ranges for code_point in range(first_code_point, last_code_point + 1))
+whitespace_re = re.compile(r'\s+')
+
+# Maximum number of name keys to remember (least recently used keys are dropped first)
+max_cached_names = 100000
+
+
+# Get a key for a name (NFKC-normalized, case-folded, without punctuation or spaces)
+@functools.lru_cache(maxsize=max_cached_names)
+def get_name_key(name):
+  return whitespace_re.sub('', unicodedata.normalize('NFKC', name).casefold().translate(ignored_characters_table))
+
+
+# Build a name index from translatedNames in each language, and from names in mapToSlug that aren't translated names (like slugs, and 'psalm' for 'psalms'; URIs are left out)
+# Returns { 'languages': { bcp47_lang: { key: [slugs] } }, 'aliases': { key: [slugs] }, 'collisions': { bcp47_lang: { key: { slug: [names] } } } }. Every slug is kept for each key. Keys that are used by names for more than one slug in the same language are collisions (the same key can be used for different slugs in different languages, and the language of the reference decides which one is meant).
+def build_name_index(metadata_scriptures):
+  languages = {}
+  collisions = {}
+  translated_keys = set()
+  for bcp47_lang, language_data in sorted(metadata_scriptures['languages'].items()):
+    names_by_key = {}  # { key: { slug: [names] } }
+    for slug, translated_names in language_data['translatedNames'].items():
+      for name in (translated_names.get('name'), translated_names.get('abbrev'),):
+        key = get_name_key(name) if name else None
+        if key:
+          slug_names = names_by_key.setdefault(key, {}).setdefault(slug, [])
+          if name not in slug_names:
+            slug_names.append(name)
+    # A book and its singular slug (like 'psalms' and 'psalm') often share names and abbreviations, and they find the same chapters, so the book slug is used
+    for names_by_slug in names_by_key.values():
+      for book_slug, singular_slug in resources.mapping_book_to_singular_slug.items():
+        if book_slug in names_by_slug and singular_slug in names_by_slug:
+          names_by_slug[book_slug] += [name for name in names_by_slug.pop(singular_slug) if name not in names_by_slug[book_slug]]
+    languages[bcp47_lang] = { key: list(names_by_slug.keys()) for key, names_by_slug in sorted(names_by_key.items()) }
+    language_collisions = { key: names_by_slug for key, names_by_slug in sorted(names_by_key.items()) if len(names_by_slug) > 1 }
+    if language_collisions:
+      collisions[bcp47_lang] = language_collisions
+    translated_keys.update(names_by_key.keys())
+
+  aliases = {}
+  for name, slug in metadata_scriptures['mapToSlug'].items():
+    key = get_name_key(name) if not name.startswith('/') else None
+    if key and key not in translated_keys and slug not in aliases.setdefault(key, []):
+      aliases[key].append(slug)
+  return { 'languages': languages, 'aliases': dict(sorted(aliases.items())), 'collisions': collisions }
+
+
+# Look up slugs by name, or by the start of a name
+class NameIndex:
+  # name_index: from build_name_index (or metadata-name-index.min.json)
+  def __init__(self, name_index):
+    self.languages = name_index['languages']
+    self.aliases = name_index['aliases']
+    self.collisions = name_index['collisions']
+
+    # Slugs for each key in any language (translated names first, then aliases)
+    self.all_slugs = {}
+    for language_names in self.languages.values():
+      for key, slugs in language_names.items():
+        key_slugs = self.all_slugs.setdefault(key, [])
+        key_slugs += [slug for slug in slugs if slug not in key_slugs]
+    # A key can have a book slug in one language and its singular slug in another (like 'Facsimile' for 'facsimile' and 'facsimiles'), so the book slug is used, as in each language
+    for key_slugs in self.all_slugs.values():
+      for book_slug, singular_slug in resources.mapping_book_to_singular_slug.items():
+        if book_slug in key_slugs and singular_slug in key_slugs:
+          key_slugs.remove(singular_slug)
+    for key, slugs in self.aliases.items():
+      self.all_slugs.setdefault(key, list(slugs))
+    self.keys = sorted(self.all_slugs.keys())
+
+  # Load a name index from a file
+  @classmethod
+  def from_file(cls, file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+      return cls(json.load(f))
+
+  # Get the slug for a name (returns None if the name isn't found, or if it matches names for more than one slug)
+  # Names in the given languages are tried first, in order. Otherwise, the name is looked up in all languages, then in aliases.
+  def get_slug(self, name, bcp47_langs=()):
+    slugs = self.get_slugs(name, bcp47_langs)
+    return slugs[0] if len(slugs) == 1 else None
+
+  # Get all slugs for a name (names in the given languages are tried first, like get_slug)
+  def get_slugs(self, name, bcp47_langs=()):
+    key = get_name_key(name)
+    for bcp47_lang in bcp47_langs:
+      slugs = self.languages.get(bcp47_lang, {}).get(key)
+      if slugs:
+        return slugs
+    return self.all_slugs.get(key, [])
+
+  # Get (key, slugs) tuples for names that start with a prefix, in sorted order (up to limit)
+  def search_prefix(self, prefix, limit=10):
+    prefix_key = get_name_key(prefix)
+    results = []
+    for index in range(bisect.bisect_left(self.keys, prefix_key), len(self.keys)):
+      key = self.keys[index]
+      if not key.startswith(prefix_key) or len(results) >= limit:
+        break
+      results.append((key, self.all_slugs[key]))
+    return results
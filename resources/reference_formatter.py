@@ -0,0 +1,101 @@
+from resources import resources
+
+
+# Localized scripture references
+# Canonical references use slugs and Western digits, like '1-nephi-3:7-9,12' (a chapter slug, with optional verses), '1-nephi-3' (a whole chapter), or '1-nephi' (a whole book). They're turned into localized strings like '1 Nephi 3:7–9, 12' or '1 Ne. 3:7–9, 12', with book names, punctuation, and numerals from metadata-scriptures.json.
+# Book and chapter prefixes are created once per language, so formatting a reference is a lookup and a few joins. Numerals are substituted with str.translate, once for a whole batch of references (and not at all for languages that use Western digits).
+
+western_numerals = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
+
+
+class ReferenceFormatter:
+  # metadata_scriptures: contents of metadata-scriptures.json
+  # structure_index: from resources.build_structure_index (or metadata-structure-index.min.json)
+  def __init__(self, metadata_scriptures, structure_index):
+    self.metadata_scriptures = metadata_scriptures
+    self.structure_index = structure_index
+    self.format_tables = {}  # { (bcp47_lang, abbreviated): format_table }
+
+  # Get the format table for a language (created when it's first needed)
+  # A format table has the language's punctuation, a translation table for numerals (None for Western digits), and a prefix for each book and chapter slug (like '1 Nephi' and '1 Nephi 3', with localized numerals).
+  def get_format_table(self, bcp47_lang, abbreviated=False):
+    format_table = self.format_tables.get((bcp47_lang, abbreviated))
+    if format_table:
+      return format_table
+    if bcp47_lang not in self.metadata_scriptures['languages']:
+      raise ValueError(f'Unknown language: {bcp47_lang}')
+    language_data = self.metadata_scriptures['languages'][bcp47_lang]
+    punctuation = language_data['punctuation']
+    numerals = language_data['numerals']
+    # Numerals are None for languages that can't be translated digit by digit (like Amharic), so Western digits are used
+    numeral_table = str.maketrans(dict(zip(western_numerals, numerals))) if numerals and numerals != western_numerals else None
+    translated_names = language_data['translatedNames']
+    english_translated_names = self.metadata_scriptures['languages'].get('en', {}).get('translatedNames', {})
+
+    # Get the name or abbreviation for the first slug that has a name (falls back to the name if there isn't an abbreviation)
+    # Names in the language are used first, then English names (for books that aren't translated in the language, like the Doctrine and Covenants in some languages), and the first slug if none of them have a name.
+    def get_name(*slugs):
+      for names_by_slug in (translated_names, english_translated_names):
+        for slug in slugs:
+          names = names_by_slug.get(slug) or {}
+          if names.get('name'):
+            return (abbreviated and names.get('abbrev')) or names['name']
+      return slugs[0]
+
+    prefixes = {}
+    for book_slug in self.structure_index['books']:
+      prefixes[book_slug] = get_name(book_slug)
+    for chapter_slug, chapter_number, book_ordinal in zip(self.structure_index['chapters'], self.structure_index['chapterNumbers'], self.structure_index['chapterBooks']):
+      book_slug = self.structure_index['books'][book_ordinal]
+      singular_book_slug = resources.mapping_book_to_singular_slug.get(book_slug)
+      if chapter_number.startswith('fac-'):
+        # Abraham facsimiles, like 'Facsimile 3'
+        book_name, chapter_number = get_name('facsimile'), chapter_number[len('fac-'):]
+      elif singular_book_slug:
+        # Psalms, sections, and official declarations, like 'Psalm 23'
+        book_name = get_name(singular_book_slug, book_slug)
+      else:
+        book_name = get_name(book_slug)
+      chapter_number = chapter_number.replace('-', punctuation['verseRangeSeparator'])
+      prefixes[chapter_slug] = book_name + punctuation['bookChapterSeparator'] + (chapter_number.translate(numeral_table) if numeral_table else chapter_number)
+
+    format_table = self.format_tables[(bcp47_lang, abbreviated)] = {
+      'punctuation': punctuation,
+      'numeralTable': numeral_table,
+      'prefixes': prefixes,
+    }
+    return format_table
+
+  # Format a list of canonical references (returns a list of localized strings; raises ValueError for unknown books and chapters)
+  def format_references(self, bcp47_lang, references, abbreviated=False):
+    format_table = self.get_format_table(bcp47_lang, abbreviated)
+    punctuation = format_table['punctuation']
+    prefixes = format_table['prefixes']
+    verse_range_separator = punctuation['verseRangeSeparator']
+    verse_group_separator = punctuation['verseGroupSeparator']
+
+    # Split references into prefixes and verses (verses still have Western digits)
+    reference_prefixes = []
+    reference_verses = []
+    for reference in references:
+      slug, _, verses = reference.partition(':')
+      if slug not in prefixes:
+        raise ValueError(f'Unknown book or chapter: {slug}')
+      reference_prefixes.append(prefixes[slug])
+      reference_verses.append(verse_group_separator.join(verse_range.strip().replace('-', verse_range_separator) for verse_range in verses.split(',')) if verses else '')
+
+    # Substitute numerals for the whole batch at once
+    numeral_table = format_table['numeralTable']
+    if numeral_table:
+      reference_verses = '\n'.join(reference_verses).translate(numeral_table).split('\n')
+
+    chapter_verse_separator = punctuation['chapterVerseSeparator']
+    return [prefix + chapter_verse_separator + verses if verses else prefix for prefix, verses in zip(reference_prefixes, reference_verses)]
+
+  # Format a list of canonical references as a single string (like '1 Nephi 3:7; Mosiah 2:17'), optionally in parentheses
+  def format_reference_list(self, bcp47_lang, references, abbreviated=False, parentheses=False):
+    punctuation = self.get_format_table(bcp47_lang, abbreviated)['punctuation']
+    reference_list = punctuation['referenceSeparator'].join(self.format_references(bcp47_lang, references, abbreviated))
+    if parentheses:
+      reference_list = punctuation['openingParenthesis'] + reference_list + punctuation['closingParenthesis']
+    return reference_list
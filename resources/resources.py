@@ -1,5 +1,8 @@
 import os
 import re
+import csv
+import sys
+from types import MappingProxyType
 from unicodedata import normalize
 
 
@@ -20,6 +23,9 @@ mapping_bcp47_to_church_lang = { 'aa': 'aar', 'af': 'afr', 'am': 'amh', 'amu': '
 # Map from BCP 47 language tags to English language names
 mapping_bcp47_to_english_name = { 'aa': 'Afar', 'af': 'Afrikaans', 'am': 'Amharic', 'amu': 'Amuzgo (Guerrero)', 'apw': 'Apache (Western)', 'ar': 'Arabic', 'ar-Latn': 'Arabic (Romanized)', 'ase': 'American Sign Language (ASL)', 'asf': 'Australian Sign Language (Auslan)', 'awa': 'Awadhi', 'ay': 'Aymara', 'bad': 'Banda', 'bci': 'Baule', 'be': 'Belarusian', 'bem': 'Bemba', 'bfa': 'Bari', 'bfi': 'British Sign Language (BSL)', 'bg': 'Bulgarian', 'bi': 'Bislama', 'bik': 'Bikolano', 'bla': 'Blackfoot', 'bm': 'Bambara', 'bn': 'Bengali', 'bn-Latn': 'Bengali (Romanized)', 'bnt': 'Bantu', 'bs': 'Bosnian', 'bxg': 'Bangala', 'ca': 'Catalan', 'cag': 'Nivaclé', 'cak': 'Kaqchikel (Cakchiquel)', 'cco': 'Chinantec (Comaltepec)', 'ceb': 'Cebuano', 'ch': 'Chamorro', 'chk': 'Chuukese', 'cho': 'Choctaw', 'chr': 'Cherokee', 'chy': 'Cheyenne', 'ckw': 'Kaqchikel (Occidental)', 'cmn': 'Mandarin', 'cmn-Hans': 'Mandarin (Simplified)', 'cmn-Hant': 'Mandarin (Traditional)', 'cmn-Latn': 'Mandarin (Romanized/Pinyin)', 'cs': 'Czech', 'cu': 'Church Slavonic', 'cuk': 'Kuna', 'cy': 'Welsh', 'da': 'Danish', 'dak': 'Dakota', 'de': 'German', 'dv': 'Dhivehi', 'ee': 'Ewe', 'efi': 'Efik', 'el': 'Greek', 'el-Latn': 'Greek (Romanized)', 'en': 'English', 'en-Brai': 'English Braille', 'en-Dsrt': 'English Deseret', 'en-GB': 'English (UK)', 'es': 'Spanish', 'es-419': 'Spanish (Latin America)', 'es-Brai': 'Spanish Braille', 'es-ES': 'Spanish (Spain)', 'es-MX': 'Spanish (Mexico)', 'esk': 'Eskimo', 'et': 'Estonian', 'eu': 'Basque', 'fan': 'Fang', 'fat': 'Fante', 'ff': 'Fulah', 'fi': 'Finnish', 'fj': 'Fijian', 'fon': 'Fon', 'fr': 'French', 'fr-HT': 'French (Haiti)', 'fr-PF': 'French (French Polynesia)', 'fuf': 'Pular', 'fy': 'Frisian (West)', 'ga': 'Irish', 'gaa': 'Ga', 'gd': 'Gaelic', 'gil': 'Kiribati (Gilbertese)', 'gl': 'Galician', 'gn': 'Guarani', 'gpe': 'Ghanaian', 'gul': 'Gullah', 'guz': 'Gusii (Kisii)', 'ha': 'Hausa', 'haw': 'Hawaiian', 'he': 'Hebrew', 'he-Latn': 'Hebrew (Romanized)', 'hi': 'Hindi', 'hi-Latn': 'Hindi (Romanized)', 'hif': 'Hindi (Fiji)', 'hil': 'Hiligaynon', 'hmn': 'Hmong', 'hr': 'Croatian', 'ht': 'Haitian Creole', 'hu': 'Hungarian', 'hwc': 'Hawaiian Pidgin', 'hy': 'Armenian (East)', 'hy-Latn': 'Armenian (Romanized)', 'hyw': 'Armenian (West)', 'iba': 'Iban', 'id': 'Indonesian', 'ig': 'Igbo', 'ilo': 'Ilokano', 'iro': 'Iroquoian', 'is': 'Icelandic', 'it': 'Italian', 'ja': 'Japanese', 'ja-Hani': 'Japanese (Kanji)', 'ja-Hira': 'Japanese (Hiragana)', 'ja-Latn': 'Japanese (Romanized/Romanji)', 'jac': 'Jakaltek (Oriental)', 'jam': 'Patois (Jamaica)', 'jv': 'Javanese', 'ka': 'Georgian', 'kam': 'Kamba', 'kea': 'Creole (Cape Verde)', 'kek': 'Kekchi', 'kg': 'Kongo (Kikongo)', 'kio': 'Kiowa', 'kk': 'Kazakh', 'km': 'Khmer (Cambodian)', 'km-Latn': 'Khmer (Cambodian) (Romanized)', 'kn': 'Kannada', 'ko': 'Korean', 'ko-Latn': 'Korean (Romanized)', 'kos': 'Kosraean', 'kpe': 'Kpelle', 'ksw': 'Karen', 'ku': 'Kurdish', 'la': 'Latin', 'lg': 'Lugandan', 'lkt': 'Lakota', 'ln': 'Lingala', 'lo': 'Laotian', 'lom': 'Loma', 'lou': 'Louisiana Creole', 'lt': 'Lithuanian', 'lua': 'Tshiluba', 'luo': 'Dholuo', 'lv': 'Latvian', 'mam': 'Mam', 'meu': 'Motu', 'mfe': 'Mauritian Creole', 'mg': 'Malagasy', 'mh': 'Marshallese', 'mi': 'Maori', 'mis': 'Narration', 'mk': 'Macedonian', 'ml': 'Malayalam', 'mn': 'Mongolian', 'mnk': 'Mandinka', 'mos': 'Mossi', 'mr': 'Marathi', 'ms': 'Malay', 'mt': 'Maltese', 'mul': 'Multiple languages', 'mus': 'Muscogee', 'mvc': 'Mam (Central)', 'my': 'Burmese (Myanmar)', 'nds': 'German (Low)', 'ne': 'Nepali', 'ngu': 'Nahuatl (Guerrero)', 'niu': 'Niuean', 'nl': 'Dutch', 'no': 'Norwegian', 'nr': 'Ndebele (Southern)', 'nso': 'Sotho (Northern)', 'nv': 'Navajo', 'ny': 'Chewa', 'oj': 'Ojibwe', 'om': 'Oromo', 'om-Ethi': 'Oromo (Ethiopic Script)', 'oma': 'Omaha', 'or': 'Odia (Oriya)', 'pa': 'Punjabi', 'pag': 'Pangasinan', 'pam': 'Pampango (Kapampangan)', 'pap': 'Papiamento', 'pau': 'Palauan', 'paw': 'Pawnee', 'pes': 'Persian (Iran) (Farsi)', 'pga': 'Arabic (Juba)', 'pis': 'Pidgin (Solomon Islands)', 'pl': 'Polish', 'poh': 'Poqomchiʼ', 'pon': 'Pohnpeian', 'ppl': 'Nawat (Pipil)', 'ps': 'Pashto', 'pt': 'Portuguese', 'pt-BR': 'Portuguese (Brazil)', 'pt-PT': 'Portuguese (Portugal)', 'qu': 'Quichua', 'quc': 'Quiche', 'quh': 'Quechua (Bolivia)', 'quz': 'Quechua (Peru)', 'qvi': 'Quichua (Ecuador)', 'rar': 'Rarotongan (Cook Islands Maori)', 'rn': 'Rundi', 'ro': 'Romanian', 'rtm': 'Rotuman', 'ru': 'Russian', 'ru-Latn': 'Russian (Romanized)', 'ru-x-stress': 'Russian (Stress Marks)', 'rw': 'Rwanda', 'si': 'Sinhala', 'sk': 'Slovak', 'sl': 'Slovenian', 'sm': 'Samoan', 'sn': 'Shona', 'so': 'Somali', 'sq': 'Albanian', 'sr': 'Serbian', 'srb': 'Sora', 'srn': 'Sranan', 'ss': 'Swazi', 'st': 'Sotho (Southern)', 'ste': 'Liana', 'sto': 'Stoney Nakoda', 'sv': 'Swedish', 'sw': 'Swahili', 'swc': 'Swahili (Congo)', 'syc': 'Syriac', 'ta': 'Tamil', 'ta-Latn': 'Tamil (Romanized)', 'te': 'Telugu', 'te-Latn': 'Telugu (Romanized)', 'th': 'Thai', 'th-Latn': 'Thai (Romanized)', 'tl': 'Tagalog', 'tn': 'Tswana (Setswana)', 'to': 'Tongan', 'tpi': 'Tok Pisin (Neomelanesian)', 'tr': 'Turkish', 'tr-Armn': 'Turkish (Armenian Script)', 'tvl': 'Tuvalu', 'tw': 'Twi', 'ty': 'Tahitian', 'tzj': 'Tz’utujil', 'tzo': 'Tzotzil', 'uk': 'Ukrainian', 'und': 'Undetermined', 'ur': 'Urdu', 'usp': 'Uspantek', 'uz': 'Uzbek', 'vi': 'Vietnamese', 'war': 'Waray', 'wo': 'Wolof', 'wyn': 'Wyandot', 'xh': 'Xhosa', 'yap': 'Yapese', 'yi': 'Yiddish', 'yi-Latn': 'Yiddish (Romanized)', 'yo': 'Yoruba', 'yua': 'Maya (Yucatec)', 'yue': 'Cantonese', 'yue-Hant': 'Cantonese (Traditional)', 'yue-Latn': 'Cantonese (Romanized/Pingyam)', 'zdj': 'Comorian', 'zh': 'Chinese', 'zh-Hans': 'Chinese (Simplified)', 'zh-Hant': 'Chinese (Traditional)', 'zh-Latn': 'Chinese (Romanized)', 'zh-Latn-TW': 'Taiwanese (Romanized)', 'zh-TW': 'Taiwanese', 'znd': 'Ngala (Zande)', 'zu': 'Zulu', 'zun': 'Zuni', 'zxx': 'Instrumental' }
 
+# Reverse mapping, for converting a singular slug back to the book slug
+mapping_singular_slug_to_book = dict((singular, plural) for plural, singular in mapping_book_to_singular_slug.items() if singular != 'doctrine-and-covenants')
+
 # Mapping from paragraph type slug to paragraph type abbreviation
 mapping_paragraph_type_to_paragraph_type_abbrev = {
   'paragraph': 'p',
@@ -35,6 +41,10 @@ mapping_paragraph_type_to_paragraph_type_abbrev = {
   'study-footnotes': 'sft',
 }
 
+# Fields in tabular output (CSV, TSV, SQL) that hold integers, or text that may be empty (other empty fields are null)
+tabular_integer_fields = ('pubPosition', 'pubIsHistorical', 'pubIsManuscript', 'chPosition', 'parPosition',)
+tabular_text_fields = ('parContent', 'parContentHtml',)
+
 
 # METADATA
 
@@ -977,6 +987,93 @@ with open(os.path.join(templates_directory, 'template-sqlite.sql'), 'r', encodin
   sql_sqlite_template = f.read()
 
 
+# TABULAR ROWS
+
+# Row in tabular output (CSV, TSV, SQL)
+# Rows are compact records with a fixed list of fields, but can be used like dicts (with csv.DictWriter, create_sql_insert_statement, dict(), and row['field']). Repeated values (like publication keys, chapter slugs, and paragraph types) are interned, so rows share one copy of each value.
+class TabularRow:
+  __slots__ = ()
+  fields = ()
+  interned_fields = ()
+  
+  def __init__(self, **values):
+    for field in self.fields:
+      self[field] = values.pop(field, None)
+    if values:
+      raise TypeError('Unknown fields for {0}: {1}'.format(type(self).__name__, ', '.join(values)))
+  
+  def __getitem__(self, field):
+    try:
+      return getattr(self, field)
+    except AttributeError:
+      raise KeyError(field)
+  
+  def __setitem__(self, field, value):
+    if field in self.interned_fields and type(value) is str:
+      value = sys.intern(value)
+    setattr(self, field, value)
+  
+  def __iter__(self):
+    return iter(self.fields)
+  
+  def __len__(self):
+    return len(self.fields)
+  
+  def __contains__(self, field):
+    return field in self.fields
+  
+  def __eq__(self, other):
+    return dict(self.items()) == dict(other.items())
+  
+  def __repr__(self):
+    return '{0}({1})'.format(type(self).__name__, dict(self.items()))
+  
+  def __getstate__(self):
+    return self.values()
+  
+  def __setstate__(self, values):
+    for field, value in zip(self.fields, values):
+      self[field] = value
+  
+  def get(self, field, default=None):
+    return getattr(self, field, default)
+  
+  def keys(self):
+    return self.field_keys
+  
+  def values(self):
+    return [getattr(self, field) for field in self.fields]
+  
+  def items(self):
+    return [(field, getattr(self, field)) for field in self.fields]
+  
+  # Set up a row type's fields (field_keys is a dict keys view, because csv.DictWriter compares row keys with set operations)
+  @staticmethod
+  def define(row_type):
+    row_type.field_keys = dict.fromkeys(row_type.fields).keys()
+    return row_type
+
+@TabularRow.define
+class PublicationRow(TabularRow):
+  fields = __slots__ = ('pubKey', 'langBcp47', 'pubPosition', 'pubSlug', 'pubName', 'pubVersionSlug', 'pubVersionAbbrev', 'pubVersionName', 'pubEditionYear', 'pubFirstEditionYear', 'pubCopyrightStatement', 'pubCopyrightOwner', 'pubCategory', 'pubIsHistorical', 'pubIsManuscript', 'pubSource', 'pubSourceUrl', 'pubChurchUri',)
+  interned_fields = frozenset(('langBcp47', 'pubCategory', 'pubSource', 'pubCopyrightOwner',))
+
+@TabularRow.define
+class ChapterRow(TabularRow):
+  fields = __slots__ = ('pubKey', 'chPosition', 'chSlug', 'chName', 'chAbbrev', 'chNumber', 'bookSlug', 'chChurchUri',)
+  interned_fields = frozenset(('pubKey', 'chNumber', 'bookSlug',))
+
+@TabularRow.define
+class ChapterMediaRow(TabularRow):
+  fields = __slots__ = ('pubKey', 'chSlug', 'chmType', 'chmSubType', 'chmUrl', 'chmImageUrl', 'chmStartSeconds', 'chmEndSeconds', 'chmSource', 'chmChurchAssetId', 'chmChurchImageAssetId',)
+  interned_fields = frozenset(('pubKey', 'chSlug', 'chmType', 'chmSubType', 'chmSource',))
+
+@TabularRow.define
+class ParagraphRow(TabularRow):
+  fields = __slots__ = ('pubKey', 'chSlug', 'parPosition', 'parType', 'parId', 'parContent', 'parContentHtml', 'parNumber', 'parPageNumber', 'parCompareId', 'parChurchId',)
+  interned_fields = frozenset(('pubKey', 'chSlug', 'parType', 'parNumber', 'parPageNumber',))
+
+
 # FUNCTIONS
 
 # Convert a string with spaces (like 'Book of Mormon') to a slug (like 'book-of-mormon')
@@ -991,6 +1088,10 @@ def slugify(text, delim='-'):
       result.append(word)
   return delim.join(result)
 
+# Get the values in a row for a SQL INSERT statement
+def get_sql_values_string(item):
+  return ', '.join([(str(value) if isinstance(value, int) else ('NULL' if value is None else f'\'{value}\'')) for value in item.values()])
+
 # Create SQL insert statement for adding rows to a table
 def create_sql_insert_statement(table_name, dict_list):
   statement = ''
@@ -1002,12 +1103,138 @@ def create_sql_insert_statement(table_name, dict_list):
     num_items = len(dict_list)
     for i, item in enumerate(dict_list):
       line_end_punctuation = ';' if (i == num_items - 1) else ','
-      field_values_string = ', '.join([(str(value) if isinstance(value, int) else ('NULL' if value is None else f'\'{value}\'')) for value in item.values()])
-      statement += f'  ({field_values_string}){line_end_punctuation}\n'
+      statement += f'  ({get_sql_values_string(item)}){line_end_punctuation}\n'
       
     statement += '\n'
   return statement
 
+# Get the slug for a chapter (like '1-nephi-3', 'psalm-119', or 'section-76')
+# Facsimiles are chapters of Abraham, so facsimile 1 (from a reference like 'Facsimile 1') is 'abraham-fac-1'
+def get_chapter_slug(book_slug, chapter):
+  singular_book_slug = mapping_book_to_singular_slug.get(book_slug) or book_slug
+  if singular_book_slug == 'facsimile':
+    return 'abraham-fac-{0}'.format(chapter)
+  return '{0}-{1}'.format('section' if singular_book_slug == 'doctrine-and-covenants' else singular_book_slug, chapter)
+
+# Build a flat, read-only index of a scripture structure, so that publications, books, and chapters can be looked up without scanning the nested structure
+# Books and chapters are stored in canonical order, and each one is identified by its ordinal (position in the index). Chapters for a book are found with bookChapterOffsets[book]:bookChapterOffsets[book + 1].
+def build_structure_index(structure):
+  publications = []
+  publication_book_offsets = [0]
+  books = []
+  book_publications = []
+  book_chapter_offsets = [0]
+  chapters = []
+  chapter_numbers = []
+  chapter_uris = []
+  chapter_books = []
+  uri_to_slug = {}
+  
+  for publication_slug, publication_data in structure.items():
+    publication_ordinal = len(publications)
+    publications.append(publication_slug)
+    if publication_data['churchUri']:
+      uri_to_slug[publication_data['churchUri']] = publication_slug
+    for book_slug, book_data in publication_data['books'].items():
+      book_ordinal = len(books)
+      books.append(book_slug)
+      book_publications.append(publication_ordinal)
+      if book_data['churchUri']:
+        uri_to_slug[book_data['churchUri']] = book_slug
+        for chapter in book_data['churchChapters']:
+          chapters.append(get_chapter_slug(book_slug, chapter))
+          chapter_numbers.append(str(chapter))
+          chapter_uris.append('{0}/{1}'.format(book_data['churchUri'], chapter))
+          chapter_books.append(book_ordinal)
+      book_chapter_offsets.append(len(chapters))
+    publication_book_offsets.append(len(books))
+  
+  return MappingProxyType({
+    'publications': tuple(publications),
+    'publicationBookOffsets': tuple(publication_book_offsets),
+    'books': tuple(books),
+    'bookPublications': tuple(book_publications),
+    'bookChapterOffsets': tuple(book_chapter_offsets),
+    'chapters': tuple(chapters),
+    'chapterNumbers': tuple(chapter_numbers),
+    'chapterUris': tuple(chapter_uris),
+    'chapterBooks': tuple(chapter_books),
+    'uriToSlug': MappingProxyType(uri_to_slug),
+    'publicationOrdinals': MappingProxyType(dict((slug, ordinal) for ordinal, slug in enumerate(publications))),
+    'bookOrdinals': MappingProxyType(dict((slug, ordinal) for ordinal, slug in enumerate(books))),
+    'chapterOrdinals': MappingProxyType(dict((slug, ordinal) for ordinal, slug in enumerate(chapters))),
+    'chapterUriOrdinals': MappingProxyType(dict((uri, ordinal) for ordinal, uri in enumerate(chapter_uris))),
+  })
+
+# Select a slice of a scripture structure, keeping canonical order
+# Publications and books are selected by slug (if neither is given, everything is selected). Chapters are selected with a comma-separated list of chapter numbers and ranges (like '1-5,7,fac-3').
+def select_structure(structure, publication_slugs=None, book_slugs=None, chapters=None):
+  structure_index = build_structure_index(structure)
+  publication_slugs = set(publication_slugs or [])
+  book_slugs = set(mapping_singular_slug_to_book.get(slug, slug) for slug in (book_slugs or []))
+  for slug in publication_slugs:
+    if slug not in structure_index['publicationOrdinals']:
+      raise ValueError('Unknown publication: {0}'.format(slug))
+  for slug in book_slugs:
+    if slug not in structure_index['bookOrdinals']:
+      raise ValueError('Unknown book: {0}'.format(slug))
+  
+  # Check whether a chapter matches the list of chapter numbers and ranges
+  chapter_tokens = [token.strip() for token in chapters.split(',') if token.strip()] if chapters else []
+  def is_selected_chapter(chapter):
+    if not chapter_tokens:
+      return True
+    for token in chapter_tokens:
+      range_matches = re.match(r'^(\d+)[-–](\d+)$', token)
+      if token == str(chapter):
+        return True
+      elif range_matches and isinstance(chapter, int) and int(range_matches.group(1)) <= chapter <= int(range_matches.group(2)):
+        return True
+    return False
+  
+  selected_structure = {}
+  for publication_slug, publication_data in structure.items():
+    selected_books = {}
+    for book_slug, book_data in publication_data['books'].items():
+      if (publication_slugs or book_slugs) and publication_slug not in publication_slugs and book_slug not in book_slugs:
+        continue
+      selected_chapters = [chapter for chapter in book_data['churchChapters'] if is_selected_chapter(chapter)]
+      if selected_chapters:
+        selected_books[book_slug] = dict(book_data, churchChapters=selected_chapters)
+    if selected_books:
+      selected_structure[publication_slug] = dict(publication_data, books=selected_books)
+  
+  if not selected_structure:
+    raise ValueError('No chapters match the selection')
+  return selected_structure
+
+# Read rows from a CSV or TSV file created by the scraper, restoring integer and null values (rows are converted to row_type if it's given and the columns match)
+def read_dicts_from_csv(file_path, delimiter=',', row_type=None):
+  dict_list = []
+  with open(file_path, 'r', newline='', encoding='utf-8') as f:
+    for row in csv.DictReader(f, delimiter=delimiter):
+      for key, value in row.items():
+        if key in tabular_integer_fields:
+          row[key] = int(value)
+        elif value == '' and key not in tabular_text_fields:
+          row[key] = None
+      if row_type and tuple(row.keys()) == row_type.fields:
+        row = row_type(**row)
+      dict_list.append(row)
+  return dict_list
+
+# Merge rows from a previous run with newly-scraped rows
+# Existing rows with a replaced key are dropped, rows are put in canonical order (using the ordinal for each row's sort field), and positions are renumbered
+# The key field can be a tuple of fields, in which case replaced keys are tuples of those fields' values
+def merge_dict_lists(existing_dict_list, new_dict_list, key_field, replaced_keys, sort_field, ordinals, position_field=None):
+  get_key = (lambda row: tuple(row[field] for field in key_field)) if isinstance(key_field, tuple) else (lambda row: row[key_field])
+  merged_dict_list = [row for row in existing_dict_list if get_key(row) not in replaced_keys] + new_dict_list
+  merged_dict_list.sort(key=lambda row: ordinals.get(row[sort_field], len(ordinals)))
+  if position_field:
+    for position, row in enumerate(merged_dict_list):
+      row[position_field] = position
+  return merged_dict_list
+
 # Get metadata summary
 def get_metadata_summary(metadata_scriptures):
   first_lang_data = next(iter(metadata_scriptures['languages'].values()))
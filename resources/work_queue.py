@@ -0,0 +1,120 @@
+import json
+import sqlite3
+import time
+
+
+# Durable work queue for scraping full content with several worker processes or nodes
+# The queue is a single SQLite file. Each unit of work is one chapter in one language. Workers lease units, and a unit whose lease expires (because its worker stopped or lost its connection) can be leased again by another worker.
+
+queue_schema = '''
+CREATE TABLE IF NOT EXISTS QueueMetadata (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS QueueUnit (
+  unitId INTEGER PRIMARY KEY AUTOINCREMENT,
+  langBcp47 TEXT NOT NULL,
+  pubSlug TEXT NOT NULL,
+  bookSlug TEXT NOT NULL,
+  chapter TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pending',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  leaseOwner TEXT,
+  leaseExpires REAL,
+  result TEXT,
+  error TEXT,
+  UNIQUE (langBcp47, bookSlug, chapter)
+);
+CREATE INDEX IF NOT EXISTS QueueUnitStatus ON QueueUnit (status, unitId);
+'''
+
+
+# Open a work queue (the file is created if it doesn't exist)
+def open_queue(queue_path):
+  connection = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+  connection.executescript(queue_schema)
+  return connection
+
+
+# Store a JSON-serializable value in the queue (used to share metadata and settings with workers and the reducer)
+def set_value(connection, key, value):
+  connection.execute('INSERT OR REPLACE INTO QueueMetadata (key, value) VALUES (?, ?)', (key, json.dumps(value, ensure_ascii=False, default=list)))
+
+
+# Get a value stored in the queue
+def get_value(connection, key, default=None):
+  row = connection.execute('SELECT value FROM QueueMetadata WHERE key = ?', (key,)).fetchone()
+  return json.loads(row[0]) if row else default
+
+
+# Add units to the queue (units that are already in the queue keep their status and results)
+def enqueue_units(connection, units):
+  connection.execute('BEGIN IMMEDIATE')
+  try:
+    cursor = connection.executemany(
+      'INSERT OR IGNORE INTO QueueUnit (langBcp47, pubSlug, bookSlug, chapter) VALUES (?, ?, ?, ?)',
+      ((unit['langBcp47'], unit['pubSlug'], unit['bookSlug'], str(unit['chapter'])) for unit in units))
+    connection.execute('COMMIT')
+  except:
+    connection.execute('ROLLBACK')
+    raise
+  return cursor.rowcount
+
+
+# Lease the next available unit (returns None if no units are available right now)
+# Pending units are leased first, then units whose lease has expired. Units that have used up max_attempts are marked as failed.
+def lease_unit(connection, worker_id, lease_seconds, max_attempts):
+  connection.execute('BEGIN IMMEDIATE')
+  try:
+    now = time.time()
+    connection.execute('UPDATE QueueUnit SET status = \'failed\', error = COALESCE(error, \'Lease expired\') WHERE status = \'leased\' AND leaseExpires < ? AND attempts >= ?', (now, max_attempts))
+    row = connection.execute('SELECT unitId, langBcp47, pubSlug, bookSlug, chapter, attempts FROM QueueUnit WHERE status = \'pending\' OR (status = \'leased\' AND leaseExpires < ?) ORDER BY status = \'leased\', unitId LIMIT 1', (now,)).fetchone()
+    if row:
+      connection.execute('UPDATE QueueUnit SET status = \'leased\', attempts = attempts + 1, leaseOwner = ?, leaseExpires = ? WHERE unitId = ?', (worker_id, now + lease_seconds, row[0]))
+    connection.execute('COMMIT')
+  except:
+    connection.execute('ROLLBACK')
+    raise
+  if not row:
+    return None
+  return {
+    'unitId': row[0],
+    'langBcp47': row[1],
+    'pubSlug': row[2],
+    'bookSlug': row[3],
+    'chapter': row[4],
+    'attempts': row[5] + 1,
+  }
+
+
+# Mark a unit as done, and store its result
+# Only the worker that holds the lease can complete a unit (returns False if the lease expired and the unit was leased by another worker)
+def complete_unit(connection, unit_id, worker_id, result):
+  cursor = connection.execute('UPDATE QueueUnit SET status = \'done\', leaseOwner = NULL, leaseExpires = NULL, result = ?, error = NULL WHERE unitId = ? AND status = \'leased\' AND leaseOwner = ?', (json.dumps(result, ensure_ascii=False, default=dict), unit_id, worker_id))
+  return cursor.rowcount > 0
+
+
+# Record a failed attempt (the unit goes back to pending until it has used up max_attempts)
+# Only the worker that holds the lease can fail a unit (returns False if the lease expired and the unit was leased by another worker)
+def fail_unit(connection, unit_id, worker_id, error, max_attempts):
+  cursor = connection.execute('UPDATE QueueUnit SET status = CASE WHEN attempts >= ? THEN \'failed\' ELSE \'pending\' END, leaseOwner = NULL, leaseExpires = NULL, error = ? WHERE unitId = ? AND status = \'leased\' AND leaseOwner = ?', (max_attempts, error, unit_id, worker_id))
+  return cursor.rowcount > 0
+
+
+# Get the number of units with each status
+def get_unit_counts(connection):
+  unit_counts = { 'pending': 0, 'leased': 0, 'done': 0, 'failed': 0 }
+  for status, count in connection.execute('SELECT status, COUNT(*) FROM QueueUnit GROUP BY status'):
+    unit_counts[status] = count
+  return unit_counts
+
+
+# Get the result for a completed unit (returns None if the unit isn't done)
+def get_unit_result(connection, bcp47_lang, book_slug, chapter):
+  row = connection.execute('SELECT result FROM QueueUnit WHERE langBcp47 = ? AND bookSlug = ? AND chapter = ? AND status = \'done\'', (bcp47_lang, book_slug, str(chapter))).fetchone()
+  return json.loads(row[0]) if row else None
+
+
+# Get units that failed, with their last error
+def get_failed_units(connection):
+  return connection.execute('SELECT langBcp47, bookSlug, chapter, attempts, error FROM QueueUnit WHERE status = \'failed\' ORDER BY unitId').fetchall()
@@ -2,24 +2,45 @@
 import os
 import sys
 import shutil
+import tempfile
 import json
 import csv
+import io
 from datetime import date, datetime
-import time
 import copy
 import re
+import hashlib
+import argparse
+import collections
+import concurrent.futures
+import threading
+import multiprocessing
+import socket
+import time
 
 # Third-party libraries
-import requests
-from bs4 import BeautifulSoup, Tag
-from markdownify import MarkdownConverter, markdownify
+from bs4 import BeautifulSoup, NavigableString, Tag
+import soupsieve
 
 # Internal imports
-from resources import resources, config
+from resources import resources, config, fetch, work_queue, markdown_renderer, concordance, corpus_statistics, cross_references, binary_metadata, name_index
 
 # python-scripture-scraper version
 VERSION = '2.2'
 
+# Full content output formats (command-line name: config key)
+output_formats = {
+  'json': 'OUTPUT_AS_JSON',
+  'html': 'OUTPUT_AS_HTML',
+  'md': 'OUTPUT_AS_MD',
+  'txt': 'OUTPUT_AS_TXT',
+  'csv': 'OUTPUT_AS_CSV',
+  'tsv': 'OUTPUT_AS_TSV',
+  'sql-mysql': 'OUTPUT_AS_SQL_MYSQL',
+  'sql-sqlite': 'OUTPUT_AS_SQL_SQLITE',
+  'store': 'OUTPUT_AS_STORE',
+}
+
 # URL patterns
 languages_url = 'https://www.churchofjesuschrist.org/languages/api/languages?lang=eng'
 study_url = 'https://www.churchofjesuschrist.org/study{0}?lang={1}&mboxDisable=1'
@@ -27,9 +48,39 @@ abbreviations_url = 'https://www.churchofjesuschrist.org/study/scriptures/quad/q
 
 working_directory = os.path.abspath(os.path.dirname(__file__))
 output_directory = os.path.join(working_directory, '_output')
+staging_directory = None
+queue_path = os.path.join(working_directory, '_queue.sqlite')
+
+# Config values that each worker node keeps for itself when settings are loaded from a work queue
+node_config_keys = ('SECONDS_TO_PAUSE_BETWEEN_REQUESTS', 'MAX_CONCURRENT_REQUESTS', 'QUEUE_LEASE_SECONDS', 'QUEUE_MAX_ATTEMPTS',)
 
 skipped_languages = set()
 incomplete_publications = set()
+failed_chapters = []
+
+# Paragraph content hashes from this run, by language and chapter (used to find changes since the previous run)
+paragraph_hashes_by_language = {}
+
+# Corpus statistics from this run, by language
+statistics_by_language = {}
+
+# Output file hashes from the previous run and this run (paths are relative to the output directory)
+previous_file_hashes = {}
+output_file_hashes = {}
+
+# Thread pool for fetching chapters, and process pool for rendering them (shared by all languages; created when first needed)
+fetch_executor = None
+render_executor = None
+executor_lock = threading.Lock()
+
+# Files that aren't included in output file hashes
+hash_excluded_files = ('metadata-hashes.min.json', 'changes.json',)
+
+# Files that aren't included in changes.json (README.txt has the time of the run, so it's different every time)
+change_excluded_files = ('README.txt',)
+
+# Files from the previous run that aren't kept when merging (like paragraph store object files that no longer have any texts)
+removed_output_files = set()
 
 date_today = date.today()
 
@@ -69,43 +120,82 @@ metadata_scriptures_language_template = {
   },
 }
 
-def main():
-  # Create an empty output directory
-  shutil.rmtree(output_directory, ignore_errors=True)
-  os.makedirs(output_directory)
+def main(args=None):
+  args = args or parse_arguments([])
+  
+  if args.work:
+    # Scrape chapters from the work queue (output files are created by the reducer)
+    run_queue_workers(args.queue, args.workers)
+    return
+  
+  queue = None
+  if args.enqueue or args.reduce:
+    queue = work_queue.open_queue(args.queue)
+  if args.reduce:
+    # Use the arguments, settings, and metadata from the run that filled the queue
+    if not work_queue.get_value(queue, 'arguments'):
+      sys.exit('Error: Nothing has been queued in {0}'.format(args.queue))
+    args = load_queue_state(queue, args)
+  
+  full_content_langs = args.languages or [config.DEFAULT_LANG]
+  scrape_all_languages = (full_content_langs == ['all'])
+  is_partial_run = bool(args.publications or args.books or args.chapters)
+  merge_output = args.merge or is_partial_run
+  
+  # Create an empty staging directory (output is written there, and replaces the output directory at the end of the run)
+  global staging_directory
+  global previous_file_hashes
+  staging_directory = output_directory + '.staging'
+  recover_output_directory()
+  shutil.rmtree(staging_directory, ignore_errors=True)
+  os.makedirs(staging_directory)
+  previous_hashes = load_previous_hashes()
+  previous_file_hashes = previous_hashes['files'] if previous_hashes else {}
+  
+  if merge_output:
+    # Reuse metadata from the previous run
+    load_existing_metadata()
   
   global metadata_structure
+  global structure_index
   global languages
     
   if config.USE_TEST_DATA:
     # Use test data (only includes a subset of chapters)
     metadata_structure = resources.test_data_structure
-    languages = get_languages([config.DEFAULT_LANG, 'en'])
+    selected_langs = None if scrape_all_languages else full_content_langs + ['en']
     
   else:
     metadata_structure = resources.metadata_structure
+    selected_langs = None if (config.SCRAPE_METADATA_FOR_ALL_LANGUAGES or scrape_all_languages) else full_content_langs
+  
+  # Get list of languages (languages with metadata from a previous run don't need to be fetched again)
+  languages = [language for language in get_existing_languages() if not selected_langs or language['bcp47_lang'] in selected_langs]
+  missing_langs = [lang for lang in (selected_langs or []) if lang not in metadata_languages['languages']]
+  if missing_langs or (not selected_langs and not languages):
+    existing_langs = set(language['bcp47_lang'] for language in languages)
+    languages += [language for language in get_languages(selected_langs) if language['bcp47_lang'] not in existing_langs]
     
-    # Get list of languages
-    if config.SCRAPE_METADATA_FOR_ALL_LANGUAGES:
-      languages = get_languages()
-    else:
-      languages = get_languages([config.DEFAULT_LANG])
-    
+  # Index the structure once, so publications, books, and chapters can be looked up directly
+  structure_index = resources.build_structure_index(metadata_structure)
+  
+  # Select the part of the structure that full content should be scraped for
+  try:
+    content_structure = resources.select_structure(metadata_structure, args.publications, args.books, args.chapters) if is_partial_run else metadata_structure
+  except ValueError as e:
+    sys.exit('Error: {0}'.format(e))
+  
   metadata_scriptures['structure'] = metadata_structure
-  for publication_slug, publication_data in metadata_structure.items():
-    metadata_scriptures['mapToSlug'][publication_slug] = publication_slug
-    if publication_data['churchUri']:
-      metadata_scriptures['mapToSlug'][publication_data['churchUri']] = publication_slug
-    for book_slug, book_data in publication_data['books'].items():
-      metadata_scriptures['mapToSlug'][book_slug] = book_slug
-      if book_data['churchUri']:
-        metadata_scriptures['mapToSlug'][book_data['churchUri']] = book_slug
+  for slug in structure_index['publications'] + structure_index['books']:
+    metadata_scriptures['mapToSlug'][slug] = slug
+  metadata_scriptures['mapToSlug'].update(structure_index['uriToSlug'])
   for plural, singular in resources.mapping_book_to_singular_slug.items():
     metadata_scriptures['mapToSlug'][singular] = plural
   
   # Gather metadata for each language
   for language in languages:
-    time.sleep(config.SECONDS_TO_PAUSE_BETWEEN_REQUESTS)
+    if language['bcp47_lang'] in metadata_scriptures['languages']:
+      continue
     gather_metadata_for_language(language)
   
   # Print language metadata warnings
@@ -117,55 +207,277 @@ def main():
 
   # Create metadata files
   sys.stdout.write('Creating metadata-languages.json\n')
-  with open(os.path.join(output_directory, 'metadata-languages.json'), 'w', encoding='utf-8') as f:
-    json.dump(metadata_languages, fp=f, indent=config.JSON_INDENT, separators=(', ', ': '), ensure_ascii=False, sort_keys=False)
-  with open(os.path.join(output_directory, 'metadata-languages.min.json'), 'w', encoding='utf-8') as f:
-    json.dump(metadata_languages, fp=f, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False)
+  write_output_file('metadata-languages.json', json.dumps(metadata_languages, indent=config.JSON_INDENT, separators=(', ', ': '), ensure_ascii=False, sort_keys=False))
+  write_output_file('metadata-languages.min.json', json.dumps(metadata_languages, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False))
 
   sys.stdout.write('Creating metadata-scriptures.json\n')
   metadata_scriptures['mapToSlug'] = dict(sorted(metadata_scriptures['mapToSlug'].items()))
   metadata_scriptures['summary'] = resources.get_metadata_summary(metadata_scriptures)
-  with open(os.path.join(output_directory, 'metadata-scriptures.json'), 'w', encoding='utf-8') as f:
-    json.dump(metadata_scriptures, fp=f, indent=config.JSON_INDENT, separators=(', ', ': '), ensure_ascii=False, sort_keys=False, default=lambda x: list(x) if isinstance(x, set) else x)
-  with open(os.path.join(output_directory, 'metadata-scriptures.min.json'), 'w', encoding='utf-8') as f:
-    json.dump(metadata_scriptures, fp=f, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False, default=lambda x: list(x) if isinstance(x, set) else x)
+  write_output_file('metadata-scriptures.json', json.dumps(metadata_scriptures, indent=config.JSON_INDENT, separators=(', ', ': '), ensure_ascii=False, sort_keys=False, default=lambda x: sorted(x) if isinstance(x, set) else x))
+  write_output_file('metadata-scriptures.min.json', json.dumps(metadata_scriptures, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False, default=lambda x: sorted(x) if isinstance(x, set) else x))
+  if config.OUTPUT_SECTIONED_METADATA:
+    write_output_file('metadata-scriptures.bin', binary_metadata.get_sectioned_metadata(metadata_scriptures, metadata_scriptures['_about']))
+  
+  sys.stdout.write('Creating metadata-name-index.min.json\n')
+  metadata_name_index = { '_about': metadata_scriptures['_about'], **name_index.build_name_index(metadata_scriptures) }
+  write_output_file('metadata-name-index.min.json', json.dumps(metadata_name_index, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False))
+  collision_count = sum(len(language_collisions) for language_collisions in metadata_name_index['collisions'].values())
+  if collision_count:
+    print_warning('Warning: {0} name{1} match more than one slug in the same language when case and punctuation are ignored (see collisions in metadata-name-index.min.json).\n'.format(collision_count, 's'[:collision_count^1]))
+  
+  sys.stdout.write('Creating metadata-structure-index.min.json\n')
+  write_output_file('metadata-structure-index.min.json', json.dumps(structure_index, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False, default=dict))
 
   if config.SCRAPE_FULL_CONTENT:
     # Output full content
     sys.stdout.write('\n')
-    output_full_content(config.DEFAULT_LANG)
+    if scrape_all_languages:
+      full_content_langs = sorted(metadata_scriptures['languages'].keys())
+    for bcp47_lang in full_content_langs:
+      if bcp47_lang not in metadata_scriptures['languages']:
+        print_warning('Warning: Skipping full content for {0} (no scripture metadata).\n'.format(bcp47_lang))
+    full_content_langs = [bcp47_lang for bcp47_lang in full_content_langs if bcp47_lang in metadata_scriptures['languages']]
+    
+    if args.enqueue:
+      # Queue chapters for workers (output files are created later by the reducer)
+      enqueue_full_content(queue, args, full_content_langs, content_structure)
+      shutil.rmtree(staging_directory)
+      sys.stdout.write('\nDone! Run `python3 scrape.py --work` to scrape queued chapters, then `python3 scrape.py --reduce` to create output files.\n\n')
+      return
+    
+    elif args.reduce:
+      # Assemble output from chapters that were scraped by workers
+      version_infos = work_queue.get_value(queue, 'versionInfos')
+      for bcp47_lang in full_content_langs:
+        output_full_content(bcp47_lang, content_structure, merge_output,
+          get_chapter_result=lambda book_slug, chapter, bcp47_lang=bcp47_lang: work_queue.get_unit_result(queue, bcp47_lang, book_slug, chapter),
+          version_infos=version_infos[bcp47_lang])
+      unit_counts = work_queue.get_unit_counts(queue)
+      if unit_counts['pending'] or unit_counts['leased']:
+        print_warning('Warning: {0} queued chapter{1} haven’t been scraped yet, and were left out.\n'.format(unit_counts['pending'] + unit_counts['leased'], 's'[:(unit_counts['pending'] + unit_counts['leased'])^1]))
+      for bcp47_lang, book_slug, chapter, attempts, error in work_queue.get_failed_units(queue):
+        print_warning('Warning: {0}/{1} {2} failed after {3} attempt{4}, and was left out ({5}).\n'.format(bcp47_lang, book_slug, chapter, attempts, 's'[:attempts^1], error))
+    
+    else:
+      # Languages are scraped in parallel (requests from all languages share the same connection pool and rate limiter)
+      with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(len(full_content_langs), config.MAX_CONCURRENT_REQUESTS))) as executor:
+        futures = [executor.submit(output_full_content, bcp47_lang, content_structure, merge_output) for bcp47_lang in full_content_langs]
+        for future in futures:
+          future.result()
+    
+    # Stop the threads and processes that fetched and rendered chapters
+    global fetch_executor
+    global render_executor
+    if fetch_executor:
+      fetch_executor.shutdown()
+      fetch_executor = None
+    if render_executor:
+      render_executor.shutdown()
+      render_executor = None
+    
+    if failed_chapters:
+      print_warning('Warning: {0} chapter{1} couldn’t be scraped, and {2} left out ({3}).\n\n'.format(len(failed_chapters), 's'[:len(failed_chapters)^1], 'was' if len(failed_chapters) == 1 else 'were', ', '.join(failed_chapters)))
+    
+    if statistics_by_language:
+      output_statistics(merge_output)
     
     if config.ADD_CSS_STYLESHEET:
       # Output CSS stylesheet
       sys.stdout.write('Creating styles.css\n\n')
-      css_path = os.path.join(output_directory, 'styles.css')
-      with open(css_path, 'w', encoding='utf-8') as f:
-        f.write(resources.css_template)
+      write_output_file('styles.css', resources.css_template)
 
   # Create README for output files
   sys.stdout.write('Creating README.txt\n')
   config_string = ''
-  for (key, value) in config.__dict__.items():
-    if not callable(getattr(config, key)) and not key.startswith('__'):
-      if isinstance(value, str):
-        value = '\'' + value + '\''
-      config_string += '{0} = {1}\n'.format(key, value)
+  for (key, value) in get_config_values().items():
+    if isinstance(value, str):
+      value = '\'' + value + '\''
+    config_string += '{0} = {1}\n'.format(key, value)
   info = resources.readme_template.format(VERSION, datetime.now(), config_string)
-  readme_path = os.path.join(output_directory, 'README.txt')
-  with open(readme_path, 'w', encoding='utf-8') as f:
-    f.write(info)
+  write_output_file('README.txt', info)
+  
+  if merge_output:
+    # Keep files from the previous run that weren't replaced
+    link_previous_output_files()
+  
+  # Record content hashes, and list changes since the previous run
+  output_hashes_and_changes(previous_hashes, merge_output)
+  
+  # Replace the output directory with the staging directory
+  swap_staging_directory()
+  
+  if fetch.page_memo.hit_count:
+    sys.stdout.write('\nReused {0} page{1} that had already been fetched in this run\n'.format(fetch.page_memo.hit_count, 's'[:fetch.page_memo.hit_count^1]))
 
   sys.stdout.write('\nDone!\n\n')
 
 
+# Parse command-line arguments (these override values in config.py for a single run)
+def parse_arguments(argv=None):
+  parser = argparse.ArgumentParser(description='Download scripture content and metadata from ChurchofJesusChrist.org.')
+  parser.add_argument('-l', '--languages', nargs='+', metavar='LANG', help='BCP 47 languages to scrape full content for, or "all" (default: DEFAULT_LANG in config.py)')
+  parser.add_argument('-p', '--publications', nargs='+', metavar='SLUG', help='publications to scrape (like book-of-mormon)')
+  parser.add_argument('-b', '--books', nargs='+', metavar='SLUG', help='books to scrape (like 1-nephi)')
+  parser.add_argument('-c', '--chapters', metavar='RANGES', help='chapters to scrape in the selected books (like 1-5,7)')
+  parser.add_argument('-f', '--formats', nargs='+', choices=output_formats.keys(), help='full content output formats (default: formats enabled in config.py)')
+  parser.add_argument('-m', '--merge', action='store_true', help='merge results into the existing output directory instead of replacing it (always on when publications, books, or chapters are selected)')
+  queue_group = parser.add_mutually_exclusive_group()
+  queue_group.add_argument('--enqueue', action='store_true', help='gather metadata, and add chapters to the work queue instead of scraping them')
+  queue_group.add_argument('--work', action='store_true', help='scrape chapters from the work queue (can be run on several machines that share the queue file)')
+  queue_group.add_argument('--reduce', action='store_true', help='create output files from chapters in the work queue (uses the options that were passed with --enqueue)')
+  parser.add_argument('--queue', default=queue_path, metavar='PATH', help='work queue file (default: _queue.sqlite)')
+  parser.add_argument('--workers', type=int, default=1, metavar='N', help='number of worker processes to run with --work (default: 1)')
+  args = parser.parse_args(argv)
+  
+  if args.formats:
+    for output_format, config_key in output_formats.items():
+      setattr(config, config_key, output_format in args.formats)
+  
+  return args
+
+
+# Add full content chapters to a work queue, along with the arguments, settings, metadata, and version info that workers and the reducer need
+def enqueue_full_content(queue, args, full_content_langs, content_structure):
+  units = []
+  version_infos = {}
+  for bcp47_lang in full_content_langs:
+    church_availability = metadata_scriptures['languages'][bcp47_lang]['churchAvailability']
+    version_infos[bcp47_lang] = {}
+    for publication_slug, publication_data in content_structure.items():
+      if church_availability[publication_slug]:
+        version_infos[bcp47_lang][publication_slug] = get_version_info(bcp47_lang, publication_slug, publication_data['churchUri'])
+        for book_slug, book_data in publication_data['books'].items():
+          if book_slug in church_availability[publication_slug] and book_data.get('churchUri'):
+            for chapter in book_data['churchChapters']:
+              units.append({
+                'langBcp47': bcp47_lang,
+                'pubSlug': publication_slug,
+                'bookSlug': book_slug,
+                'chapter': chapter,
+              })
+  
+  work_queue.set_value(queue, 'arguments', vars(args))
+  work_queue.set_value(queue, 'config', get_config_values())
+  work_queue.set_value(queue, 'metadataLanguages', metadata_languages)
+  work_queue.set_value(queue, 'metadataScriptures', metadata_scriptures)
+  work_queue.set_value(queue, 'versionInfos', version_infos)
+  added_count = work_queue.enqueue_units(queue, units)
+  sys.stdout.write('Queued {0} chapter{1} ({2} already in the queue)\n'.format(added_count, 's'[:added_count^1], len(units) - added_count))
+
+
+# Load arguments, settings, and metadata from a work queue (returns the arguments that were passed when the queue was filled)
+def load_queue_state(queue, args):
+  for (key, value) in work_queue.get_value(queue, 'config').items():
+    if key not in node_config_keys:
+      setattr(config, key, value)
+  
+  queued_metadata_languages = work_queue.get_value(queue, 'metadataLanguages')
+  queued_metadata_scriptures = work_queue.get_value(queue, 'metadataScriptures')
+  metadata_languages['languages'].update(queued_metadata_languages['languages'])
+  metadata_languages['mapToBcp47'].update(queued_metadata_languages['mapToBcp47'])
+  metadata_scriptures['languages'].update(queued_metadata_scriptures['languages'])
+  metadata_scriptures['mapToSlug'].update(queued_metadata_scriptures['mapToSlug'])
+  
+  queued_args = argparse.Namespace(**work_queue.get_value(queue, 'arguments'))
+  queued_args.enqueue = False
+  queued_args.work = args.work
+  queued_args.reduce = args.reduce
+  queued_args.queue = args.queue
+  return queued_args
+
+
+# Run worker processes for a work queue, and wait for them to finish
+def run_queue_workers(queue_path, worker_count):
+  if worker_count <= 1:
+    run_queue_worker(queue_path)
+    return
+  processes = [multiprocessing.Process(target=run_queue_worker, args=(queue_path,)) for i in range(worker_count)]
+  for process in processes:
+    process.start()
+  for process in processes:
+    process.join()
+
+
+# Scrape chapters from a work queue until none are left
+# Each chapter is leased for QUEUE_LEASE_SECONDS. If the worker stops before it's done, another worker can take the chapter over once the lease expires.
+def run_queue_worker(queue_path):
+  global metadata_structure
+  global structure_index
+  
+  queue = work_queue.open_queue(queue_path)
+  if not work_queue.get_value(queue, 'arguments'):
+    sys.exit('Error: Nothing has been queued in {0}'.format(queue_path))
+  load_queue_state(queue, argparse.Namespace(work=True, reduce=False, queue=queue_path))
+  metadata_structure = resources.test_data_structure if config.USE_TEST_DATA else resources.metadata_structure
+  structure_index = resources.build_structure_index(metadata_structure)
+  worker_id = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+  
+  while True:
+    unit = work_queue.lease_unit(queue, worker_id, config.QUEUE_LEASE_SECONDS, config.QUEUE_MAX_ATTEMPTS)
+    if not unit:
+      unit_counts = work_queue.get_unit_counts(queue)
+      if not unit_counts['leased']:
+        break
+      # Wait in case a chapter leased by another worker needs to be taken over
+      time.sleep(min(config.QUEUE_LEASE_SECONDS, 10))
+      continue
+    
+    bcp47_lang = unit['langBcp47']
+    chapter_slug = resources.get_chapter_slug(unit['bookSlug'], unit['chapter'])
+    chapter_uri = structure_index['chapterUris'][structure_index['chapterOrdinals'][chapter_slug]]
+    sys.stdout.write('Scraping {0}/{1} (attempt {2})\n'.format(bcp47_lang, chapter_slug, unit['attempts']))
+    try:
+      html = fetch_chapter(bcp47_lang, chapter_uri)
+      if not html:
+        is_leased = work_queue.fail_unit(queue, unit['unitId'], worker_id, 'Unable to load {0}'.format(chapter_uri), config.QUEUE_MAX_ATTEMPTS)
+      else:
+        is_leased = work_queue.complete_unit(queue, unit['unitId'], worker_id, render_chapter(html, bcp47_lang, unit['bookSlug'], unit['chapter']))
+    except Exception as e:
+      is_leased = work_queue.fail_unit(queue, unit['unitId'], worker_id, repr(e), config.QUEUE_MAX_ATTEMPTS)
+      print_warning('Warning: Unable to scrape {0}/{1} ({2}).\n'.format(bcp47_lang, chapter_slug, repr(e)))
+    if not is_leased:
+      print_warning('Warning: The lease for {0}/{1} expired, and the chapter was taken over by another worker, so this result was discarded.\n'.format(bcp47_lang, chapter_slug))
+  
+  unit_counts = work_queue.get_unit_counts(queue)
+  sys.stdout.write('\nWorker {0} finished ({1} done, {2} failed)\n'.format(worker_id, unit_counts['done'], unit_counts['failed']))
+
+
+# Load metadata from a previous run, if it exists (used when merging into an existing output directory)
+def load_existing_metadata():
+  metadata_languages_path = os.path.join(output_directory, 'metadata-languages.json')
+  metadata_scriptures_path = os.path.join(output_directory, 'metadata-scriptures.json')
+  if os.path.exists(metadata_languages_path) and os.path.exists(metadata_scriptures_path):
+    with open(metadata_languages_path, 'r', encoding='utf-8') as f:
+      existing_metadata_languages = json.load(f)
+    with open(metadata_scriptures_path, 'r', encoding='utf-8') as f:
+      existing_metadata_scriptures = json.load(f)
+    metadata_languages['languages'].update(existing_metadata_languages['languages'])
+    metadata_languages['mapToBcp47'].update(existing_metadata_languages['mapToBcp47'])
+    metadata_scriptures['languages'].update(existing_metadata_scriptures['languages'])
+    metadata_scriptures['mapToSlug'].update(existing_metadata_scriptures['mapToSlug'])
+    sys.stdout.write('Loaded existing metadata for {0} language{1}\n'.format(len(metadata_languages['languages']), 's'[:len(metadata_languages['languages'])^1]))
+
+
+# Get the list of languages from previously-loaded metadata
+def get_existing_languages():
+  existing_languages = []
+  for bcp47_lang, language_data in metadata_languages['languages'].items():
+    existing_languages.append({
+      'bcp47_lang': bcp47_lang,
+      'church_lang': language_data['churchLang'],
+      'autonym': language_data['autonym'],
+      'name': language_data['name'],
+    })
+  return sorted(existing_languages, key=lambda l: l['bcp47_lang'])
+
+
 # Get the list of available languages
 def get_languages(selected_langs=None):
   sys.stdout.write('\nGetting languages\n')
   languages = []
   
   # Fetch the languages list
-  r = requests.get(languages_url)
-  r.encoding = 'utf-8'
+  r = fetch.get(languages_url)
   if r and r.status_code == 200:
     data = r.json()
     for d in data:
@@ -179,7 +491,16 @@ def get_languages(selected_langs=None):
           'name': resources.mapping_bcp47_to_english_name.get(bcp47_lang, '[Unknown]'),
         })
   else:
-    sys.exit('Error: Unable to connect to {0}'.format(languages_url))
+    # Fall back to the languages in resources.py (autonyms aren't available)
+    print_warning('Warning: Unable to connect to {0}. Using the languages in resources.py instead.\n'.format(languages_url))
+    for bcp47_lang, church_lang in resources.mapping_bcp47_to_church_lang.items():
+      if not selected_langs or bcp47_lang in selected_langs:
+        languages.append({
+          'bcp47_lang': bcp47_lang,
+          'church_lang': church_lang,
+          'autonym': '[Unknown]',
+          'name': resources.mapping_bcp47_to_english_name.get(bcp47_lang, '[Unknown]'),
+        })
   
   sys.stdout.write('Found {0} language{1}\n\n'.format(len(languages), 's'[:len(languages)^1]))
   
@@ -210,10 +531,8 @@ def get_version_info(bcp47_lang, publication_slug, publication_uri):
     version_info['copyrightOwner'] = 'iri'
     
     # Scrape copyright info from title page
-    time.sleep(config.SECONDS_TO_PAUSE_BETWEEN_REQUESTS)
     study_uri = publication_uri + '/title-page'
-    r = requests.get(study_url.format(study_uri, metadata_languages['languages'][bcp47_lang]['churchLang']))
-    r.encoding = 'utf-8'
+    r = fetch.get(study_url.format(study_uri, metadata_languages['languages'][bcp47_lang]['churchLang']), memoize=True)
     if r and r.status_code == 200:
       soup = BeautifulSoup(r.text, 'html.parser')
       copyright_info = soup.select_one('.copyright-info > p')
@@ -248,8 +567,7 @@ def gather_metadata_for_language(language):
   bcp47_lang = language['bcp47_lang']
   
   # Fetch the root scriptures page to see what exists in the language
-  r = requests.get(study_url.format('/scriptures', language['church_lang']))
-  r.encoding = 'utf-8'
+  r = fetch.get(study_url.format('/scriptures', language['church_lang']), memoize=True)
   if r and r.status_code == 200:
     sys.stdout.write('Gathering metadata: {0} / {1} / {2}\n'.format(language['bcp47_lang'], language['autonym'], language['name']))
     
@@ -258,8 +576,7 @@ def gather_metadata_for_language(language):
     available_uris = [a.attrs['href'].split('?')[0].replace('/study/', '/') for a in soup.select('#main a[href]')]
     
     if '/scriptures/study-helps' in available_uris:
-      r = requests.get(study_url.format('/scriptures/study-helps', language['church_lang']))
-      r.encoding = 'utf-8'
+      r = fetch.get(study_url.format('/scriptures/study-helps', language['church_lang']), memoize=True)
       if r and r.status_code == 200:
         soup = BeautifulSoup(r.text, 'html.parser')
         available_study_help_uris = [a.attrs['href'].split('?')[0].replace('/study/', '/') for a in soup.select('#main a[href]')]
@@ -273,14 +590,13 @@ def gather_metadata_for_language(language):
     return
   
   # Add language to metadata_languages dictionary
-  current_language = [l for l in languages if l['bcp47_lang'] == bcp47_lang][0]
   metadata_languages['languages'][bcp47_lang] = {
-    'name': current_language['name'],
-    'autonym': current_language['autonym'],
-    'churchLang': current_language['church_lang'],
+    'name': language['name'],
+    'autonym': language['autonym'],
+    'churchLang': language['church_lang'],
   }
   metadata_languages['mapToBcp47'][bcp47_lang] = bcp47_lang
-  metadata_languages['mapToBcp47'][current_language['church_lang']] = bcp47_lang
+  metadata_languages['mapToBcp47'][language['church_lang']] = bcp47_lang
   
   # Add language to metadata_scriptures dictionary
   metadata_scriptures['languages'][bcp47_lang] = copy.deepcopy(metadata_scriptures_language_template)
@@ -305,9 +621,7 @@ def gather_metadata_for_language(language):
   elif '/scriptures/bofm' in available_uris:
     # Other languages: Parse examples from 1 Nephi 1
     study_uri = '/scriptures/bofm/1-ne/1'
-    time.sleep(config.SECONDS_TO_PAUSE_BETWEEN_REQUESTS)
-    r = requests.get(study_url.format(study_uri, language['church_lang']))
-    r.encoding = 'utf-8'
+    r = fetch.get(study_url.format(study_uri, language['church_lang']), memoize=True)
     if r and r.status_code == 200:
       soup = BeautifulSoup(r.text, 'html.parser')
       footnotes = soup.select_one('.study-notes')
@@ -331,7 +645,7 @@ def gather_metadata_for_language(language):
           verse_numbers = [re.match(r'(\d+)', span.text).group(1) for span in verse_number_spans]
           metadata_scriptures['languages'][bcp47_lang]['numerals'] = [verse_numbers[9].replace(verse_numbers[0], '')] + verse_numbers[:9]
     else:
-      sys.exit('Error: Unable to connect to {0}'.format(study_url.format(study_uri, language['church_lang'])))
+      print_warning('Warning: Unable to connect to {0}. Using default punctuation and numerals for {1}.\n'.format(study_url.format(study_uri, language['church_lang']), bcp47_lang))
   if bcp47_lang in ('cmn-Hans', 'cmn-Hant', 'yue-Hans', 'ja',):
     metadata_scriptures['languages'][bcp47_lang]['punctuation']['openingParenthesis'] = '（'
     metadata_scriptures['languages'][bcp47_lang]['punctuation']['closingParenthesis'] = '）'
@@ -346,9 +660,7 @@ def gather_metadata_for_language(language):
   if '/scriptures/study-helps' in available_uris:
   
     # Fetch the abbreviations page, if it exists
-    time.sleep(config.SECONDS_TO_PAUSE_BETWEEN_REQUESTS)
-    r = requests.get(abbreviations_url.format(language['church_lang']))
-    r.encoding = 'utf-8'
+    r = fetch.get(abbreviations_url.format(language['church_lang']))
     if r and r.status_code == 200:
       soup = BeautifulSoup(r.text, 'html.parser')
       
@@ -451,9 +763,7 @@ def gather_metadata_for_language(language):
   for publication_slug, publication_data in metadata_structure.items():
     publication_uri = publication_data['churchUri']
     if publication_uri in available_uris:
-      time.sleep(config.SECONDS_TO_PAUSE_BETWEEN_REQUESTS)
-      r = requests.get(study_url.format(publication_uri, language['church_lang']))
-      r.encoding = 'utf-8'
+      r = fetch.get(study_url.format(publication_uri, language['church_lang']), memoize=True)
       if r and r.status_code == 200:
         soup = BeautifulSoup(r.text, 'html.parser')
         table_of_contents = soup.select_one('#content .body')
@@ -566,562 +876,906 @@ def gather_metadata_for_language(language):
             metadata_scriptures['mapToSlug'][book_name] = 'jst-psalms'
 
 
-# Scrape full content for a given language
-def output_full_content(bcp47_lang):
-  all_publications_dict_list = []
-  all_chapters_dict_list = []
-  all_chapter_media_dict_list = []
-  all_paragraphs_dict_list = []
+# Placeholder for a page number that continues from the previous chapter (it's filled in when chapters are put together in order)
+inherited_page_number = '\x00'
+
+
+# Get the type for a given paragraph
+def get_paragraph_type(paragraph):
+  type = 'paragraph'
+  if paragraph.name == 'h1':
+    type = 'book-title'
+  elif paragraph.get('id') == 'title_number1':
+    type = 'chapter-title'
+  elif paragraph.get('id') == 'subtitle1':
+    if isinstance(paragraph.previous_sibling, Tag):
+      previous_element_sibling = paragraph.previous_sibling
+    else:
+      previous_element_sibling = paragraph.previous_sibling.previous_sibling
+    if previous_element_sibling.name == 'h1':
+      type = 'book-subtitle'
+    elif previous_element_sibling.get('id') == 'title_number1':
+      type = 'chapter-subtitle'
+  elif paragraph.name == 'h2':
+    type = 'section-title'
+  elif paragraph.get('class') and paragraph.get('class')[0] == 'verse':
+    type = 'verse'
+  elif paragraph.get('class') and paragraph.get('class')[0] == 'study-intro':
+    type = 'study-paragraph'
+  elif paragraph.get('class') and paragraph.get('class')[0] == 'study-summary':
+    type = 'study-paragraph'
+  elif paragraph.name == 'img':
+    type = 'image'
+  elif paragraph.name == 'ul':
+    type = 'study-footnotes'
+  return type
+
+
+# Get the number for a given paragraph
+def get_paragraph_number(paragraph):
+  number = None
+  number_span = paragraph.select_one('.verse-number')
+  if number_span:
+    number = number_span.text.strip()
+  return number
+
+
+# Get the content for a given paragraph (content_type: text, html, or markdown)
+def get_paragraph_content(paragraph, content_type='text', basic_html=None, include_number=False, id_prefix='', id=''):
+  content = ''
+  paragraph_type = get_paragraph_type(paragraph)
+  if basic_html is None:
+    basic_html = config.BASIC_HTML
+
+  if content_type in ('text', 'markdown'):
+    basic_html = True
   
-  # Get the type for a given paragraph
-  def get_paragraph_type(paragraph):
-    type = 'paragraph'
-    if paragraph.name == 'h1':
-      type = 'book-title'
-    elif paragraph.get('id') == 'title_number1':
-      type = 'chapter-title'
-    elif paragraph.get('id') == 'subtitle1':
-      if isinstance(paragraph.previous_sibling, Tag):
-        previous_element_sibling = paragraph.previous_sibling
+  # Image paragraph type
+  if paragraph_type == 'image':
+    image_asset_id = paragraph.get('data-assetid')
+    image_alt = paragraph.get('alt', '')
+    if image_asset_id:
+      image_url = 'https://www.churchofjesuschrist.org/imgs/{0}/full/max/0/default'.format(image_asset_id)
+      if content_type == 'html':
+        content = '<img id="{0}{1}" src="{2}" alt="{3}" data-asset-id="{4}" loading="lazy" decoding="async">'.format(id_prefix, id, image_url, image_alt, image_asset_id)
+      elif content_type == 'markdown':
+        '![{0}]({1})'.format(image_alt, image_url)
       else:
-        previous_element_sibling = paragraph.previous_sibling.previous_sibling
-      if previous_element_sibling.name == 'h1':
-        type = 'book-subtitle'
-      elif previous_element_sibling.get('id') == 'title_number1':
-        type = 'chapter-subtitle'
-    elif paragraph.name == 'h2':
-      type = 'section-title'
-    elif paragraph.get('class') and paragraph.get('class')[0] == 'verse':
-      type = 'verse'
-    elif paragraph.get('class') and paragraph.get('class')[0] == 'study-intro':
-      type = 'study-paragraph'
-    elif paragraph.get('class') and paragraph.get('class')[0] == 'study-summary':
-      type = 'study-paragraph'
-    elif paragraph.name == 'img':
-      type = 'image'
-    elif paragraph.name == 'ul':
-      type = 'study-footnotes'
-    return type
-  
-  # Get the id for a given paragraph
-  paragraph_type_data_by_chapter = {}
-  def get_paragraph_id(chapter_slug, paragraph_type):
-    if not chapter_slug in paragraph_type_data_by_chapter:
-      paragraph_type_data_by_chapter[chapter_slug] = []
-    paragraph_type_data_by_chapter[chapter_slug].append(paragraph_type)
-    paragraph_type_count = paragraph_type_data_by_chapter[chapter_slug].count(paragraph_type)
-    paragraph_type_abbrev = resources.mapping_paragraph_type_to_paragraph_type_abbrev.get(paragraph_type)
-    return f'{paragraph_type_abbrev}{paragraph_type_count}'
-  
-  # Get the number for a given paragraph
-  def get_paragraph_number(paragraph):
-    number = None
-    number_span = paragraph.select_one('.verse-number')
-    if number_span:
-      number = number_span.text.strip()
-    return number
-  
-  # Get the content for a given paragraph (content_type: text, html, or markdown)
-  def get_paragraph_content(paragraph, content_type='text', basic_html=config.BASIC_HTML, include_number=False, id_prefix='', id=''):
-    content = ''
-    paragraph_type = get_paragraph_type(paragraph)
+        content = image_url
+    return content
+  
+  # Plain text is read from the original paragraph, without copying it
+  if content_type == 'text':
+    return get_paragraph_text(paragraph, include_number=include_number)
+  
+  # Copy the paragraph to avoid modifying the original
+  temp_paragraph = copy.copy(paragraph)
+  
+  # Remove verse number if needed
+  number_span = temp_paragraph.select_one('.verse-number')
+  if number_span and not include_number:
+    number_span.decompose()
+  
+  # Normalize superscript and footnotes
+  for element in temp_paragraph.select('.study-note-ref sup'):
+    marker_value = element.text or element.get('data-value')
+    if basic_html and element.get('data-value'):
+      element.attrs.pop('data-value')
+      element.string = marker_value
+    else:
+      element['data-value'] = marker_value
+      element.string = ''
+  for element in temp_paragraph.select('.study-note-ref'):
+    element['class'] = 'footnote-link'
+    element.attrs.pop('data-scroll-id')
+  
+  # Add prefix to element IDs if needed
+  if content_type in ('html', 'markdown',) and id_prefix:
+    for element in temp_paragraph.select('[id]'):
+      element.attrs['id'] = id_prefix + element.attrs['id']
+    for element in temp_paragraph.select('[href^="#"]'):
+      element.attrs['href'] = element.attrs['href'].replace('#', f'#{id_prefix}', 1)
+  
+  if basic_html:
+    # Convert text to uppercase, replace spans with simple style tags
+    selectors_to_convert_to_uppercase = '.small-caps, .uppercase'
+    for element in temp_paragraph.select(selectors_to_convert_to_uppercase):
+      element.string = element.text.upper()
+      element.unwrap()
+    for element in temp_paragraph.select('.verse-number'):
+      element.name = 'b'
+      element.attrs.pop('class')
+    for element in temp_paragraph.select('.clarity-word'):
+      element.name = 'i'
+      element.attrs.pop('class')
+  
+  if content_type == 'markdown':
+    # Markdown content
+    # Add anchors
+    for element in temp_paragraph.select('[id]'):
+      element_id = element.get('id')
+      element.insert(0, f'<a name="{element_id}"></a>')
+    content = markdown_renderer.render_markdown(temp_paragraph)
+  elif content_type == 'html':
+    # HTML content
+    content = temp_paragraph.decode_contents().replace(' </small>', '</small> ').strip()
+  else:
+    # Plain text
+    # Remove superscript and footnotes
+    for element in temp_paragraph.select('sup'):
+      element.decompose()
+    if temp_paragraph.get('class') and temp_paragraph.get('class')[0] == 'footnotes':
+      return ''
+    content = temp_paragraph.text.strip()
+  
+  # Remove extra line breaks
+  content = content.replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n')
+  
+  return content
 
-    if content_type in ('text', 'markdown'):
-      basic_html = True
-    
-    # Image paragraph type
-    if paragraph_type == 'image':
-      image_asset_id = paragraph.get('data-assetid')
-      image_alt = paragraph.get('alt', '')
-      if image_asset_id:
-        image_url = 'https://www.churchofjesuschrist.org/imgs/{0}/full/max/0/default'.format(image_asset_id)
-        if content_type == 'html':
-          content = '<img id="{0}{1}" src="{2}" alt="{3}" data-asset-id="{4}" loading="lazy" decoding="async">'.format(id_prefix, id, image_url, image_alt, image_asset_id)
-        elif content_type == 'markdown':
-          '![{0}]({1})'.format(image_alt, image_url)
-        else:
-          content = image_url
-      return content
-    
-    # Copy the paragraph to avoid modifying the original
-    temp_paragraph = copy.copy(paragraph)
+
+# Get the plain text for a paragraph (the same text that get_paragraph_content would return, without copying or changing the paragraph)
+# The paragraph is walked once: the verse number (unless include_number is True) and superscript are skipped, and small caps and uppercase text are converted to uppercase. Superscript that get_paragraph_content would keep is kept, with footnote markers normalized the same way.
+def get_paragraph_text(paragraph, include_number=False):
+  if paragraph.get('class') and paragraph.get('class')[0] == 'footnotes':
+    return ''
+  number_span = None if include_number else paragraph.select_one('.verse-number')
+  strings = []
+  add_paragraph_strings(paragraph, strings, number_span, paragraph.interesting_string_types, in_note_ref='study-note-ref' in (paragraph.get('class') or []))
+  content = ''.join(strings).strip()
+  
+  # Remove extra line breaks
+  content = content.replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n')
+  
+  return content
+
+
+# Add the text strings inside an element to a list (types are the string types that count as text, like in BeautifulSoup's get_text)
+def add_paragraph_strings(element, strings, number_span, types, uppercase=False, in_note_ref=False):
+  for child in element.children:
+    if not isinstance(child, Tag):
+      if (type(child) is types) if isinstance(types, type) else (isinstance(child, NavigableString) if types is None else type(child) in types):
+        strings.append(child)
+      continue
+    if child is number_span:
+      continue
+    classes = child.get('class') or []
+    child_in_note_ref = in_note_ref or 'study-note-ref' in classes
+    starts_uppercase = not uppercase and ('small-caps' in classes or 'uppercase' in classes)
+    # Superscript is removed, unless it's part of small caps or uppercase text, or it's a verse number or clarity word (those are converted to <b> and <i>)
+    if child.name == 'sup' and not uppercase and not starts_uppercase and not ('verse-number' in classes or 'clarity-word' in classes):
+      continue
+    if child.name == 'sup' and in_note_ref:
+      # Footnote markers keep their text (or their data-value if they don't have text), or are left empty if they don't have a data-value
+      marker_value = ''
+      if child.get('data-value'):
+        marker_value = ''.join(string for string in child.strings if all(parent is not number_span for parent in string.parents)) or child.get('data-value')
+      strings.append(marker_value.upper() if starts_uppercase else marker_value)
+    elif starts_uppercase:
+      uppercase_strings = []
+      add_paragraph_strings(child, uppercase_strings, number_span, child.interesting_string_types, True, child_in_note_ref)
+      strings.append(''.join(uppercase_strings).upper())
+    else:
+      add_paragraph_strings(child, strings, number_span, types, uppercase, child_in_note_ref)
+
+
+# Fetch the HTML for a chapter (returns None if the chapter couldn't be loaded)
+def fetch_chapter(bcp47_lang, chapter_uri):
+  url = study_url.format(chapter_uri, resources.mapping_bcp47_to_church_lang[bcp47_lang])
+  if config.INCLUDE_MEDIA_INFO:
+    from playwright.sync_api import sync_playwright, Error as PlaywrightError
     
-    # Remove verse number if needed
-    number_span = temp_paragraph.select_one('.verse-number')
-    if number_span and not include_number:
-      number_span.decompose()
+    # Load the chapter in a browser, and open the downloads panel so media links are in the HTML (browser errors and timeouts are retried like other requests)
+    def request_function():
+      html = None
+      with sync_playwright() as pw:
+        browser = pw.chromium.launch(headless=True)
+        try:
+          page = browser.new_page()
+          page.goto(url)
+          if page.query_selector('#content article[data-uri="{0}"]'.format(chapter_uri)):
+            page.locator('[data-testid="options-tab"]').click()
+            page.wait_for_selector('[data-testid="options-panel-content"]')
+            if page.query_selector('[data-testid="options-panel-content"] label:not([class*="disable"]) [data-testid="download-menu-label"]'):
+              page.locator('[data-testid="download-menu-label"]').click()
+              page.wait_for_selector('[data-testid="downloads-panel-header"]')
+            html = page.content()
+          else:
+            print_warning('Warning: Loaded page doesn’t match expected URI: {0}\n'.format(chapter_uri))
+        finally:
+          browser.close()
+      return html, True, None
     
-    # Normalize superscript and footnotes
-    for element in temp_paragraph.select('.study-note-ref sup'):
-      marker_value = element.text or element.get('data-value')
-      if basic_html and element.get('data-value'):
-        element.attrs.pop('data-value')
-        element.string = marker_value
+    return fetch.request_with_retries(request_function, (PlaywrightError,))
+  else:
+    r = fetch.get(url)
+    if r and r.status_code == 200:
+      return r.text
+  return None
+
+
+# Add a line break and newline after a line, question, or line break (lines and questions are unwrapped)
+def add_newline_after(element, soup):
+  element.insert_after('\n')
+  if element.name != 'br':
+    line_break = soup.new_tag('br')
+    element.insert_after(line_break)
+    element.unwrap()
+    return [line_break]
+
+
+# Clean up a link (links to notes in the same chapter become jump links, and other relative links become absolute)
+def clean_up_link(element, soup):
+  if (element.parent.get('class') and element.parent.get('class')[0] == 'study-summary') or (element.get('class') and element.get('class')[0] == 'study-note-ref'):
+    if element.get('href') and element.get('href').startswith('/'):
+      element.attrs['href'] = '#' + element.attrs['href'].split('#')[1]
+  elif element.get('href') and element.get('href').startswith('/'):
+    element.attrs['href'] = 'https://www.churchofjesuschrist.org' + element.attrs['href']
+
+
+# Clean up a footnote element
+def clean_up_footnote(element, soup):
+  if element.get('class'):
+    element.attrs.pop('class')
+  if element.get('data-aid'):
+    element.attrs.pop('data-aid')
+  if element.get('data-note-category'):
+    element.attrs.pop('data-note-category')
+  if element.get('data-type'):
+    if element.get('data-type') == 'verse':
+      element.attrs['class'] = ['footnotes']
+    element.attrs.pop('data-type')
+  if element.name in ['span', 'p']:
+    element.unwrap()
+
+
+# Clean up a book title with dominant text (text other than the dominant text is wrapped in <small>)
+def clean_up_dominant_text(element, soup):
+  new_elements = []
+  book_title = element.parent
+  for subordinate in book_title.select('.subordinate'):
+    subordinate.unwrap()
+  for child in book_title.children:
+    if child.name != 'br' and child.string != '\n' and not (isinstance(child, Tag) and child.get('class') and child.get('class')[0] == 'dominant'):
+      if child.string == ' ' and child.previous_sibling and child.previous_sibling.name == 'small':
+        child.previous_sibling.append(' ')
+        child.extract()
       else:
-        element['data-value'] = marker_value
-        element.string = ''
-    for element in temp_paragraph.select('.study-note-ref'):
-      element['class'] = 'footnote-link'
-      element.attrs.pop('data-scroll-id')
+        new_elements.append(child.wrap(soup.new_tag('small')))
+  return new_elements
+
+
+# Remove newlines from a title
+def remove_title_newlines(element, soup):
+  for child in element.children:
+    if child.string == '\n':
+      child.extract()
+
+
+# Remove an element and its contents
+def remove_element(element, soup):
+  element.decompose()
+
+
+# Remove an element, keeping its contents
+def unwrap_element(element, soup):
+  element.unwrap()
+
+
+# Cleanup rules for chapter HTML, by INCLUDE_COPYRIGHTED_CONTENT value (created when first needed)
+cleanup_rules_by_setting = {}
+
+# Get cleanup rules for chapter HTML, in the order they're applied
+# Each rule has a precompiled CSS selector and an action (a function that takes an element and the soup, and returns any new elements it added). If only_first is True, the action is only applied to the first matching element.
+def get_cleanup_rules():
+  include_copyrighted_content = bool(config.INCLUDE_COPYRIGHTED_CONTENT)
+  if include_copyrighted_content not in cleanup_rules_by_setting:
+    selectors_to_remove = 'span[data-pointer-type]'
+    selectors_to_unwrap = '.deity-name, .para-mark, span.marker, .dominant, .subordinate, .language, .translit, .question, .answer, .line, .selah'
+    if not include_copyrighted_content:
+      selectors_to_remove += ', sup, .study-summary, .study-intro, .study-notes, article[data-uri="/scriptures/dc-testament/od/2"] p:not(#title_number1)'
+      selectors_to_unwrap += ', a'
+    rules = [('.line, .question, br', add_newline_after, False)]
+    if include_copyrighted_content:
+      rules.append(('a', clean_up_link, False))
+      rules.append(('.study-notes ul, .study-notes li, .study-notes p, .study-notes span', clean_up_footnote, False))
+    rules.append(('.dominant', clean_up_dominant_text, True))
+    rules.append(('h1 br, h2 br', remove_element, False))
+    rules.append(('h1, h2', remove_title_newlines, False))
+    rules.append((selectors_to_remove, remove_element, False))
+    rules.append((selectors_to_unwrap, unwrap_element, False))
+    cleanup_rules_by_setting[include_copyrighted_content] = [{
+      'selector': soupsieve.compile(selector),
+      'action': action,
+      'only_first': only_first,
+    } for selector, action, only_first in rules]
+  return cleanup_rules_by_setting[include_copyrighted_content]
+
+
+# Simplify a chapter's HTML markup
+# Elements are matched against all cleanup rules in a single walk of the tree, then rules are applied in order. An element is skipped if an earlier rule removed it or changed it so it no longer matches, and elements added by a rule are matched against the rules after it, so the result is the same as running each rule over the whole tree in turn.
+def clean_up_chapter_html(content, soup):
+  cleanup_rules = get_cleanup_rules()
+  matched_elements = [[] for rule in cleanup_rules]
+  for element in content.find_all(True):
+    for rule_index, rule in enumerate(cleanup_rules):
+      if rule['selector'].match(element):
+        matched_elements[rule_index].append(element)
+  for rule_index, rule in enumerate(cleanup_rules):
+    for element in matched_elements[rule_index]:
+      if element.decomposed or element.parent is None or not rule['selector'].match(element):
+        continue
+      for new_element in rule['action'](element, soup) or []:
+        for later_rule_index in range(rule_index + 1, len(cleanup_rules)):
+          if cleanup_rules[later_rule_index]['selector'].match(new_element):
+            matched_elements[later_rule_index].append(new_element)
+      if rule['only_first']:
+        break
+
+
+# Whether chapter dicts are needed (they're used for JSON output, the paragraph store, the concordance, and statistics)
+def is_chapter_dict_needed():
+  return config.OUTPUT_AS_JSON or config.OUTPUT_AS_STORE or config.OUTPUT_CONCORDANCE or config.OUTPUT_STATISTICS
+
+
+# Render a chapter's HTML into each output format
+# The result has the chapter's JSON, HTML, Markdown, and plain text content, and its rows for tabular output. Values that depend on other chapters (publication key, positions, and page numbers that continue from the previous chapter) are filled in by output_full_content.
+def render_chapter(html, bcp47_lang, book_slug, chapter):
+  chapter_number = str(chapter)
+  chapter_slug = resources.get_chapter_slug(book_slug, chapter_number)
+  chapter_uri = structure_index['chapterUris'][structure_index['chapterOrdinals'][chapter_slug]]
+  html_content = ''
+  md_content = ''
+  txt_content = ''
+  chapter_dict = None
+  chapter_dict_list = []
+  chapter_media_dict_list = []
+  paragraphs_dict_list = []
+  paragraph_hashes = {}
+  include_cross_references = config.OUTPUT_CROSS_REFERENCES and config.INCLUDE_COPYRIGHTED_CONTENT
+  note_sources = {}  # { note_id: (compare_id, marker) }
+  note_hrefs = {}  # { note_id: [href] }
+  
+  # Get the id for a given paragraph (paragraphs of each type are numbered from 1 within a chapter, like 'v12')
+  paragraph_type_counts = collections.Counter()  # { (chapter_slug, paragraph_type): count }
+  def get_paragraph_id(chapter_slug, paragraph_type):
+    paragraph_type_counts[(chapter_slug, paragraph_type)] += 1
+    paragraph_type_abbrev = resources.mapping_paragraph_type_to_paragraph_type_abbrev.get(paragraph_type)
+    return f'{paragraph_type_abbrev}{paragraph_type_counts[(chapter_slug, paragraph_type)]}'
+  
+  soup = BeautifulSoup(html, 'html.parser')
+  if not soup.select_one('#content article[data-uri="{0}"]'.format(chapter_uri)):
+    print_warning('Warning: Loaded page doesn’t match expected URI: {0}\n'.format(chapter_uri))
+  
+  content = soup.select_one('#content')            
+  
+  # Get media info
+  chapter_media = []
+  video_element = content.select_one('header video')
+  downloads_element = soup.select_one('[data-testid="download-panel-content"]')
+  if video_element:
+    # TODO: Figure out how to get video URLs. Videos don't load <source> elements when using Playwright (but they load in a regular browser).
+    for source in video_element.select('source'):
+      if source.get('data-src'):
+        subtype = None
+        if 'hls.m3u8' in source.get('data-src'):
+          subtype = 'hls'
+        elif source.get('data-height') == '360':
+          subtype = '360p'
+        elif source.get('data-height') == '720':
+          subtype = '720p'
+        elif source.get('data-height') == '1080':
+          subtype = '1080p'
+        image_asset_id = None
+        if 'assets.churchofjesuschrist.org' in video_element.get('data-poster'):
+          image_asset_id = link.get('data-poster').split['/'][-2]
+        chapter_media.append({
+          'type': 'video',
+          'subtype': subtype,
+          'url': source.get('data-src'),
+          'imageUrl': video_element.get('data-poster'),
+          'startSeconds': None,
+          'endSeconds': None,
+          'source': 'ChurchofJesusChrist.org',
+          'churchAssetId': video_element.get('data-assetid'),
+          'churchImageAssetId': image_asset_id,
+        })
+  if downloads_element:
+    for link in downloads_element.select('a'):
+      if link.get('href') and not 'Entire' in link.text:
+        media_type = None
+        if 'MP3' in link.text:
+          media_type = 'audio'
+        elif 'PDF' in link.text:
+          media_type = 'pdf'
+        subtype = None
+        if 'Male' in link.text:
+          subtype = 'spoken-male'
+        elif 'Female' in link.text:
+          subtype = 'spoken-female'
+        elif 'Vocal' in link.text:
+          subtype = 'music-vocal'
+        elif 'Accompaniment' in link.text:
+          subtype = 'music-accompaniment'
+        asset_id = None
+        if 'assets.churchofjesuschrist.org' in link.get('href'):
+          asset_id = link.get('href').split['/'][-2]
+        chapter_media.append({
+          'type': media_type,
+          'subtype': subtype,
+          'url': link.get('href').split('?')[0].split('#')[0],
+          'imageUrl': None,
+          'startSeconds': None,
+          'endSeconds': None,
+          'source': 'ChurchofJesusChrist.org',
+          'churchAssetId': asset_id,
+          'churchImageAssetId': None,
+        })
+
+  # Simplify HTML markup
+  clean_up_chapter_html(content, soup)
+  
+  # Select paragraphs (block elements and images) to be included
+  paragraph_selectors = '.page-break, h1, h2, p' # .page-break is for paragraph metadata (it won't be included as a paragraph in final output)
+  if config.INCLUDE_IMAGES:
+    paragraph_selectors += ', .body-block img'
+  if config.INCLUDE_COPYRIGHTED_CONTENT:
+    paragraph_selectors += ', .footnotes'
+  paragraphs = content.select(paragraph_selectors)
+  
+  chapter_name = soup.select_one('[data-testid="readerview-header"] > span').text.strip()
+  chapter_abbrev = None
+  if metadata_scriptures['languages'][bcp47_lang]['translatedNames'][book_slug]['abbrev']:
+    if book_slug in resources.mapping_book_to_singular_slug.keys():
+      singular_book_slug = resources.mapping_book_to_singular_slug.get(book_slug)
+      chapter_abbrev = chapter_name.replace(metadata_scriptures['languages'][bcp47_lang]['translatedNames'][singular_book_slug]['name'], metadata_scriptures['languages'][bcp47_lang]['translatedNames'][singular_book_slug]['abbrev'])
+    else:
+      chapter_abbrev = chapter_name.replace(metadata_scriptures['languages'][bcp47_lang]['translatedNames'][book_slug]['name'], metadata_scriptures['languages'][bcp47_lang]['translatedNames'][book_slug]['abbrev'])
+  
+  if is_chapter_dict_needed():
+    chapter_dict = {
+      'name': chapter_name,
+      'abbrev': chapter_abbrev,
+      'number': chapter_number,
+      'churchUri': chapter_uri,
+      'paragraphs': [],
+      'media': chapter_media,
+    }
+  
+  if config.OUTPUT_AS_CSV or config.OUTPUT_AS_TSV or config.OUTPUT_AS_SQL_MYSQL or config.OUTPUT_AS_SQL_SQLITE:
+    chapter_dict_list.append(resources.ChapterRow(
+      pubKey=None,
+      chPosition=None,
+      chSlug=chapter_slug,
+      chName=chapter_name,
+      chAbbrev=chapter_abbrev,
+      chNumber=chapter_number,
+      bookSlug=book_slug,
+      chChurchUri=chapter_uri,
+    ))
+    for media_item in chapter_media:
+      chapter_media_dict_list.append(resources.ChapterMediaRow(
+        pubKey=None,
+        chSlug=chapter_slug,
+        chmType=media_item.get('type'),
+        chmSubType=media_item.get('subtype'),
+        chmUrl=media_item.get('url'),
+        chmImageUrl=media_item.get('imageUrl'),
+        chmStartSeconds=media_item.get('startSeconds'),
+        chmEndSeconds=media_item.get('endSeconds'),
+        chmSource=media_item.get('source'),
+        chmChurchAssetId=media_item.get('churchAssetId'),
+        chmChurchImageAssetId=media_item.get('churchImageAssetId'),
+      ))
+  
+  # Make sure paragraph IDs are unique when there are multiple chapters on a page
+  paragraph_id_prefix = chapter_slug + '_'
+  prepend_chapter_slug_to_paragraph_ids = True
+  if not prepend_chapter_slug_to_paragraph_ids:
+    paragraph_id_prefix = ''
+  
+  if config.OUTPUT_AS_HTML:
+    # Add chapter media
+    for media_item in chapter_media:
+      if media_item.get('type') == 'audio':
+        html_content += '\n<audio controls preload="metadata" data-subtype="{0}" src="{1}"></audio>\n'.format(media_item.get('subtype') or '', media_item.get('url'))
+      elif media_item.get('type') == 'video':
+        html_content += '\n<video controls preload="metadata" data-subtype="{0}" src="{1}" poster="{2}"></video>\n'.format(media_item.get('subtype') or '', media_item.get('url'), media_item.get('imageUrl'))
+  
+  # Page numbers before the first page break continue from the previous chapter
+  previous_page_number = inherited_page_number
+  first_page_number_element_in_chapter = soup.select_one('.page-break')
+  first_page_number = first_page_number_element_in_chapter.attrs['data-page'] if first_page_number_element_in_chapter else None
+  
+  # Create formatted output for each paragraph
+  for paragraph in paragraphs:
     
-    # Add prefix to element IDs if needed
-    if content_type in ('html', 'markdown',) and id_prefix:
-      for element in temp_paragraph.select('[id]'):
-        element.attrs['id'] = id_prefix + element.attrs['id']
-      for element in temp_paragraph.select('[href^="#"]'):
-        element.attrs['href'] = element.attrs['href'].replace('#', f'#{id_prefix}', 1)
+    # Skip .page-break elements that have already been decomposed
+    try:
+      is_valid_element = paragraph.get('class')
+    except:
+      continue
     
-    if basic_html:
-      # Convert text to uppercase, replace spans with simple style tags
-      selectors_to_convert_to_uppercase = '.small-caps, .uppercase'
-      for element in temp_paragraph.select(selectors_to_convert_to_uppercase):
-        element.string = element.text.upper()
-        element.unwrap()
-      for element in temp_paragraph.select('.verse-number'):
-        element.name = 'b'
-        element.attrs.pop('class')
-      for element in temp_paragraph.select('.clarity-word'):
-        element.name = 'i'
-        element.attrs.pop('class')
+    # Get paragraph page number and remove .page-break elements
+    paragraph_page_number = previous_page_number
+    if paragraph.get('class') and paragraph.get('class')[0] == 'page-break':
+      previous_page_number = paragraph.attrs['data-page']
+      continue
+    page_break_element = paragraph.select_one('.page-break')
+    if page_break_element:
+      previous_page_number = page_break_element.attrs['data-page']
+      paragraph_page_number += ',' + previous_page_number
+      page_break_element.decompose()
     
-    if content_type == 'markdown':
-      # Markdown content
-      # Add anchors
-      for element in temp_paragraph.select('[id]'):
-        element_id = element.get('id')
-        element.insert(0, f'<a name="{element_id}"></a>')
-      content = MarkdownConverter(escape_underscores=False).convert_soup(temp_paragraph)
-    elif content_type == 'html':
-      # HTML content
-      content = temp_paragraph.decode_contents().replace(' </small>', '</small> ').strip()
+    church_paragraph_id = paragraph.get('id')
+    paragraph_type = get_paragraph_type(paragraph)
+    paragraph_id = get_paragraph_id(chapter_slug, paragraph_type)
+    paragraph_number = get_paragraph_number(paragraph)
+    paragraph_compare_id = f'{chapter_slug}_{paragraph_id}'
+    if paragraph_page_number and inherited_page_number in paragraph_page_number:
+      # Page numbers that continue from the previous chapter aren't known yet, so the paragraph is hashed in resolve_page_numbers
+      paragraph_hashes[paragraph_compare_id] = [paragraph_type, paragraph_page_number, str(paragraph)]
     else:
-      # Plain text
-      # Remove superscript and footnotes
-      for element in temp_paragraph.select('sup'):
-        element.decompose()
-      if temp_paragraph.get('class') and temp_paragraph.get('class')[0] == 'footnotes':
-        return ''
-      content = temp_paragraph.text.strip()
+      paragraph_hashes[paragraph_compare_id] = get_content_hash('\t'.join((paragraph_type, paragraph_page_number or '', str(paragraph))))[:16]
     
-    # Remove extra line breaks
-    content = content.replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n').replace('\n\n\n', '\n\n')
+    if include_cross_references:
+      # Collect footnote links and footnotes (they're matched up after all paragraphs are read)
+      for note_ref in paragraph.select('a.study-note-ref[href^="#"]'):
+        marker = note_ref.select_one('sup')
+        note_sources[note_ref.get('href')[1:]] = (paragraph_compare_id, (marker.get('data-value') or marker.text if marker else '').strip())
+      if paragraph.get('class') and paragraph.get('class')[0] == 'footnotes':
+        for note in paragraph.select('li[id]'):
+          note_hrefs[note.get('id')] = [link.get('href') for link in note.select('a.scripture-ref[href]')]
     
-    return content
+    if is_chapter_dict_needed():
+      # Add paragraph to chapter dict
+      paragraph_content = get_paragraph_content(paragraph, content_type='text', id_prefix=paragraph_id_prefix, id=paragraph_id)
+      paragraph_content_html = get_paragraph_content(paragraph, content_type='html', id_prefix=paragraph_id_prefix, id=paragraph_id)
+      if paragraph_content or paragraph_content_html:
+        chapter_dict['paragraphs'].append({
+          'type': paragraph_type,
+          'id': paragraph_id,
+          'content': paragraph_content,
+          'contentHtml': paragraph_content_html,
+          'number': paragraph_number.strip() if paragraph_number else None,
+          'pageNumber': paragraph_page_number,
+          'compareId': paragraph_compare_id,
+          'churchId': church_paragraph_id,
+        })
+  
+    if config.OUTPUT_AS_HTML:
+      # Add paragraph to HTML string
+      paragraph_content = get_paragraph_content(paragraph, content_type='html', include_number=True, id_prefix=paragraph_id_prefix, id=paragraph_id)
+      if paragraph_content:
+        if paragraph_type == 'book-title':
+          paragraph_content = f'\n<h1 id="{book_slug}" class="{paragraph_type}">{paragraph_content}</h1>\n'
+        elif paragraph_type == 'chapter-title':
+          paragraph_content = f'\n<h2 id="{chapter_slug}" class="{paragraph_type}">{paragraph_content}</h2>\n'
+        elif paragraph_type == 'section-title':
+          paragraph_content = f'\n<h3 id="{paragraph_id_prefix}{paragraph_id}" class="{paragraph_type}">{paragraph_content}</h3>\n'
+        elif paragraph_type == 'image':
+          paragraph_content = f'{paragraph_content}\n'
+        elif paragraph_type == 'footnotes':
+          paragraph_content = f'<ul id="{paragraph_id_prefix}{paragraph_id}" class="{paragraph_type}">{paragraph_content}</ul>\n'
+        else:
+          paragraph_content = f'<p id="{paragraph_id_prefix}{paragraph_id}" class="{paragraph_type}">{paragraph_content}</p>\n'
+        html_content += paragraph_content
+      
+    if config.OUTPUT_AS_MD:
+      # Add paragraph to markdown string
+      paragraph_content = get_paragraph_content(paragraph, content_type='markdown', include_number=True, id_prefix=paragraph_id_prefix)
+      if paragraph_content:
+        if paragraph_type == 'book-title':
+          paragraph_anchor = f'<a name="{book_slug}"></a>'
+          paragraph_content = f'# {paragraph_anchor}{paragraph_content}\n\n'
+        elif paragraph_type == 'chapter-title':
+          paragraph_anchor = f'<a name="{chapter_slug}"></a>'
+          paragraph_content = f'## {paragraph_anchor}{paragraph_content}\n\n'
+        elif paragraph_type == 'section-title':
+          paragraph_anchor = f'<a name="{paragraph_id_prefix}{paragraph_id}"></a>'
+          paragraph_content = f'### {paragraph_anchor}{paragraph_content}\n\n'
+        elif paragraph_type == 'image':
+          paragraph_anchor = f'<a name="{paragraph_id_prefix}{paragraph_id}"></a>'
+          paragraph_content = f'{paragraph_anchor}![]({paragraph_content})\n\n'
+        else:
+          paragraph_anchor = f'<a name="{paragraph_id_prefix}{paragraph_id}"></a>'
+          paragraph_content = f'{paragraph_anchor}{paragraph_content}\n\n'
+        md_content += paragraph_content
+  
+    if config.OUTPUT_AS_TXT:
+      # Add paragraph to text string
+      paragraph_content = get_paragraph_content(paragraph, content_type='text', include_number=True)
+      if paragraph_content:
+        if paragraph_type == 'chapter-title':
+          paragraph_content = paragraph_content.upper()
+        txt_content += paragraph_content + '\n\n'
+
+    if config.OUTPUT_AS_CSV or config.OUTPUT_AS_TSV or config.OUTPUT_AS_SQL_MYSQL or config.OUTPUT_AS_SQL_SQLITE:
+      paragraph_content = get_paragraph_content(paragraph, content_type='text', id=paragraph_id)
+      paragraph_content_html = get_paragraph_content(paragraph, content_type='html', id=paragraph_id)
+      if paragraph_content or paragraph_content_html:
+        paragraphs_dict_list.append(resources.ParagraphRow(
+          pubKey=None,
+          chSlug=chapter_slug,
+          parPosition=None,
+          parType=paragraph_type,
+          parId=paragraph_id,
+          parContent=paragraph_content,
+          parContentHtml=paragraph_content_html,
+          parNumber=paragraph_number,
+          parPageNumber=paragraph_page_number,
+          parCompareId=paragraph_compare_id,
+          parChurchId=church_paragraph_id,
+        ))
+  
+  return {
+    'bookSlug': book_slug,
+    'chapterSlug': chapter_slug,
+    'json': chapter_dict,
+    'html': html_content,
+    'md': md_content,
+    'txt': txt_content,
+    'chapters': chapter_dict_list,
+    'chapterMedia': chapter_media_dict_list,
+    'paragraphs': paragraphs_dict_list,
+    'paragraphHashes': paragraph_hashes,
+    'crossReferences': cross_references.get_chapter_cross_references(note_sources, note_hrefs, structure_index) if include_cross_references else None,
+    'firstPageNumber': first_page_number,
+    'lastPageNumber': previous_page_number,
+  }
+
+
+# Fill in page numbers that continue from the previous chapter, and hash the paragraphs that have them (returns the last page number in the chapter)
+def resolve_page_numbers(chapter_result, previous_page_number):
+  if chapter_result['firstPageNumber'] and not previous_page_number:
+    previous_page_number = str(int(chapter_result['firstPageNumber']) - 1)
+  
+  # Replace the placeholder in a page number (like '\x00' or '\x00,12')
+  def resolve_page_number(page_number):
+    if page_number == inherited_page_number:
+      return previous_page_number
+    elif page_number and inherited_page_number in page_number:
+      return page_number.replace(inherited_page_number, previous_page_number)
+    return page_number
+  
+  if chapter_result['json']:
+    for paragraph_dict in chapter_result['json']['paragraphs']:
+      paragraph_dict['pageNumber'] = resolve_page_number(paragraph_dict['pageNumber'])
+  for paragraph_dict in chapter_result['paragraphs']:
+    paragraph_dict['parPageNumber'] = resolve_page_number(paragraph_dict['parPageNumber'])
+  for paragraph_compare_id, paragraph_hash in chapter_result['paragraphHashes'].items():
+    if not isinstance(paragraph_hash, str):
+      paragraph_type, paragraph_page_number, paragraph_html = paragraph_hash
+      chapter_result['paragraphHashes'][paragraph_compare_id] = get_content_hash('\t'.join((paragraph_type, resolve_page_number(paragraph_page_number) or '', paragraph_html)))[:16]
+  
+  if chapter_result['lastPageNumber'] == inherited_page_number:
+    return previous_page_number
+  return chapter_result['lastPageNumber']
+
+
+# Get current config values (used to pass settings to other processes)
+def get_config_values():
+  return { key: value for (key, value) in config.__dict__.items() if not callable(value) and not key.startswith('__') }
+
+
+# Set up a render process (render processes don't always share memory with the main process, so they get their own copy of settings and metadata)
+def init_render_process(config_values, scriptures_languages, structure):
+  global metadata_structure
+  global structure_index
+  for (key, value) in config_values.items():
+    setattr(config, key, value)
+  metadata_scriptures['languages'] = scriptures_languages
+  metadata_structure = structure
+  structure_index = resources.build_structure_index(structure)
+
+
+# Fetch a chapter, and start rendering it (returns a future for the rendered chapter, or None if the chapter couldn't be loaded)
+def fetch_and_render_chapter(bcp47_lang, book_slug, chapter):
+  chapter_uri = structure_index['chapterUris'][structure_index['chapterOrdinals'][resources.get_chapter_slug(book_slug, chapter)]]
+  html = fetch_chapter(bcp47_lang, chapter_uri)
+  if not html:
+    return None
+  if render_executor:
+    return render_executor.submit(render_chapter, html, bcp47_lang, book_slug, chapter)
+  render_future = concurrent.futures.Future()
+  render_future.set_result(render_chapter(html, bcp47_lang, book_slug, chapter))
+  return render_future
+
+
+# Start fetching and rendering chapters in order (returns a get_chapter_result function for output_full_content)
+# Chapters are fetched on a thread pool and rendered on a process pool, so network and CPU work overlap. No more than PIPELINE_DEPTH chapters are in progress or waiting to be written, and results are returned in the same order as chapter_keys, so output order doesn't depend on timing.
+def start_chapter_pipeline(bcp47_lang, chapter_keys):
+  global fetch_executor
+  global render_executor
+  with executor_lock:
+    if not fetch_executor:
+      fetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, config.MAX_CONCURRENT_REQUESTS))
+    if not render_executor and config.RENDER_PROCESSES > 0:
+      render_executor = concurrent.futures.ProcessPoolExecutor(max_workers=config.RENDER_PROCESSES, initializer=init_render_process, initargs=(get_config_values(), metadata_scriptures['languages'], metadata_structure))
+  
+  remaining_chapter_keys = collections.deque(chapter_keys)
+  in_progress = collections.OrderedDict()  # { (book_slug, chapter): future }
+  
+  # Start more chapters, up to PIPELINE_DEPTH
+  def fill_pipeline():
+    while remaining_chapter_keys and len(in_progress) < max(1, config.PIPELINE_DEPTH):
+      book_slug, chapter = remaining_chapter_keys.popleft()
+      in_progress[(book_slug, chapter)] = fetch_executor.submit(fetch_and_render_chapter, bcp47_lang, book_slug, chapter)
+  
+  # Wait for a chapter to be fetched and rendered
+  def get_chapter_result(book_slug, chapter):
+    fill_pipeline()
+    fetch_future = in_progress.pop((book_slug, chapter), None)
+    if not fetch_future:
+      # The chapter wasn't expected, so fetch and render it now
+      render_future = fetch_and_render_chapter(bcp47_lang, book_slug, chapter)
+    else:
+      render_future = fetch_future.result()
+    fill_pipeline()
+    return render_future.result() if render_future else None
+  
+  return get_chapter_result
+
+
+# Scrape full content for a given language (content_structure can be a slice of metadata_structure; if merge_output is True, results are merged into existing output files)
+# By default, chapters are fetched and rendered ahead of time by a chapter pipeline. get_chapter_result(book_slug, chapter) and version_infos ({ publication_slug: version_info }) can be passed in to use chapters and version info that were prepared elsewhere.
+def output_full_content(bcp47_lang, content_structure=None, merge_output=False, get_chapter_result=None, version_infos=None):
+  content_structure = content_structure or metadata_structure
+  all_publications_dict_list = []
+  all_chapters_dict_list = []
+  all_chapter_media_dict_list = []
+  all_paragraphs_dict_list = []
+  chapter_count = 0
+  paragraph_count = 0
+  store_objects = {}  # { content_hash: text }
+  concordance_builder = None
+  if config.OUTPUT_CONCORDANCE:
+    if content_structure == metadata_structure:
+      concordance_builder = concordance.ConcordanceBuilder(bcp47_lang)
+    else:
+      print_warning('Warning: The concordance was not updated, because only part of the scriptures was scraped.\n')
+  statistics_builder = None
+  if config.OUTPUT_STATISTICS:
+    if content_structure == metadata_structure:
+      statistics_builder = corpus_statistics.StatisticsBuilder(concordance.get_tokenizer(bcp47_lang))
+    else:
+      print_warning(f'Warning: Statistics for {bcp47_lang} were not updated, because only part of the scriptures was scraped.\n')
+  all_cross_references = None
+  chapter_verse_counts = {}  # { chapter_slug: number of verses } (for limiting cross-reference verse ranges)
+  if config.OUTPUT_CROSS_REFERENCES:
+    if not config.INCLUDE_COPYRIGHTED_CONTENT:
+      print_warning('Warning: Cross-references were not created, because INCLUDE_COPYRIGHTED_CONTENT is False.\n')
+    elif content_structure == metadata_structure:
+      all_cross_references = []
+    else:
+      print_warning('Warning: Cross-references were not updated, because only part of the scriptures was scraped.\n')
+  
+  # When streaming, chapter and paragraph rows are written as each chapter is scraped, instead of being kept until the end
+  tabular_stream = None
+  if config.STREAM_TABULAR_OUTPUT and not merge_output and (config.OUTPUT_AS_CSV or config.OUTPUT_AS_TSV or config.OUTPUT_AS_SQL_MYSQL or config.OUTPUT_AS_SQL_SQLITE):
+    tabular_stream = TabularOutputStream(bcp47_lang)
+  
+  if not get_chapter_result:
+    chapter_keys = []
+    for publication_slug, publication_data in content_structure.items():
+      church_availability = metadata_scriptures['languages'][bcp47_lang]['churchAvailability'][publication_slug]
+      for book_slug, book_data in publication_data['books'].items():
+        if church_availability and book_slug in church_availability and book_data.get('churchUri'):
+          chapter_keys += [(book_slug, chapter) for chapter in book_data['churchChapters']]
+    get_chapter_result = start_chapter_pipeline(bcp47_lang, chapter_keys)
   
   # Loop through each publication of scripture
-  for publication_slug, publication_data in metadata_structure.items():
+  for publication_slug, publication_data in content_structure.items():
     if metadata_scriptures['languages'][bcp47_lang]['churchAvailability'][publication_slug]:
+      is_complete_publication = (publication_data == metadata_structure[publication_slug])
       chapters_in_publication_count = 0
       json_content = {}
+      store_content = {}
       html_content = ''
       md_content = ''
       txt_content = ''
       
-      version_info = get_version_info(bcp47_lang, publication_slug, publication_data['churchUri'])
+      version_info = version_infos[publication_slug] if version_infos else get_version_info(bcp47_lang, publication_slug, publication_data['churchUri'])
       publication_key = '_'.join(filter(None, [bcp47_lang, publication_data['abbrev'], version_info['versionKey'] or version_info['editionYear']]))
       publication_version_slug = publication_slug + ('-'+version_info['versionKey'] if version_info['versionKey'] else '')
       
       if config.OUTPUT_AS_CSV or config.OUTPUT_AS_TSV or config.OUTPUT_AS_SQL_MYSQL or config.OUTPUT_AS_SQL_SQLITE:
-        all_publications_dict_list.append({
-          'pubKey': publication_key,
-          'langBcp47': bcp47_lang,
-          'pubPosition': len(all_publications_dict_list),
-          'pubSlug': publication_slug,
-          'pubName': metadata_scriptures['languages'][bcp47_lang]['translatedNames'][publication_slug]['name'],
-          'pubVersionSlug': publication_version_slug,
-          'pubVersionAbbrev': version_info['versionAbbrev'],
-          'pubVersionName': version_info['versionName'],
-          'pubEditionYear': version_info['editionYear'],
-          'pubFirstEditionYear': version_info['firstEditionYear'],
-          'pubCopyrightStatement': version_info['copyrightStatement'],
-          'pubCopyrightOwner': version_info['copyrightOwner'],
-          'pubCategory': 'bible' if publication_slug in ('old-testament', 'new-testament',) else 'cjc',
-          'pubIsHistorical': 0,
-          'pubIsManuscript': 0,
-          'pubSource': 'ChurchofJesusChrist.org',
-          'pubSourceUrl': 'https://www.churchofjesuschrist.org/study/scriptures?lang=' + resources.mapping_bcp47_to_church_lang[bcp47_lang],
-          'pubChurchUri': publication_data['churchUri'],
-        })
+        all_publications_dict_list.append(resources.PublicationRow(
+          pubKey=publication_key,
+          langBcp47=bcp47_lang,
+          pubPosition=len(all_publications_dict_list),
+          pubSlug=publication_slug,
+          pubName=metadata_scriptures['languages'][bcp47_lang]['translatedNames'][publication_slug]['name'],
+          pubVersionSlug=publication_version_slug,
+          pubVersionAbbrev=version_info['versionAbbrev'],
+          pubVersionName=version_info['versionName'],
+          pubEditionYear=version_info['editionYear'],
+          pubFirstEditionYear=version_info['firstEditionYear'],
+          pubCopyrightStatement=version_info['copyrightStatement'],
+          pubCopyrightOwner=version_info['copyrightOwner'],
+          pubCategory='bible' if publication_slug in ('old-testament', 'new-testament',) else 'cjc',
+          pubIsHistorical=0,
+          pubIsManuscript=0,
+          pubSource='ChurchofJesusChrist.org',
+          pubSourceUrl='https://www.churchofjesuschrist.org/study/scriptures?lang=' + resources.mapping_bcp47_to_church_lang[bcp47_lang],
+          pubChurchUri=publication_data['churchUri'],
+        ))
       
       for book_slug, book_data in publication_data['books'].items():
         if book_slug in metadata_scriptures['languages'][bcp47_lang]['churchAvailability'][publication_slug] and book_data.get('churchUri'):
           sys.stdout.write('Scraping {0} ({1})\n'.format(metadata_scriptures['languages'][bcp47_lang]['translatedNames'][book_slug]['name'], book_slug))
         else:
           continue
-        
         previous_page_number = None
         for chapter in book_data['churchChapters']:
-          chapter_number = str(chapter)
-          singular_book_slug = resources.mapping_book_to_singular_slug.get(book_slug) or book_slug
-          chapter_slug = '{0}-{1}'.format('section' if singular_book_slug == 'doctrine-and-covenants' else singular_book_slug, chapter_number)
-          chapter_uri = '{0}/{1}'.format(book_data['churchUri'], chapter_number)
-      
-          # Get chapter content
-          soup = None
-          time.sleep(config.SECONDS_TO_PAUSE_BETWEEN_REQUESTS)
-          if config.INCLUDE_MEDIA_INFO:
-            from playwright.sync_api import sync_playwright
-            with sync_playwright() as pw:
-              browser = pw.chromium.launch(headless=True)
-              page = browser.new_page()
-              page.goto(study_url.format(chapter_uri, resources.mapping_bcp47_to_church_lang[bcp47_lang]))
-              if page.query_selector('#content article[data-uri="{0}"]'.format(chapter_uri)):
-                page.locator('[data-testid="options-tab"]').click()
-                page.wait_for_selector('[data-testid="options-panel-content"]')
-                if page.query_selector('[data-testid="options-panel-content"] label:not([class*="disable"]) [data-testid="download-menu-label"]'):
-                  page.locator('[data-testid="download-menu-label"]').click()
-                  try:
-                    page.wait_for_selector('[data-testid="downloads-panel-header"]')
-                  except Exception as e:
-                    sys.stdout.write(page.content())
-                    raise e
-                full_html = page.content()
-                soup = BeautifulSoup(full_html, 'html.parser')
-              else:
-                print_warning('Warning: Loaded page doesn’t match expected URI: {0}\n'.format(chapter_uri))
-              page.close()
-              browser.close()
-          else:
-            r = requests.get(study_url.format(chapter_uri, resources.mapping_bcp47_to_church_lang[bcp47_lang]))
-            r.encoding = 'utf-8'
-            if r and r.status_code == 200:
-              soup = BeautifulSoup(r.text, 'html.parser')
-              if not soup.select_one('#content article[data-uri="{0}"]'.format(chapter_uri)):
-                print_warning('Warning: Loaded page doesn’t match expected URI: {0}\n'.format(chapter_uri))
+          chapter_result = get_chapter_result(book_slug, chapter)
+          if not chapter_result:
+            failed_chapters.append('{0}/{1}'.format(bcp47_lang, resources.get_chapter_slug(book_slug, chapter)))
+            continue
+          chapter_slug = chapter_result['chapterSlug']
+          paragraph_hashes_by_language.setdefault(bcp47_lang, {})[chapter_slug] = chapter_result['paragraphHashes']
+          previous_page_number = resolve_page_numbers(chapter_result, previous_page_number)
           
-          if soup:
-            content = soup.select_one('#content')            
-            
-            # Get media info
-            chapter_media = []
-            video_element = content.select_one('header video')
-            downloads_element = soup.select_one('[data-testid="download-panel-content"]')
-            if video_element:
-              # TODO: Figure out how to get video URLs. Videos don't load <source> elements when using Playwright (but they load in a regular browser).
-              for source in video_element.select('source'):
-                if source.get('data-src'):
-                  subtype = None
-                  if 'hls.m3u8' in source.get('data-src'):
-                    subtype = 'hls'
-                  elif source.get('data-height') == '360':
-                    subtype = '360p'
-                  elif source.get('data-height') == '720':
-                    subtype = '720p'
-                  elif source.get('data-height') == '1080':
-                    subtype = '1080p'
-                  image_asset_id = None
-                  if 'assets.churchofjesuschrist.org' in video_element.get('data-poster'):
-                    image_asset_id = link.get('data-poster').split['/'][-2]
-                  chapter_media.append({
-                    'type': 'video',
-                    'subtype': subtype,
-                    'url': source.get('data-src'),
-                    'imageUrl': video_element.get('data-poster'),
-                    'startSeconds': None,
-                    'endSeconds': None,
-                    'source': 'ChurchofJesusChrist.org',
-                    'churchAssetId': video_element.get('data-assetid'),
-                    'churchImageAssetId': image_asset_id,
-                  })
-            if downloads_element:
-              for link in downloads_element.select('a'):
-                if link.get('href') and not 'Entire' in link.text:
-                  media_type = None
-                  if 'MP3' in link.text:
-                    media_type = 'audio'
-                  elif 'PDF' in link.text:
-                    media_type = 'pdf'
-                  subtype = None
-                  if 'Male' in link.text:
-                    subtype = 'spoken-male'
-                  elif 'Female' in link.text:
-                    subtype = 'spoken-female'
-                  elif 'Vocal' in link.text:
-                    subtype = 'music-vocal'
-                  elif 'Accompaniment' in link.text:
-                    subtype = 'music-accompaniment'
-                  asset_id = None
-                  if 'assets.churchofjesuschrist.org' in link.get('href'):
-                    asset_id = link.get('href').split['/'][-2]
-                  chapter_media.append({
-                    'type': media_type,
-                    'subtype': subtype,
-                    'url': link.get('href').split('?')[0].split('#')[0],
-                    'imageUrl': None,
-                    'startSeconds': None,
-                    'endSeconds': None,
-                    'source': 'ChurchofJesusChrist.org',
-                    'churchAssetId': asset_id,
-                    'churchImageAssetId': None,
-                  })
-
-            # Simplify HTML markup
-            selectors_to_add_newline_after = '.line, .question, br'
-            for element in content.select(selectors_to_add_newline_after):
-              element.insert_after('\n')
-              if element.name != 'br':
-                element.insert_after(soup.new_tag('br'))
-                element.unwrap()
-            if config.INCLUDE_COPYRIGHTED_CONTENT:
-              
-              # Clean up links
-              for element in content.select('a'):
-                if (element.parent.get('class') and element.parent.get('class')[0] == 'study-summary') or (element.get('class') and element.get('class')[0] == 'study-note-ref'):
-                  if element.get('href') and element.get('href').startswith('/'):
-                    element.attrs['href'] = '#' + element.attrs['href'].split('#')[1]
-                elif element.get('href') and element.get('href').startswith('/'):
-                  element.attrs['href'] = 'https://www.churchofjesuschrist.org' + element.attrs['href']
-              
-              # Clean up footnotes
-              for element in content.select('.study-notes ul, .study-notes li, .study-notes p, .study-notes span'):
-                if element.get('class'):
-                  element.attrs.pop('class')
-                if element.get('data-aid'):
-                  element.attrs.pop('data-aid')
-                if element.get('data-note-category'):
-                  element.attrs.pop('data-note-category')
-                if element.get('data-type'):
-                  if element.get('data-type') == 'verse':
-                    element.attrs['class'] = ['footnotes']
-                  element.attrs.pop('data-type')
-                if element.name in ['span', 'p']:
-                  element.unwrap()
-            
-            # Clean up book titles with dominant text
-            dominant_text = content.select_one('.dominant')
-            if dominant_text:
-              book_title = dominant_text.parent
-              for element in book_title.select('.subordinate'):
-                element.unwrap()
-              for child in book_title.children:
-                if child.name != 'br' and child.string != '\n' and not (isinstance(child, Tag) and child.get('class') and child.get('class')[0] == 'dominant'):
-                  if child.string == ' ' and child.previous_sibling and child.previous_sibling.name == 'small':
-                    child.previous_sibling.append(' ')
-                    child.extract()
-                  else:
-                    child.wrap(soup.new_tag('small'))
-                
-            # Remove hard line breaks from titles
-            for element in content.select('h1 br, h2 br'):
-              element.decompose()
-            for element in content.select('h1, h2'):
-              for child in element.children:
-                if child.string == '\n':
-                  child.extract()
-            
-            # Remove unneeded inline elements
-            selectors_to_remove = 'span[data-pointer-type]'
-            selectors_to_unwrap = '.deity-name, .para-mark, span.marker, .dominant, .subordinate, .language, .translit, .question, .answer, .line, .selah'
-            if not config.INCLUDE_COPYRIGHTED_CONTENT:
-              selectors_to_remove += ', sup, .study-summary, .study-intro, .study-notes, article[data-uri="/scriptures/dc-testament/od/2"] p:not(#title_number1)'
-              selectors_to_unwrap += ', a'
-            for element in content.select(selectors_to_remove):
-              element.decompose()
-            for element in content.select(selectors_to_unwrap):
-              element.unwrap()
-            
-            # Select paragraphs (block elements and images) to be included
-            paragraph_selectors = '.page-break, h1, h2, p' # .page-break is for paragraph metadata (it won't be included as a paragraph in final output)
-            if config.INCLUDE_IMAGES:
-              paragraph_selectors += ', .body-block img'
-            if config.INCLUDE_COPYRIGHTED_CONTENT:
-              paragraph_selectors += ', .footnotes'
-            paragraphs = content.select(paragraph_selectors)
-            
-            chapter_name = soup.select_one('[data-testid="readerview-header"] > span').text.strip()
-            chapter_abbrev = None
-            if metadata_scriptures['languages'][bcp47_lang]['translatedNames'][book_slug]['abbrev']:
-              if book_slug in resources.mapping_book_to_singular_slug.keys():
-                singular_book_slug = resources.mapping_book_to_singular_slug.get(book_slug)
-                chapter_abbrev = chapter_name.replace(metadata_scriptures['languages'][bcp47_lang]['translatedNames'][singular_book_slug]['name'], metadata_scriptures['languages'][bcp47_lang]['translatedNames'][singular_book_slug]['abbrev'])
-              else:
-                chapter_abbrev = chapter_name.replace(metadata_scriptures['languages'][bcp47_lang]['translatedNames'][book_slug]['name'], metadata_scriptures['languages'][bcp47_lang]['translatedNames'][book_slug]['abbrev'])
-            
-            if config.OUTPUT_AS_JSON:
-              chapter_dict = {
-                'name': chapter_name,
-                'abbrev': chapter_abbrev,
-                'number': chapter_number,
-                'churchUri': chapter_uri,
-                'paragraphs': [],
-                'media': chapter_media,
-              }
-              if config.SPLIT_JSON_BY_CHAPTER:
-                chapters_in_publication_count += 1
-                json_content = chapter_dict
-              else:
-                if book_slug not in json_content:
-                  json_content[book_slug] = {}
-                json_content[book_slug][chapter_slug] = chapter_dict
-            
-            if chapters_in_publication_count > 1:
-              # If this isn't the first chapter in the file, add a horizontal rule
-              if config.OUTPUT_AS_HTML:
-                html_content += '\n<hr>\n\n'
-              if config.OUTPUT_AS_TXT:
-                txt_content += '\n--------------------\n\n'
-              if config.OUTPUT_AS_MD:
-                md_content += '\n---\n\n'
-            
-            if config.OUTPUT_AS_CSV or config.OUTPUT_AS_TSV or config.OUTPUT_AS_SQL_MYSQL or config.OUTPUT_AS_SQL_SQLITE:
-              all_chapters_dict_list.append({
-                'pubKey': publication_key,
-                'chPosition': len(all_chapters_dict_list),
-                'chSlug': chapter_slug,
-                'chName': chapter_name,
-                'chAbbrev': chapter_abbrev,
-                'chNumber': chapter_number,
-                'bookSlug': book_slug,
-                'chChurchUri': chapter_uri,
-              })
-              for media_item in chapter_media:
-                all_chapter_media_dict_list.append({
-                  'pubKey': publication_key,
-                  'chSlug': chapter_slug,
-                  'chmType': media_item.get('type'),
-                  'chmSubType': media_item.get('subtype'),
-                  'chmUrl': media_item.get('url'),
-                  'chmImageUrl': media_item.get('imageUrl'),
-                  'chmStartSeconds': media_item.get('startSeconds'),
-                  'chmEndSeconds': media_item.get('endSeconds'),
-                  'chmSource': media_item.get('source'),
-                  'chmChurchAssetId': media_item.get('churchAssetId'),
-                  'chmChurchImageAssetId': media_item.get('churchImageAssetId'),
-                })
-            
+          if config.OUTPUT_AS_JSON:
+            if config.SPLIT_JSON_BY_CHAPTER:
+              chapters_in_publication_count += 1
+              json_content = chapter_result['json']
+            else:
+              if book_slug not in json_content:
+                json_content[book_slug] = {}
+              json_content[book_slug][chapter_slug] = chapter_result['json']
+          
+          if statistics_builder:
+            statistics_builder.add_chapter(publication_slug, book_slug, chapter_slug, chapter_result['json']['paragraphs'])
+          
+          if concordance_builder:
+            for paragraph_dict in chapter_result['json']['paragraphs']:
+              if paragraph_dict['type'] != 'image':
+                concordance_builder.add_paragraph(book_slug, paragraph_dict['compareId'], paragraph_dict['content'])
+          
+          if all_cross_references is not None:
+            all_cross_references += chapter_result['crossReferences']
+            chapter_verse_counts[chapter_slug] = cross_references.get_verse_count(chapter_result['json']['paragraphs'])
+          
+          if config.OUTPUT_AS_STORE:
+            store_content.setdefault(book_slug, {})[chapter_slug] = add_chapter_to_store(chapter_result['json'], store_objects)
+          
+          if chapters_in_publication_count > 1:
+            # If this isn't the first chapter in the file, add a horizontal rule
             if config.OUTPUT_AS_HTML:
-              # Make sure paragraph IDs are unique when there are multiple chapters on a page
-              paragraph_id_prefix = chapter_slug + '_'
-              prepend_chapter_slug_to_paragraph_ids = True
-              if not prepend_chapter_slug_to_paragraph_ids:
-                paragraph_id_prefix = ''
-              
-              # Add chapter media
-              for media_item in chapter_media:
-                if media_item.get('type') == 'audio':
-                  html_content += '\n<audio controls preload="metadata" data-subtype="{0}" src="{1}"></audio>\n'.format(media_item.get('subtype') or '', media_item.get('url'))
-                elif media_item.get('type') == 'video':
-                  html_content += '\n<video controls preload="metadata" data-subtype="{0}" src="{1}" poster="{2}"></video>\n'.format(media_item.get('subtype') or '', media_item.get('url'), media_item.get('imageUrl'))
-            
-            # Set the initial page number, if it's not already set (this will be used when processing paragraphs)
-            first_page_number_element_in_chapter = soup.select_one('.page-break')
-            if first_page_number_element_in_chapter and not previous_page_number:
-              previous_page_number = str(int(first_page_number_element_in_chapter.attrs['data-page']) - 1)
-            
-            # Create formatted output for each paragraph
-            for paragraph in paragraphs:
-              
-              # Skip .page-break elements that have already been decomposed
-              try:
-                is_valid_element = paragraph.get('class')
-              except:
-                continue
-              
-              # Get paragraph page number and remove .page-break elements
-              paragraph_page_number = previous_page_number
-              if paragraph.get('class') and paragraph.get('class')[0] == 'page-break':
-                previous_page_number = paragraph.attrs['data-page']
-                continue
-              page_break_element = paragraph.select_one('.page-break')
-              if page_break_element:
-                previous_page_number = page_break_element.attrs['data-page']
-                paragraph_page_number += ',' + previous_page_number
-                page_break_element.decompose()
-              
-              church_paragraph_id = paragraph.get('id')
-              paragraph_type = get_paragraph_type(paragraph)
-              paragraph_id = get_paragraph_id(chapter_slug, paragraph_type)
-              paragraph_number = get_paragraph_number(paragraph)
-              paragraph_compare_id = f'{chapter_slug}_{paragraph_id}'
-              
-              if config.OUTPUT_AS_JSON:
-                # Add paragraph to chapter dict
-                paragraph_content = get_paragraph_content(paragraph, content_type='text', id_prefix=paragraph_id_prefix, id=paragraph_id)
-                paragraph_content_html = get_paragraph_content(paragraph, content_type='html', id_prefix=paragraph_id_prefix, id=paragraph_id)
-                if paragraph_content or paragraph_content_html:
-                  chapter_dict['paragraphs'].append({
-                    'type': paragraph_type,
-                    'id': paragraph_id,
-                    'content': paragraph_content,
-                    'contentHtml': paragraph_content_html,
-                    'number': paragraph_number.strip() if paragraph_number else None,
-                    'pageNumber': paragraph_page_number,
-                    'compareId': paragraph_compare_id,
-                    'churchId': church_paragraph_id,
-                  })
-            
-              if config.OUTPUT_AS_HTML:
-                # Add paragraph to HTML string
-                paragraph_content = get_paragraph_content(paragraph, content_type='html', include_number=True, id_prefix=paragraph_id_prefix, id=paragraph_id)
-                if paragraph_content:
-                  if paragraph_type == 'book-title':
-                    paragraph_content = f'\n<h1 id="{book_slug}" class="{paragraph_type}">{paragraph_content}</h1>\n'
-                  elif paragraph_type == 'chapter-title':
-                    paragraph_content = f'\n<h2 id="{chapter_slug}" class="{paragraph_type}">{paragraph_content}</h2>\n'
-                  elif paragraph_type == 'section-title':
-                    paragraph_content = f'\n<h3 id="{paragraph_id_prefix}{paragraph_id}" class="{paragraph_type}">{paragraph_content}</h3>\n'
-                  elif paragraph_type == 'image':
-                    paragraph_content = f'{paragraph_content}\n'
-                  elif paragraph_type == 'footnotes':
-                    paragraph_content = f'<ul id="{paragraph_id_prefix}{paragraph_id}" class="{paragraph_type}">{paragraph_content}</ul>\n'
-                  else:
-                    paragraph_content = f'<p id="{paragraph_id_prefix}{paragraph_id}" class="{paragraph_type}">{paragraph_content}</p>\n'
-                  html_content += paragraph_content
-                
-              if config.OUTPUT_AS_MD:
-                # Add paragraph to markdown string
-                paragraph_content = get_paragraph_content(paragraph, content_type='markdown', include_number=True, id_prefix=paragraph_id_prefix)
-                if paragraph_content:
-                  if paragraph_type == 'book-title':
-                    paragraph_anchor = f'<a name="{book_slug}"></a>'
-                    paragraph_content = f'# {paragraph_anchor}{paragraph_content}\n\n'
-                  elif paragraph_type == 'chapter-title':
-                    paragraph_anchor = f'<a name="{chapter_slug}"></a>'
-                    paragraph_content = f'## {paragraph_anchor}{paragraph_content}\n\n'
-                  elif paragraph_type == 'section-title':
-                    paragraph_anchor = f'<a name="{paragraph_id_prefix}{paragraph_id}"></a>'
-                    paragraph_content = f'### {paragraph_anchor}{paragraph_content}\n\n'
-                  elif paragraph_type == 'image':
-                    paragraph_anchor = f'<a name="{paragraph_id_prefix}{paragraph_id}"></a>'
-                    paragraph_content = f'{paragraph_anchor}![]({paragraph_content})\n\n'
-                  else:
-                    paragraph_anchor = f'<a name="{paragraph_id_prefix}{paragraph_id}"></a>'
-                    paragraph_content = f'{paragraph_anchor}{paragraph_content}\n\n'
-                  md_content += paragraph_content
-            
-              if config.OUTPUT_AS_TXT:
-                # Add paragraph to text string
-                paragraph_content = get_paragraph_content(paragraph, content_type='text', include_number=True)
-                if paragraph_content:
-                  if paragraph_type == 'chapter-title':
-                    paragraph_content = paragraph_content.upper()
-                  txt_content += paragraph_content + '\n\n'
-
-              if config.OUTPUT_AS_CSV or config.OUTPUT_AS_TSV or config.OUTPUT_AS_SQL_MYSQL or config.OUTPUT_AS_SQL_SQLITE:
-                paragraph_content = get_paragraph_content(paragraph, content_type='text', id=paragraph_id)
-                paragraph_content_html = get_paragraph_content(paragraph, content_type='html', id=paragraph_id)
-                if paragraph_content or paragraph_content_html:
-                  all_paragraphs_dict_list.append({
-                    'pubKey': publication_key,
-                    'chSlug': chapter_slug,
-                    'parPosition': len(all_paragraphs_dict_list),
-                    'parType': paragraph_type,
-                    'parId': paragraph_id,
-                    'parContent': paragraph_content,
-                    'parContentHtml': paragraph_content_html,
-                    'parNumber': paragraph_number,
-                    'parPageNumber': paragraph_page_number,
-                    'parCompareId': paragraph_compare_id,
-                    'parChurchId': church_paragraph_id,
-                  })
-            
-            if config.OUTPUT_AS_JSON and config.SPLIT_JSON_BY_CHAPTER:
-              # Create JSON file for a single chapter
-              file_extension = 'json'
-              file_path = os.path.join(output_directory, f'{bcp47_lang}-{file_extension}', publication_slug, book_slug, f'{chapter_slug}.{file_extension}')
-              os.makedirs(os.path.dirname(file_path), exist_ok=True)
-              with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(json_content, fp=f, indent=(None if config.MINIFY_JSON else config.JSON_INDENT), separators=((',', ':') if config.MINIFY_JSON else (', ', ': ')), ensure_ascii=False, sort_keys=False)
+              html_content += '\n<hr>\n\n'
+            if config.OUTPUT_AS_TXT:
+              txt_content += '\n--------------------\n\n'
+            if config.OUTPUT_AS_MD:
+              md_content += '\n---\n\n'
+          
+          # Add chapter content and rows (with publication key and positions)
+          html_content += chapter_result['html']
+          md_content += chapter_result['md']
+          txt_content += chapter_result['txt']
+          for chapter_dict in chapter_result['chapters']:
+            chapter_dict['pubKey'] = publication_key
+            chapter_dict['chPosition'] = chapter_count
+            chapter_count += 1
+          for chapter_media_dict in chapter_result['chapterMedia']:
+            chapter_media_dict['pubKey'] = publication_key
+          for paragraph_dict in chapter_result['paragraphs']:
+            paragraph_dict['pubKey'] = publication_key
+            paragraph_dict['parPosition'] = paragraph_count
+            paragraph_count += 1
+          if tabular_stream:
+            tabular_stream.write_rows('Chapters', chapter_result['chapters'])
+            tabular_stream.write_rows('ChapterMedia', chapter_result['chapterMedia'])
+            tabular_stream.write_rows('Paragraphs', chapter_result['paragraphs'])
+          else:
+            all_chapters_dict_list += chapter_result['chapters']
+            all_chapter_media_dict_list += chapter_result['chapterMedia']
+            all_paragraphs_dict_list += chapter_result['paragraphs']
+          
+          if config.OUTPUT_AS_JSON and config.SPLIT_JSON_BY_CHAPTER:
+            # Create JSON file for a single chapter
+            file_extension = 'json'
+            write_output_file(f'{bcp47_lang}-{file_extension}/{publication_slug}/{book_slug}/{chapter_slug}.{file_extension}', json.dumps(json_content, indent=(None if config.MINIFY_JSON else config.JSON_INDENT), separators=((',', ':') if config.MINIFY_JSON else (', ', ': ')), ensure_ascii=False, sort_keys=False))
       
       # Print summary of chapter-level files created
       if config.OUTPUT_AS_JSON and config.SPLIT_JSON_BY_CHAPTER:
@@ -1135,16 +1789,21 @@ def output_full_content(bcp47_lang):
         indented_html_content = html_content.replace('\n', '\n    ')
         return resources.html_template.format(bcp47_lang, metadata_scriptures['languages'][bcp47_lang]['translatedNames'][publication_slug]['name'], stylesheet_link, indented_html_content)
       
-      # Create publication-level output file
-      def createPublicationFile(file_extension, content):
-        file_path = os.path.join(output_directory, f'{bcp47_lang}-{file_extension}', f'{publication_slug}.{file_extension}')
+      # Create publication-level output file (file_type is the name of the output folder, if it's different from the file extension)
+      def createPublicationFile(file_extension, content, file_type=None):
+        relative_path = f'{bcp47_lang}-{file_type or file_extension}/{publication_slug}.{file_extension}'
+        file_path = os.path.join(output_directory, relative_path)
+        if merge_output and file_extension == 'json' and os.path.exists(file_path):
+          # Merge chapters into the existing JSON file
+          with open(file_path, 'r', encoding='utf-8') as f:
+            content = merge_json_content(json.load(f), content)
+        elif not is_complete_publication:
+          print_warning(f'Warning: {os.path.basename(file_path)} was not updated, because only part of the publication was scraped.\n')
+          return
         sys.stdout.write(f'Creating {os.path.basename(file_path)}\n')
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-          if file_extension == 'json':
-            json.dump(content, fp=f, indent=(None if config.MINIFY_JSON else config.JSON_INDENT), separators=((',', ':') if config.MINIFY_JSON else (', ', ': ')), ensure_ascii=False, sort_keys=False)
-          else:
-            f.write(content)
+        if file_extension == 'json':
+          content = json.dumps(content, indent=(None if config.MINIFY_JSON else config.JSON_INDENT), separators=((',', ':') if config.MINIFY_JSON else (', ', ': ')), ensure_ascii=False, sort_keys=False)
+        write_output_file(relative_path, content)
       
       # Create publication-level files in each applicable format
       if config.OUTPUT_AS_JSON and not config.SPLIT_JSON_BY_CHAPTER:
@@ -1155,22 +1814,74 @@ def output_full_content(bcp47_lang):
         createPublicationFile('md', md_content)
       if config.OUTPUT_AS_TXT:
         createPublicationFile('txt', txt_content)
+      if config.OUTPUT_AS_STORE:
+        createPublicationFile('json', store_content, file_type='store')
 
       sys.stdout.write('\n')
+  
+  if config.OUTPUT_AS_STORE:
+    output_store_objects(bcp47_lang, store_objects, merge_output)
+  
+  if statistics_builder:
+    statistics_by_language[bcp47_lang] = statistics_builder.get_statistics()
+  
+  if concordance_builder:
+    # Create concordance and word frequency files
+    for file_name, content in (('concordance.json', concordance_builder.get_concordance()), ('frequencies.json', concordance_builder.get_frequencies()),):
+      sys.stdout.write(f'Creating {file_name}\n')
+      write_output_file(f'{bcp47_lang}-concordance/{file_name}', json.dumps(content, indent=(None if config.MINIFY_JSON else config.JSON_INDENT), separators=((',', ':') if config.MINIFY_JSON else (', ', ': ')), ensure_ascii=False, sort_keys=False))
+    sys.stdout.write('\n')
+  
+  if all_cross_references is not None:
+    # Create cross-reference index
+    sys.stdout.write('Creating cross-references.json\n\n')
+    cross_reference_index = {
+      '_about': 'Generated {0} by Python Scripture Scraper (https://github.com/samuelbradshaw/python-scripture-scraper)'.format(date_today),
+      'language': bcp47_lang,
+      **cross_references.build_index(all_cross_references, structure_index['chapterOrdinals'], chapter_verse_counts),
+    }
+    write_output_file(f'{bcp47_lang}-cross-references/cross-references.json', json.dumps(cross_reference_index, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False))
+  
+  if tabular_stream:
+    # Finish streamed files (publication rows are only written at the end, so they're always complete)
+    tabular_stream.write_rows('Publications', all_publications_dict_list)
+    tabular_stream.close()
+    return
 
+  if merge_output:
+    # Merge rows into existing rows from the previous run's CSV or TSV files (only formats that are enabled in this run are used, so stale files from an older run aren't merged in)
+    merge_file_type = next((file_type for (file_type, is_enabled) in (('csv', config.OUTPUT_AS_CSV), ('tsv', config.OUTPUT_AS_TSV),) if is_enabled and os.path.exists(os.path.join(output_directory, f'{bcp47_lang}-{file_type}', f'Paragraphs.{file_type}'))), None)
+    if merge_file_type:
+      delimiter = '\t' if (merge_file_type == 'tsv') else ','
+      existing_directory = os.path.join(output_directory, f'{bcp47_lang}-{merge_file_type}')
+      existing_dict_lists = [resources.read_dicts_from_csv(os.path.join(existing_directory, f'{file_name}.{merge_file_type}'), delimiter, row_type) if os.path.exists(os.path.join(existing_directory, f'{file_name}.{merge_file_type}')) else [] for (file_name, row_type) in (('Publications', resources.PublicationRow), ('Chapters', resources.ChapterRow), ('ChapterMedia', resources.ChapterMediaRow), ('Paragraphs', resources.ParagraphRow),)]
+      # Publications are matched by language and slug, since a re-scraped publication can have a new key, and rows from the previous run that are kept are moved to the new key
+      scraped_publication_keys = {(row['langBcp47'], row['pubSlug']): row['pubKey'] for row in all_publications_dict_list}
+      replaced_pub_keys = {row['pubKey']: scraped_publication_keys[(row['langBcp47'], row['pubSlug'])] for row in existing_dict_lists[0] if (row['langBcp47'], row['pubSlug']) in scraped_publication_keys}
+      for existing_dict_list in existing_dict_lists[1:]:
+        for row in existing_dict_list:
+          row['pubKey'] = replaced_pub_keys.get(row['pubKey'], row['pubKey'])
+      scraped_chapter_slugs = set(row['chSlug'] for row in all_chapters_dict_list)
+      all_publications_dict_list = resources.merge_dict_lists(existing_dict_lists[0], all_publications_dict_list, ('langBcp47', 'pubSlug'), scraped_publication_keys, 'pubSlug', structure_index['publicationOrdinals'], 'pubPosition')
+      all_chapters_dict_list = resources.merge_dict_lists(existing_dict_lists[1], all_chapters_dict_list, 'chSlug', scraped_chapter_slugs, 'chSlug', structure_index['chapterOrdinals'], 'chPosition')
+      all_chapter_media_dict_list = resources.merge_dict_lists(existing_dict_lists[2], all_chapter_media_dict_list, 'chSlug', scraped_chapter_slugs, 'chSlug', structure_index['chapterOrdinals'])
+      all_paragraphs_dict_list = resources.merge_dict_lists(existing_dict_lists[3], all_paragraphs_dict_list, 'chSlug', scraped_chapter_slugs, 'chSlug', structure_index['chapterOrdinals'], 'parPosition')
+    elif content_structure != metadata_structure:
+      # Without existing rows, tables would only have newly-scraped rows, so files from the previous run are kept instead
+      if config.OUTPUT_AS_CSV or config.OUTPUT_AS_TSV or config.OUTPUT_AS_SQL_MYSQL or config.OUTPUT_AS_SQL_SQLITE:
+        print_warning(f'Warning: CSV, TSV, and SQL files for {bcp47_lang} were not updated, because only part of the scriptures was scraped, and there are no existing CSV or TSV files to merge with (include csv or tsv in --formats).\n')
+      return
+  
   # Create CSV or TSV file from a list of dicts
   def create_csv_from_dicts(file_type, file_name, dict_list):
-    file_path = os.path.join(output_directory, f'{bcp47_lang}-{file_type}', file_name)
-    sys.stdout.write(f'Creating {os.path.basename(file_path)}\n')
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w', newline='', encoding='utf-8') as f:
-      content = ''
-      delimiter = '\t' if (file_type == 'tsv') else ','
-      if dict_list:
-        writer = csv.DictWriter(f, fieldnames=dict_list[0].keys(), delimiter=delimiter)
-        writer.writeheader()
-        writer.writerows(dict_list)
-      f.write(content)
+    sys.stdout.write(f'Creating {file_name}\n')
+    f = io.StringIO()
+    delimiter = '\t' if (file_type == 'tsv') else ','
+    if dict_list:
+      writer = csv.DictWriter(f, fieldnames=dict_list[0].keys(), delimiter=delimiter)
+      writer.writeheader()
+      writer.writerows(dict_list)
+    write_output_file(f'{bcp47_lang}-{file_type}/{file_name}', f.getvalue(), newline='')
   
   if config.OUTPUT_AS_CSV:
     # Create CSV files
@@ -1196,11 +1907,8 @@ def output_full_content(bcp47_lang):
     sql_inserts += resources.create_sql_insert_statement('ChapterMedia', all_chapter_media_dict_list)
     sql_inserts += resources.create_sql_insert_statement('Paragraph', all_paragraphs_dict_list)
     content = resources.sql_mysql_template.format(sql_inserts)
-    file_path = os.path.join(output_directory, f'{bcp47_lang}-sql-mysql', 'scriptures.sql')
-    sys.stdout.write(f'Creating {os.path.basename(file_path)} (MySQL)\n')
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w', encoding='utf-8') as f:
-      f.write(content)
+    sys.stdout.write('Creating scriptures.sql (MySQL)\n')
+    write_output_file(f'{bcp47_lang}-sql-mysql/scriptures.sql', content)
     
   if config.OUTPUT_AS_SQL_SQLITE:
     # Create SQL (SQLite) file
@@ -1210,15 +1918,360 @@ def output_full_content(bcp47_lang):
     sql_inserts += resources.create_sql_insert_statement('ChapterMedia', all_chapter_media_dict_list)
     sql_inserts += resources.create_sql_insert_statement('Paragraph', all_paragraphs_dict_list)
     content = resources.sql_sqlite_template.format(sql_inserts)
-    file_path = os.path.join(output_directory, f'{bcp47_lang}-sql-sqlite', 'scriptures.sql')
-    sys.stdout.write(f'Creating {os.path.basename(file_path)} (SQLite)\n')
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w', encoding='utf-8') as f:
-      f.write(content)
+    sys.stdout.write('Creating scriptures.sql (SQLite)\n')
+    write_output_file(f'{bcp47_lang}-sql-sqlite/scriptures.sql', content)
     
     sys.stdout.write('\n')
     
 
+# Writes CSV, TSV, and SQL rows for a language to output files as they're added, so rows don't need to be kept in memory (files are byte-identical to the files created from complete lists of rows)
+# CSV and TSV rows are written directly to their files. SQL rows are written to a temporary file for each table, and combined with the SQL templates when the stream is closed.
+class TabularOutputStream:
+  table_names = { 'Publications': 'Publication', 'Chapters': 'Chapter', 'ChapterMedia': 'ChapterMedia', 'Paragraphs': 'Paragraph' }
+  
+  def __init__(self, bcp47_lang):
+    self.bcp47_lang = bcp47_lang
+    self.csv_files = {}  # { relative_path: (file, file_type, table) }
+    self.csv_writers = {}  # { relative_path: csv.DictWriter }
+    self.sql_files = {}  # { table: temporary file }
+    self.sql_field_names = {}  # { table: field names }
+    for file_type in ('csv', 'tsv'):
+      if (file_type == 'csv' and config.OUTPUT_AS_CSV) or (file_type == 'tsv' and config.OUTPUT_AS_TSV):
+        for table in self.table_names:
+          relative_path = f'{bcp47_lang}-{file_type}/{table}.{file_type}'
+          self.csv_files[relative_path] = (open_output_file(relative_path, newline=''), file_type, table)
+    if config.OUTPUT_AS_SQL_MYSQL or config.OUTPUT_AS_SQL_SQLITE:
+      for table in self.table_names:
+        self.sql_files[table] = tempfile.TemporaryFile('w+', newline='', encoding='utf-8')
+  
+  # Write rows to a table (like 'Paragraphs')
+  def write_rows(self, table, dict_list):
+    if not dict_list:
+      return
+    for relative_path, (f, file_type, file_table) in self.csv_files.items():
+      if file_table == table:
+        if relative_path not in self.csv_writers:
+          self.csv_writers[relative_path] = csv.DictWriter(f, fieldnames=dict_list[0].keys(), delimiter='\t' if (file_type == 'tsv') else ',')
+          self.csv_writers[relative_path].writeheader()
+        self.csv_writers[relative_path].writerows(dict_list)
+    if self.sql_files:
+      # Rows are separated with commas as they're written, and the last row gets a semicolon when the stream is closed
+      f = self.sql_files[table]
+      for item in dict_list:
+        if table in self.sql_field_names:
+          f.write(',\n')
+        else:
+          self.sql_field_names[table] = list(item.keys())
+        f.write(f'  ({resources.get_sql_values_string(item)})')
+  
+  # Finish writing all files
+  def close(self):
+    for relative_path, (f, file_type, table) in self.csv_files.items():
+      sys.stdout.write(f'Creating {table}.{file_type}\n')
+      close_output_file(relative_path, f)
+    if self.csv_files:
+      sys.stdout.write('\n')
+    
+    for (flavor, flavor_name, sql_template, is_enabled) in (('mysql', 'MySQL', resources.sql_mysql_template, config.OUTPUT_AS_SQL_MYSQL), ('sqlite', 'SQLite', resources.sql_sqlite_template, config.OUTPUT_AS_SQL_SQLITE)):
+      if is_enabled:
+        sys.stdout.write(f'Creating scriptures.sql ({flavor_name})\n')
+        relative_path = f'{self.bcp47_lang}-sql-{flavor}/scriptures.sql'
+        (template_start, template_end) = sql_template.format('\0').split('\0')
+        f = open_output_file(relative_path)
+        f.write(template_start)
+        for table, table_name in self.table_names.items():
+          if table in self.sql_field_names:
+            f.write(f'INSERT INTO {table_name} ({", ".join(self.sql_field_names[table])})\nVALUES\n')
+            self.sql_files[table].seek(0)
+            shutil.copyfileobj(self.sql_files[table], f)
+            f.write(';\n\n')
+        f.write(template_end)
+        close_output_file(relative_path, f)
+    for f in self.sql_files.values():
+      f.close()
+    if config.OUTPUT_AS_SQL_SQLITE:
+      sys.stdout.write('\n')
+
+
+# Load content hashes from the previous run (returns None if there was no previous run)
+def load_previous_hashes():
+  hashes_path = os.path.join(output_directory, 'metadata-hashes.min.json')
+  if os.path.exists(hashes_path):
+    with open(hashes_path, 'r', encoding='utf-8') as f:
+      return json.load(f)
+  return None
+
+
+# Get a hash for a string or bytes
+def get_content_hash(content):
+  if isinstance(content, str):
+    content = content.encode('utf-8')
+  return hashlib.sha256(content).hexdigest()
+
+
+# Write an output file to the staging directory (relative_path uses / as a separator; newline works the same as with open(); bytes are written as they are)
+# If the file is byte-identical to the file from the previous run, the previous file is hardlinked instead of being written again.
+def write_output_file(relative_path, content, newline=None):
+  if isinstance(content, bytes):
+    data = content
+  else:
+    if newline is None and os.linesep != '\n':
+      content = content.replace('\n', os.linesep)
+    data = content.encode('utf-8')
+  file_hash = get_content_hash(data)
+  file_path = os.path.join(staging_directory, relative_path)
+  os.makedirs(os.path.dirname(file_path), exist_ok=True)
+  if relative_path not in hash_excluded_files:
+    output_file_hashes[relative_path] = file_hash
+  if link_unchanged_output_file(relative_path, file_hash, len(data)):
+    return
+  with open(file_path, 'wb') as f:
+    f.write(data)
+
+
+# Open an output file in the staging directory, so it can be written in pieces (close it with close_output_file)
+def open_output_file(relative_path, newline=None):
+  file_path = os.path.join(staging_directory, relative_path)
+  os.makedirs(os.path.dirname(file_path), exist_ok=True)
+  return open(file_path, 'w', newline=newline, encoding='utf-8')
+
+
+# Close an output file that was opened with open_output_file, and record its hash (if it's byte-identical to the file from the previous run, the previous file is hardlinked in its place)
+def close_output_file(relative_path, f):
+  f.close()
+  file_path = os.path.join(staging_directory, relative_path)
+  file_hash = hashlib.sha256()
+  with open(file_path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+      file_hash.update(chunk)
+  output_file_hashes[relative_path] = file_hash.hexdigest()
+  link_unchanged_output_file(relative_path, file_hash.hexdigest(), os.path.getsize(file_path), replace=True)
+
+
+# Hardlink a file from the previous run into the staging directory if it has the given hash and size (returns True if the file was linked)
+def link_unchanged_output_file(relative_path, file_hash, file_size, replace=False):
+  file_path = os.path.join(staging_directory, relative_path)
+  previous_file_path = os.path.join(output_directory, relative_path)
+  if previous_file_hashes.get(relative_path) == file_hash and os.path.isfile(previous_file_path) and os.path.getsize(previous_file_path) == file_size:
+    try:
+      if replace:
+        os.link(previous_file_path, file_path + '.link')
+        os.replace(file_path + '.link', file_path)
+      else:
+        os.link(previous_file_path, file_path)
+      return True
+    except OSError:
+      pass
+  return False
+
+
+# Hardlink files from the previous run that weren't written in this run into the staging directory (used when merging)
+def link_previous_output_files():
+  for directory, directory_names, file_names in os.walk(output_directory):
+    directory_names.sort()
+    for file_name in sorted(file_names):
+      previous_file_path = os.path.join(directory, file_name)
+      relative_path = os.path.relpath(previous_file_path, output_directory).replace(os.sep, '/')
+      file_path = os.path.join(staging_directory, relative_path)
+      if relative_path in hash_excluded_files or relative_path in removed_output_files or os.path.exists(file_path):
+        continue
+      os.makedirs(os.path.dirname(file_path), exist_ok=True)
+      try:
+        os.link(previous_file_path, file_path)
+      except OSError:
+        shutil.copy2(previous_file_path, file_path)
+      if relative_path not in previous_file_hashes:
+        with open(previous_file_path, 'rb') as f:
+          previous_file_hashes[relative_path] = get_content_hash(f.read())
+      output_file_hashes[relative_path] = previous_file_hashes[relative_path]
+
+
+# Replace the output directory with the staging directory
+# The output directory is a symlink to a folder in the versions directory (like _output.versions/20240101-120000-000000), so it can be switched to the new output with a single os.replace, and readers see either the previous run or this run (never a missing directory). Where symlinks aren't supported, the output directory is a regular directory that's replaced with two renames.
+def swap_staging_directory():
+  versions_directory = output_directory + '.versions'
+  version_directory = os.path.join(versions_directory, datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+  link_path = output_directory + '.link'
+  os.makedirs(versions_directory, exist_ok=True)
+  os.rename(staging_directory, version_directory)
+  if os.path.lexists(link_path):
+    os.remove(link_path)
+  try:
+    os.symlink(os.path.relpath(version_directory, os.path.dirname(output_directory)), link_path, target_is_directory=True)
+  except (OSError, NotImplementedError):
+    os.rename(version_directory, staging_directory)
+    rename_staging_directory()
+    return
+  if os.path.isdir(output_directory) and not os.path.islink(output_directory):
+    # Output from a run without a versioned directory is moved out of the way first (if the run stops here, it's put back by recover_output_directory)
+    os.rename(output_directory, output_directory + '.previous')
+  os.replace(link_path, output_directory)
+  shutil.rmtree(output_directory + '.previous', ignore_errors=True)
+  
+  # Remove output from earlier runs
+  for version_name in os.listdir(versions_directory):
+    if version_name != os.path.basename(version_directory):
+      shutil.rmtree(os.path.join(versions_directory, version_name), ignore_errors=True)
+
+
+# Replace the output directory with the staging directory by renaming them (used where symlinks aren't supported; the output directory is briefly missing between the two renames)
+def rename_staging_directory():
+  previous_directory = output_directory + '.previous'
+  shutil.rmtree(previous_directory, ignore_errors=True)
+  if os.path.lexists(output_directory):
+    os.rename(output_directory, previous_directory)
+  os.rename(staging_directory, output_directory)
+  shutil.rmtree(previous_directory, ignore_errors=True)
+
+
+# Put the previous output directory back if a run stopped while the output directory was being replaced
+def recover_output_directory():
+  previous_directory = output_directory + '.previous'
+  if os.path.isdir(previous_directory):
+    if os.path.lexists(output_directory):
+      shutil.rmtree(previous_directory, ignore_errors=True)
+    else:
+      print_warning('Warning: Restoring {0} from {1} (the previous run stopped while replacing it).\n'.format(output_directory, previous_directory))
+      os.rename(previous_directory, output_directory)
+
+
+# Compare hashes from the previous run with hashes from this run (keys are file paths or paragraph compare ids)
+def compare_hashes(previous_hashes, current_hashes):
+  return {
+    'added': [key for key in current_hashes if key not in previous_hashes],
+    'removed': [key for key in previous_hashes if key not in current_hashes],
+    'modified': [key for key in current_hashes if key in previous_hashes and current_hashes[key] != previous_hashes[key]],
+  }
+
+
+# Create metadata-hashes.min.json (file and paragraph hashes for this run) and changes.json (files and paragraphs that were added, removed, or modified since the previous run)
+def output_hashes_and_changes(previous_hashes, merge_output=False):
+  
+  # Paragraphs in chapters that weren't scraped in this run are kept from the previous run when merging
+  paragraph_hashes = {}
+  if merge_output and previous_hashes:
+    paragraph_hashes = copy.deepcopy(previous_hashes['paragraphs'])
+  for bcp47_lang, chapter_hashes in paragraph_hashes_by_language.items():
+    paragraph_hashes.setdefault(bcp47_lang, {}).update(chapter_hashes)
+  
+  hashes = {
+    'generated': datetime.now().isoformat(timespec='seconds'),
+    'files': dict(sorted(output_file_hashes.items())),
+    'paragraphs': paragraph_hashes,
+  }
+  
+  if previous_hashes:
+    sys.stdout.write('Creating changes.json\n')
+    changes = {
+      '_about': 'Generated {0} by Python Scripture Scraper (https://github.com/samuelbradshaw/python-scripture-scraper)'.format(date_today),
+      'previousRun': previous_hashes['generated'],
+      'files': compare_hashes(*[{ relative_path: file_hash for (relative_path, file_hash) in file_hashes.items() if relative_path not in change_excluded_files } for file_hashes in (previous_hashes['files'], hashes['files'])]),
+      'paragraphs': {},
+    }
+    for bcp47_lang in sorted(set(previous_hashes['paragraphs']) | set(paragraph_hashes)):
+      previous_language_hashes = { compare_id: paragraph_hash for chapter_hashes in previous_hashes['paragraphs'].get(bcp47_lang, {}).values() for (compare_id, paragraph_hash) in chapter_hashes.items() }
+      language_hashes = { compare_id: paragraph_hash for chapter_hashes in paragraph_hashes.get(bcp47_lang, {}).values() for (compare_id, paragraph_hash) in chapter_hashes.items() }
+      language_changes = compare_hashes(previous_language_hashes, language_hashes)
+      if language_changes['added'] or language_changes['removed'] or language_changes['modified']:
+        changes['paragraphs'][bcp47_lang] = language_changes
+    write_output_file('changes.json', json.dumps(changes, indent=config.JSON_INDENT, separators=(', ', ': '), ensure_ascii=False, sort_keys=False))
+  
+  sys.stdout.write('Creating metadata-hashes.min.json\n')
+  write_output_file('metadata-hashes.min.json', json.dumps(hashes, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False))
+
+
+# Get a copy of a chapter dict for the paragraph store, with paragraph text replaced by content hashes (texts are added to store_objects)
+def add_chapter_to_store(chapter_dict, store_objects):
+  store_chapter_dict = dict(chapter_dict)
+  store_chapter_dict['paragraphs'] = []
+  for paragraph_dict in chapter_dict['paragraphs']:
+    store_paragraph_dict = dict(paragraph_dict)
+    for key in ('content', 'contentHtml',):
+      if paragraph_dict[key]:
+        content_hash = get_content_hash(paragraph_dict[key])[:16]
+        store_objects[content_hash] = paragraph_dict[key]
+        store_paragraph_dict[key] = content_hash
+    store_chapter_dict['paragraphs'].append(store_paragraph_dict)
+  return store_chapter_dict
+
+
+# Create object files for the paragraph store (texts are grouped into files by the first two characters of their hash)
+# When merging, texts from existing object files are kept if a publication file in the store still refers to them, and other texts are removed
+def output_store_objects(bcp47_lang, store_objects, merge_output=False):
+  objects_by_prefix = {}
+  for content_hash, text in store_objects.items():
+    objects_by_prefix.setdefault(content_hash[:2], {})[content_hash] = text
+  if merge_output:
+    referenced_hashes = get_store_referenced_hashes(bcp47_lang)
+    existing_directory = os.path.join(output_directory, f'{bcp47_lang}-store', 'objects')
+    if os.path.isdir(existing_directory):
+      for file_name in os.listdir(existing_directory):
+        if file_name.endswith('.json'):
+          with open(os.path.join(existing_directory, file_name), 'r', encoding='utf-8') as f:
+            existing_objects = json.load(f)
+          objects_by_prefix[file_name[:-5]] = { **existing_objects, **objects_by_prefix.get(file_name[:-5], {}) }
+    for prefix, objects in list(objects_by_prefix.items()):
+      objects_by_prefix[prefix] = { content_hash: text for (content_hash, text) in objects.items() if content_hash in referenced_hashes }
+      if not objects_by_prefix[prefix]:
+        del objects_by_prefix[prefix]
+        removed_output_files.add(f'{bcp47_lang}-store/objects/{prefix}.json')
+  sys.stdout.write('Creating {0} paragraph store object files ({1} texts)\n\n'.format(len(objects_by_prefix), sum(len(objects) for objects in objects_by_prefix.values())))
+  for prefix, objects in sorted(objects_by_prefix.items()):
+    write_output_file(f'{bcp47_lang}-store/objects/{prefix}.json', json.dumps(objects, indent=(None if config.MINIFY_JSON else config.JSON_INDENT), separators=((',', ':') if config.MINIFY_JSON else (', ', ': ')), ensure_ascii=False, sort_keys=True))
+
+
+# Get the hashes that publication files in the paragraph store refer to (publication files written in this run are read from the staging directory, and other publication files are read from the previous run)
+def get_store_referenced_hashes(bcp47_lang):
+  referenced_hashes = set()
+  file_names = set()
+  for directory in (staging_directory, output_directory):
+    store_directory = os.path.join(directory, f'{bcp47_lang}-store')
+    if not os.path.isdir(store_directory):
+      continue
+    for file_name in sorted(os.listdir(store_directory)):
+      if not file_name.endswith('.json') or file_name in file_names:
+        continue
+      file_names.add(file_name)
+      with open(os.path.join(store_directory, file_name), 'r', encoding='utf-8') as f:
+        store_content = json.load(f)
+      for book_chapters in store_content.values():
+        for chapter_dict in book_chapters.values():
+          for paragraph_dict in chapter_dict['paragraphs']:
+            referenced_hashes.update(paragraph_dict[key] for key in ('content', 'contentHtml',) if paragraph_dict[key])
+  return referenced_hashes
+
+
+# Create metadata-statistics.json (when merging, statistics for languages that weren't scraped are kept from the previous run)
+def output_statistics(merge_output=False):
+  metadata_statistics = {
+    '_about': 'Generated {0} by Python Scripture Scraper (https://github.com/samuelbradshaw/python-scripture-scraper)'.format(date_today),
+    'languages': {},
+  }
+  existing_file_path = os.path.join(output_directory, 'metadata-statistics.min.json')
+  if merge_output and os.path.exists(existing_file_path):
+    with open(existing_file_path, 'r', encoding='utf-8') as f:
+      metadata_statistics['languages'] = json.load(f)['languages']
+  metadata_statistics['languages'].update(statistics_by_language)
+  metadata_statistics['languages'] = dict(sorted(metadata_statistics['languages'].items()))
+  sys.stdout.write('Creating metadata-statistics.json\n\n')
+  write_output_file('metadata-statistics.json', json.dumps(metadata_statistics, indent=config.JSON_INDENT, separators=(', ', ': '), ensure_ascii=False, sort_keys=False))
+  write_output_file('metadata-statistics.min.json', json.dumps(metadata_statistics, indent=None, separators=(',', ':'), ensure_ascii=False, sort_keys=False))
+
+
+# Merge chapters into the content of an existing publication-level JSON file ({ book_slug: { chapter_slug: chapter_dict } }), keeping canonical order
+def merge_json_content(existing_json_content, new_json_content):
+  chapters = {}
+  for json_content in (existing_json_content, new_json_content):
+    for book_slug, book_chapters in json_content.items():
+      for chapter_slug, chapter_dict in book_chapters.items():
+        chapters[chapter_slug] = (book_slug, chapter_dict)
+  merged_json_content = {}
+  for chapter_slug in sorted(chapters.keys(), key=lambda slug: structure_index['chapterOrdinals'].get(slug, len(structure_index['chapters']))):
+    book_slug, chapter_dict = chapters[chapter_slug]
+    merged_json_content.setdefault(book_slug, {})[chapter_slug] = chapter_dict
+  return merged_json_content
+
+
 def print_warning(message):
   sys.stderr.write('\x1b[1;33m' + message + '\x1b[0m')
 
@@ -1248,4 +2301,4 @@ def print_warning(message):
 
 
 if __name__ == '__main__':
-  main()
\ No newline at end of file
+  main(parse_arguments())
\ No newline at end of file
@@ -0,0 +1,303 @@
+# Python standard libraries
+import os
+import re
+import sys
+import gzip
+import json
+import asyncio
+import hashlib
+import argparse
+import functools
+import collections
+import urllib.parse
+
+# Internal imports
+from resources import resources, corpus, reference_formatter, name_index
+
+working_directory = os.path.abspath(os.path.dirname(__file__))
+output_directory = os.path.join(working_directory, '_output')
+
+# Scripture reference, like '1 Nephi 3:7-9, 12' or '1-nephi-3:7' (the book and chapter are split at the last space)
+reference_re = re.compile(r'^\s*(?:(?P<book>[^:]*\S)\s+)?(?P<chapter>[^\s:]+)\s*(?::\s*(?P<verses>[\d\s,\-–]+))?\s*$')
+
+# Verse number in a compareId (like 'mosiah-2_v17')
+verse_compare_id_re = re.compile(r'_v(\d+)$')
+
+status_reasons = {
+  200: 'OK',
+  304: 'Not Modified',
+  400: 'Bad Request',
+  404: 'Not Found',
+  405: 'Method Not Allowed',
+}
+
+
+# Serve scraped JSON output over HTTP, with an API for chapters, verses, and references
+def main(args=None):
+  args = args or parse_arguments([])
+  try:
+    server = ContentServer(args.output_directory, args.default_language, args.chapter_cache_size, args.response_cache_size)
+  except FileNotFoundError as e:
+    sys.exit('Error: No {0} in {1} (run scrape.py first)'.format(os.path.basename(e.filename), args.output_directory))
+  if not server.languages:
+    sys.exit('Error: No JSON output in {0} (run scrape.py with --formats json)'.format(args.output_directory))
+  try:
+    asyncio.run(server.serve(args.host, args.port))
+  except KeyboardInterrupt:
+    pass
+
+
+# Content server
+# Chapters are decoded from JSON files once and kept in an LRU cache, and encoded responses (with their ETags and gzipped bodies) are kept in a second LRU cache, so repeated requests don't touch the disk or the JSON parser. Requests are handled on an asyncio event loop, and responses that aren't cached are created on a thread pool.
+# When scrape.py finishes a run, it replaces the output directory with a new one. Before each request, the output directory is checked (by its device and inode), and if it was replaced, metadata is loaded again and both caches are cleared.
+class ContentServer:
+  def __init__(self, output_directory, default_language, chapter_cache_size, response_cache_size):
+    self.output_directory = output_directory
+    self.default_language = default_language
+    self.chapter_cache_size = chapter_cache_size
+    self.response_cache_size = response_cache_size
+    self.output_version = None
+    self.load_output_directory()
+
+  # Load metadata from the output directory, and clear the caches
+  # Files are read from the output directory's real path (the version folder that _output links to), so a run that finishes while a request is being handled doesn't mix files from two runs.
+  def load_output_directory(self):
+    output_stat = os.stat(self.output_directory)
+    content_directory = os.path.realpath(self.output_directory)
+    self.structure_index = corpus.load_structure_index(content_directory)
+    metadata_scriptures = corpus.load_scriptures_metadata(content_directory)
+    self.languages = sorted(file_name[:-len('-json')] for file_name in os.listdir(content_directory) if file_name.endswith('-json') and os.path.isdir(os.path.join(content_directory, file_name)))
+    self.read_json_file = functools.lru_cache(maxsize=self.chapter_cache_size)(corpus.read_json_file)
+    self.responses = collections.OrderedDict()  # { request_key: (etag, body, gzipped_body) }
+
+    self.reference_formatter = reference_formatter.ReferenceFormatter(metadata_scriptures, self.structure_index)
+
+    # Book names and abbreviations in all languages, for reading references (names in the request's languages are preferred)
+    self.name_index = name_index.NameIndex(name_index.build_name_index(metadata_scriptures))
+    self.content_directory = content_directory
+    self.output_version = (output_stat.st_dev, output_stat.st_ino)
+
+  # Load the output directory again if it was replaced since it was loaded (if it's briefly missing while it's replaced, the loaded output is used)
+  def check_output_directory(self):
+    try:
+      output_stat = os.stat(self.output_directory)
+      if (output_stat.st_dev, output_stat.st_ino) != self.output_version:
+        self.load_output_directory()
+    except FileNotFoundError:
+      pass
+
+  # Start the server, and handle requests until it's stopped
+  async def serve(self, host, port):
+    server = await asyncio.start_server(self.handle_connection, host, port)
+    sys.stdout.write('Serving {0} ({1}) at http://{2}:{3}/\n'.format(self.output_directory, ', '.join(self.languages), host, port))
+    async with server:
+      await server.serve_forever()
+
+  # Handle requests on a connection (connections are kept open for HTTP/1.1 clients)
+  async def handle_connection(self, reader, writer):
+    try:
+      while True:
+        request_line = await reader.readline()
+        if not request_line.strip():
+          break
+        method, target, version = request_line.decode('latin-1').split()
+        headers = {}
+        while True:
+          header_line = await reader.readline()
+          if not header_line.strip():
+            break
+          name, _, value = header_line.decode('latin-1').partition(':')
+          headers[name.strip().lower()] = value.strip()
+
+        if method not in ('GET', 'HEAD'):
+          status, (etag, body, gzipped_body) = 405, encode_response({ 'error': 'Only GET and HEAD requests are supported' })
+        else:
+          status, (etag, body, gzipped_body) = await self.get_response(target)
+
+        response_headers = {
+          'Content-Type': 'application/json; charset=utf-8',
+          'Access-Control-Allow-Origin': '*',
+          'Vary': 'Accept-Encoding',
+          'ETag': etag,
+        }
+        if status == 200 and etag in (value.strip() for value in headers.get('if-none-match', '').split(',')):
+          status, body = 304, b''
+        elif 'gzip' in headers.get('accept-encoding', '') and len(gzipped_body) < len(body):
+          response_headers['Content-Encoding'] = 'gzip'
+          body = gzipped_body
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        response_headers['Content-Length'] = str(len(body))
+        response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+
+        writer.write('HTTP/1.1 {0} {1}\r\n{2}\r\n'.format(status, status_reasons[status], ''.join(f'{name}: {value}\r\n' for name, value in response_headers.items())).encode('latin-1'))
+        if method != 'HEAD':
+          writer.write(body)
+        await writer.drain()
+        if not keep_alive:
+          break
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+      pass
+    finally:
+      writer.close()
+
+  # Get the status and encoded response for a request target (cached responses are used when possible)
+  async def get_response(self, target):
+    url = urllib.parse.urlsplit(target)
+    query = urllib.parse.parse_qs(url.query)
+    request_key = (url.path.rstrip('/'), tuple(sorted((name, tuple(values)) for name, values in query.items())))
+    self.check_output_directory()
+    responses = self.responses
+    if request_key in responses:
+      responses.move_to_end(request_key)
+      return 200, responses[request_key]
+    status, content = await asyncio.get_running_loop().run_in_executor(None, self.get_content, url.path, query)
+    response = await asyncio.get_running_loop().run_in_executor(None, encode_response, content)
+    if status == 200:
+      # If the output directory was replaced while the response was being created, it's added to the previous cache (which is no longer used)
+      responses[request_key] = response
+      if len(responses) > self.response_cache_size:
+        responses.popitem(last=False)
+    return status, response
+
+  # Get the status and content for a request (runs on a thread pool, because chapters might be read from disk)
+  # GET /languages
+  # GET /chapters/{chapter_slug}?lang=en,es
+  # GET /verses/{compare_id}?lang=en,es
+  # GET /references?q=1 Nephi 3:7-9; Mosiah 2:17&lang=en,es (each reference also has its localized name in each language)
+  def get_content(self, path, query):
+    path_parts = [urllib.parse.unquote(part) for part in path.strip('/').split('/')]
+    bcp47_langs = [bcp47_lang for value in query.get('lang', [self.default_language]) for bcp47_lang in value.split(',') if bcp47_lang]
+    for bcp47_lang in bcp47_langs:
+      if bcp47_lang not in self.languages:
+        return 404, { 'error': f'Unknown language: {bcp47_lang}' }
+
+    if path_parts == ['languages']:
+      return 200, { 'languages': self.languages }
+
+    elif len(path_parts) == 2 and path_parts[0] == 'chapters':
+      chapter_slug = path_parts[1]
+      content = { bcp47_lang: self.get_chapter(bcp47_lang, chapter_slug) for bcp47_lang in bcp47_langs }
+      if not any(content.values()):
+        return 404, { 'error': f'Unknown chapter: {chapter_slug}' }
+      return 200, content
+
+    elif len(path_parts) == 2 and path_parts[0] == 'verses':
+      compare_id = path_parts[1]
+      chapter_slug = compare_id.rpartition('_')[0]
+      content = {}
+      for bcp47_lang in bcp47_langs:
+        chapter_dict = self.get_chapter(bcp47_lang, chapter_slug)
+        content[bcp47_lang] = next((paragraph_dict for paragraph_dict in chapter_dict['paragraphs'] if paragraph_dict['compareId'] == compare_id), None) if chapter_dict else None
+      if not any(content.values()):
+        return 404, { 'error': f'Unknown verse: {compare_id}' }
+      return 200, content
+
+    elif path_parts == ['references']:
+      references = []
+      for reference in ';'.join(query.get('q', [])).split(';'):
+        if reference.strip():
+          parsed_reference = self.parse_reference(reference, bcp47_langs)
+          if not parsed_reference:
+            return 400, { 'error': f'Unknown reference: {reference.strip()}' }
+          references.append(parsed_reference)
+      if not references:
+        return 400, { 'error': 'No references (use ?q=, like ?q=1 Nephi 3:7)' }
+      content = { 'references': references, 'paragraphs': {} }
+      for bcp47_lang in bcp47_langs:
+        paragraph_dicts = content['paragraphs'][bcp47_lang] = []
+        for reference in references:
+          chapter_dict = self.get_chapter(bcp47_lang, reference['chapter'])
+          if chapter_dict:
+            if reference['verseRanges']:
+              paragraph_dicts += [paragraph_dict for paragraph_dict in chapter_dict['paragraphs'] if is_verse_in_ranges(paragraph_dict['compareId'], reference['verseRanges'])]
+            else:
+              paragraph_dicts += chapter_dict['paragraphs']
+      return 200, content
+
+    return 404, { 'error': f'Unknown path: {path}' }
+
+  # Get a chapter's content (returns None if the chapter doesn't have JSON output in the language)
+  def get_chapter(self, bcp47_lang, chapter_slug):
+    file_path, keys = corpus.find_chapter_json(self.content_directory, bcp47_lang, self.structure_index, chapter_slug)
+    if not file_path:
+      return None
+    content = self.read_json_file(file_path)
+    for key in keys:
+      content = content.get(key) if content else None
+    return content
+
+  # Parse a reference (like '1 Nephi 3:7-9, 12') into a chapter slug and verse ranges (returns None if the reference can't be read, or if none of its verses are in the chapter)
+  # Ranges are limited to the chapter's verses (verse 1 to the highest verse in its content in the first language that has it), so a range like 1-300000000 doesn't create a list of every number in it.
+  def parse_reference(self, reference, bcp47_langs):
+    match = reference_re.match(reference)
+    if not match:
+      return None
+    chapter_slug = None
+    if match.group('book'):
+      book_slug = self.name_index.get_slug(match.group('book'), bcp47_langs)
+      if book_slug:
+        chapter_slug = resources.get_chapter_slug(resources.mapping_singular_slug_to_book.get(book_slug, book_slug), match.group('chapter'))
+    else:
+      chapter_slug = match.group('chapter')
+    if chapter_slug not in self.structure_index['chapterOrdinals']:
+      return None
+    verse_ranges = []
+    if match.group('verses'):
+      verse_count = self.get_verse_count(chapter_slug, bcp47_langs)
+      for verse_range in match.group('verses').replace('–', '-').split(','):
+        first_verse, _, last_verse = verse_range.strip().partition('-')
+        if first_verse.isdigit():
+          first_verse = int(first_verse)
+          last_verse = min(int(last_verse) if last_verse.isdigit() else first_verse, verse_count)
+          if 1 <= first_verse <= last_verse:
+            verse_ranges.append((first_verse, last_verse))
+      if not verse_ranges:
+        return None
+    canonical_reference = chapter_slug + (':' + ','.join(str(first_verse) if first_verse == last_verse else f'{first_verse}-{last_verse}' for first_verse, last_verse in verse_ranges) if verse_ranges else '')
+    return {
+      'reference': reference.strip(),
+      'chapter': chapter_slug,
+      'verses': [verse for first_verse, last_verse in verse_ranges for verse in range(first_verse, last_verse + 1)],
+      'verseRanges': verse_ranges,
+      'formatted': { bcp47_lang: self.reference_formatter.format_references(bcp47_lang, [canonical_reference])[0] for bcp47_lang in bcp47_langs if bcp47_lang in self.reference_formatter.metadata_scriptures['languages'] },
+    }
+
+  # Get the number of verses in a chapter (the highest verse number in the first language that has the chapter, or 0 if none of them have it)
+  def get_verse_count(self, chapter_slug, bcp47_langs):
+    for bcp47_lang in bcp47_langs:
+      chapter_dict = self.get_chapter(bcp47_lang, chapter_slug)
+      if chapter_dict:
+        verse_numbers = [int(verse_match.group(1)) for verse_match in map(verse_compare_id_re.search, (paragraph_dict['compareId'] for paragraph_dict in chapter_dict['paragraphs'])) if verse_match]
+        return max(verse_numbers, default=0)
+    return 0
+
+
+# Check whether a paragraph is a verse in one of a list of (first_verse, last_verse) ranges
+def is_verse_in_ranges(compare_id, verse_ranges):
+  verse_match = verse_compare_id_re.search(compare_id)
+  if not verse_match:
+    return False
+  verse = int(verse_match.group(1))
+  return any(first_verse <= verse <= last_verse for first_verse, last_verse in verse_ranges)
+
+# Encode content as a JSON response (returns the ETag, body, and gzipped body)
+def encode_response(content):
+  body = json.dumps(content, indent=None, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+  etag = '"{0}"'.format(hashlib.sha256(body).hexdigest()[:32])
+  return etag, body, gzip.compress(body, mtime=0)
+
+
+# Parse command-line arguments
+def parse_arguments(argv=None):
+  parser = argparse.ArgumentParser(description='Serve scraped JSON output over HTTP, with an API for chapters, verses, and references.')
+  parser.add_argument('--host', default='127.0.0.1', help='host to listen on (default: 127.0.0.1)')
+  parser.add_argument('--port', type=int, default=8000, help='port to listen on (default: 8000)')
+  parser.add_argument('--default-language', default='en', metavar='LANG', help='language to use when a request doesn’t have ?lang= (default: en)')
+  parser.add_argument('--chapter-cache-size', type=int, default=512, metavar='N', help='number of decoded JSON files to keep in memory (default: 512)')
+  parser.add_argument('--response-cache-size', type=int, default=4096, metavar='N', help='number of encoded responses to keep in memory (default: 4096)')
+  parser.add_argument('-i', '--output-directory', default=output_directory, metavar='PATH', help='scraped output directory (default: _output)')
+  return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+  main(parse_arguments())